@@ -0,0 +1,271 @@
+# standard libraries
+import logging, os, threading, time
+from typing import Any, Protocol, Union
+
+# third-party libraries
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from umich_api.api_utils import ApiUtil
+
+# local libraries
+from api_retry.util import get_api_config
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Maximum number of keep-alive connections kept open to each host
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '10'))
+# Seconds to wait for a connection to be established and for the server to send data;
+# requests that time out are retried by api_call_with_retries like unsuccessful responses
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', '10'))
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', '60'))
+# Seconds before an access token expires at which it is replaced
+TOKEN_REFRESH_MARGIN = float(os.getenv('TOKEN_REFRESH_MARGIN', '60'))
+
+
+class TokenStore(Protocol):
+    """Storage for access tokens that outlives a PooledApiUtil instance (e.g. pe.models.ApiToken)."""
+
+    def get_token(self, scope: str) -> Union[tuple[str, float], None]:
+        ...
+
+    def put_token(self, scope: str, access_token: str, expires_at: float) -> None:
+        ...
+
+
+class PooledApiUtil(ApiUtil):
+    """
+    ApiUtil that sends token and API requests through one requests.Session, so connections to the API Directory
+    are kept alive and reused across calls and threads instead of being set up for every request.
+    Access tokens are kept for each scope until shortly before they expire, and, if a token_store is provided,
+    shared with later runs through it.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        client_secret: str,
+        apis_file: str,
+        pool_size: int = API_POOL_SIZE,
+        connect_timeout: float = API_CONNECT_TIMEOUT,
+        read_timeout: float = API_READ_TIMEOUT,
+        token_store: Union[TokenStore, None] = None
+    ) -> None:
+        """
+        Sets up ApiUtil, then the shared session and its connection pool.
+
+        :param base_url: Base URL of the API Directory
+        :type base_url: string
+        :param client_id: API Directory client ID
+        :type client_id: string
+        :param client_secret: API Directory client secret
+        :type client_secret: string
+        :param apis_file: Path to the JSON file with API configuration (e.g. config/apis.json)
+        :type apis_file: string
+        :param pool_size: Maximum number of connections kept open to each host
+        :type pool_size: int, optional (default is the API_POOL_SIZE environment variable or 10)
+        :param connect_timeout: Seconds to wait for a connection to be established
+        :type connect_timeout: float, optional (default is the API_CONNECT_TIMEOUT environment variable or 10)
+        :param read_timeout: Seconds to wait for the server to send data
+        :type read_timeout: float, optional (default is the API_READ_TIMEOUT environment variable or 60)
+        :param token_store: Storage checked for a valid token before requesting one, and updated with new tokens
+        :type token_store: TokenStore or None, optional (default is None, keeping tokens in memory only)
+        :return: None
+        :rtype: None
+        """
+        super().__init__(base_url, client_id, client_secret, apis_file)
+        self.api_base_url: str = base_url.rstrip('/')
+        self.api_client_id: str = client_id
+        self.api_client_secret: str = client_secret
+        self.api_config: dict[str, dict[str, Any]] = get_api_config(apis_file)
+        self.timeout: tuple[float, float] = (connect_timeout, read_timeout)
+
+        self.session: Session = Session()
+        # Retries are handled by api_call_with_retries, not by the adapter
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Maps scopes to access tokens and the times (in seconds since the epoch) when they expire
+        self.tokens: dict[str, tuple[str, float]] = {}
+        self.token_lock: threading.Lock = threading.Lock()
+        self.token_store: Union[TokenStore, None] = token_store
+
+    def request_access_token(self, scope: str) -> tuple[str, float]:
+        """
+        Requests a new access token for a scope from the API Directory using the client credentials.
+
+        :param scope: Name of the subscription or scope the token is for
+        :type scope: string
+        :raises requests.HTTPError: If the token request is not successful
+        :return: Tuple of the access token and the time (in seconds since the epoch) when it expires
+        :rtype: Tuple of a string and a float
+        """
+        token_url: str = f"{self.api_base_url}/{self.api_config[scope]['token_url']}"
+        LOGGER.debug(f'Requesting a new access token for {scope}')
+        requested_at: float = time.time()
+        response: Response = self.session.post(
+            token_url,
+            data={
+                'grant_type': 'client_credentials',
+                'client_id': self.api_client_id,
+                'client_secret': self.api_client_secret,
+                'scope': scope
+            },
+            headers={'Accept': 'application/json'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        token_data: dict[str, Any] = response.json()
+        return (token_data['access_token'], requested_at + float(token_data['expires_in']))
+
+    def is_token_fresh(self, token_entry: Union[tuple[str, float], None]) -> bool:
+        """
+        Checks whether a token is present and does not expire within TOKEN_REFRESH_MARGIN seconds.
+
+        :param token_entry: Tuple of an access token and the time (in seconds since the epoch) when it expires, or None
+        :type token_entry: Tuple of a string and a float, or None
+        :return: True or False depending on whether the token can still be used
+        :rtype: bool
+        """
+        return token_entry is not None and token_entry[1] - TOKEN_REFRESH_MARGIN > time.time()
+
+    def renew_token(self, scope: str) -> tuple[str, float]:
+        """
+        Requests a new access token for a scope and keeps it in memory and in the token_store, if any.
+        Callers must hold token_lock.
+
+        :param scope: Name of the subscription or scope the token is for
+        :type scope: string
+        :return: Tuple of the access token and the time (in seconds since the epoch) when it expires
+        :rtype: Tuple of a string and a float
+        """
+        token_entry: tuple[str, float] = self.request_access_token(scope)
+        self.tokens[scope] = token_entry
+        if self.token_store is not None:
+            self.token_store.put_token(scope, *token_entry)
+        return token_entry
+
+    def get_cached_token(self, scope: str) -> str:
+        """
+        Returns the access token for a scope. The in-memory token is used if it is fresh (see is_token_fresh);
+        otherwise, the token_store is checked, and a new token is requested only if neither is fresh.
+
+        :param scope: Name of the subscription or scope the token is for
+        :type scope: string
+        :return: Access token
+        :rtype: string
+        """
+        with self.token_lock:
+            token_entry: Union[tuple[str, float], None] = self.tokens.get(scope)
+            if not self.is_token_fresh(token_entry) and self.token_store is not None:
+                token_entry = self.token_store.get_token(scope)
+                if self.is_token_fresh(token_entry):
+                    LOGGER.debug(f'Using the stored access token for {scope}')
+                    self.tokens[scope] = token_entry
+            if not self.is_token_fresh(token_entry):
+                token_entry = self.renew_token(scope)
+            return token_entry[0]
+
+    def replace_rejected_token(self, scope: str, rejected_token: str) -> None:
+        """
+        Replaces a scope's access token after the API Directory rejected it, unless another thread already did.
+
+        :param scope: Name of the subscription or scope the token is for
+        :type scope: string
+        :param rejected_token: Access token that was rejected
+        :type rejected_token: string
+        :return: None
+        :rtype: None
+        """
+        with self.token_lock:
+            token_entry: Union[tuple[str, float], None] = self.tokens.get(scope)
+            if token_entry is None or token_entry[0] == rejected_token:
+                self.renew_token(scope)
+
+    def send_request(
+        self,
+        url: str,
+        access_token: str,
+        method: str,
+        payload: Union[dict[str, Any], str, None],
+        api_specific_headers: list[dict[str, str]]
+    ) -> Response:
+        """
+        Sends one request to the API Directory using the shared session and an access token.
+
+        :param url: URL ending for the request
+        :type url: string
+        :param access_token: Access token for the scope the request should use
+        :type access_token: string
+        :param method: Request method that should be used (e.g. "GET", "PUT")
+        :type method: string
+        :param payload: Query parameters for GET requests, or the body for other methods
+        :type payload: Dictionary with string keys, string, or None
+        :param api_specific_headers: Headers to add to the request
+        :type api_specific_headers: List of dictionaries with string keys and values
+        :return: Response from the API Directory
+        :rtype: Response
+        """
+        headers: dict[str, str] = {
+            'Authorization': f'Bearer {access_token}',
+            'X-IBM-Client-Id': self.api_client_id,
+            'Accept': 'application/json'
+        }
+        for header_dict in api_specific_headers:
+            headers.update(header_dict)
+
+        body_key: str = 'params' if method.upper() == 'GET' else 'data'
+        return self.session.request(
+            method,
+            f"{self.api_base_url}/{url.lstrip('/')}",
+            headers=headers,
+            timeout=self.timeout,
+            **{body_key: payload}
+        )
+
+    def api_call(
+        self,
+        url: str,
+        scope: str,
+        method: str = 'GET',
+        payload: Union[dict[str, Any], str, None] = None,
+        api_specific_headers: Union[list[dict[str, str]], None] = None
+    ) -> Response:
+        """
+        Makes a request to the API Directory, reusing pooled connections. If the access token is rejected,
+        the token is replaced and the request is sent one more time.
+
+        :param url: URL ending for the request
+        :type url: string
+        :param scope: Name of the subscription or scope the request should use
+        :type scope: string
+        :param method: Request method that should be used (e.g. "GET", "PUT")
+        :type method: string, optional (default is "GET")
+        :param payload: Query parameters for GET requests, or the body for other methods
+        :type payload: Dictionary with string keys, string, or None, optional
+        :param api_specific_headers: Headers to add to the request
+        :type api_specific_headers: List of dictionaries with string keys and values or None, optional
+        :return: Response from the API Directory
+        :rtype: Response
+        """
+        if api_specific_headers is None:
+            api_specific_headers = []
+
+        access_token: str = self.get_cached_token(scope)
+        response: Response = self.send_request(url, access_token, method, payload, api_specific_headers)
+        if response.status_code == 401:
+            LOGGER.warning(f'The access token for {scope} was rejected; requesting a new one')
+            self.replace_rejected_token(scope, access_token)
+            response = self.send_request(url, self.get_cached_token(scope), method, payload, api_specific_headers)
+        return response
+
+    def close(self) -> None:
+        """
+        Closes the session and its pooled connections.
+
+        :return: None
+        :rtype: None
+        """
+        self.session.close()
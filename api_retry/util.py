@@ -1,41 +1,436 @@
 # standard libraries
-import json, logging
+import json, logging, os, random, threading, time
+from collections import deque
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
 from json.decoder import JSONDecodeError
-from typing import Any, Union
+from typing import Any, NamedTuple, Union
 
 # third-party libraries
 from requests import Response
+from requests.exceptions import RequestException
 from umich_api.api_utils import ApiUtil
 
+try:
+    # Optional; decodes large Canvas pages several times faster than the standard library
+    import orjson
+except ImportError:
+    orjson = None
+
+# local libraries
+from constants import API_CONFIG_PATH
+
 
 LOGGER = logging.getLogger(__name__)
 
+# Status codes in the 4xx range that indicate a temporary condition and are worth retrying
+RETRYABLE_CLIENT_STATUS_CODES: tuple[int, ...] = (408, 429)
 
-def check_if_response_successful(response: Response) -> bool:
+
+class RetryPolicy(NamedTuple):
+    """Settings controlling how long api_call_with_retries waits between attempts."""
+
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    max_total_wait: float = 120.0
+    jitter: bool = True
+    # Canvas X-Rate-Limit-Remaining value below which waits are not shortened by jitter and grow toward max_delay
+    rate_limit_threshold: float = 50.0
+    fail_fast_on_client_error: bool = True
+
+
+def get_retry_policy(scope: str) -> RetryPolicy:
     """
-    Checks whether response has 200 status code and the JSON text can be parsed.
+    Builds a RetryPolicy for a scope from environment variables. Each RETRY_* variable can be overridden
+    for a single scope by prefixing it with the scope name in capitals (e.g. PLACEMENTSCORES_RETRY_BASE_DELAY).
+
+    :param scope: Name of the subscription or scope requests will use
+    :type scope: string
+    :return: RetryPolicy with values from the environment, or defaults
+    :rtype: RetryPolicy
+    """
+    def get_setting(name: str, default: Any) -> str:
+        return os.getenv(f'{scope.upper()}_{name}', os.getenv(name, str(default)))
+
+    defaults: RetryPolicy = RetryPolicy()
+    return RetryPolicy(
+        base_delay=float(get_setting('RETRY_BASE_DELAY', defaults.base_delay)),
+        max_delay=float(get_setting('RETRY_MAX_DELAY', defaults.max_delay)),
+        max_total_wait=float(get_setting('RETRY_MAX_TOTAL_WAIT', defaults.max_total_wait)),
+        jitter=bool(int(get_setting('RETRY_JITTER', int(defaults.jitter)))),
+        rate_limit_threshold=float(get_setting('RETRY_RATE_LIMIT_THRESHOLD', defaults.rate_limit_threshold)),
+        fail_fast_on_client_error=bool(
+            int(get_setting('RETRY_FAIL_FAST_ON_CLIENT_ERROR', int(defaults.fail_fast_on_client_error)))
+        )
+    )
+
+
+def parse_retry_after(response: Response) -> Union[float, None]:
+    """
+    Reads the Retry-After header of a response, which can be a number of seconds or an HTTP date.
 
     :param response: Response from ApiUtil.api_call
     :type response: Response
-    :return: True or False depending on whether the response was successful
+    :return: Number of seconds to wait, or None if the header is missing or invalid
+    :rtype: float or None
+    """
+    retry_after: Union[str, None] = response.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_dt: datetime = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        LOGGER.warning(f'Could not parse Retry-After header: {retry_after}')
+        return None
+    return max(0.0, (retry_dt - datetime.now(tz=retry_dt.tzinfo)).total_seconds())
+
+
+def parse_rate_limit_remaining(response: Response) -> Union[float, None]:
+    """
+    Reads the Canvas X-Rate-Limit-Remaining header of a response.
+
+    :param response: Response from ApiUtil.api_call
+    :type response: Response
+    :return: Remaining Canvas rate limit quota, or None if the header is missing or invalid
+    :rtype: float or None
+    """
+    remaining: Union[str, None] = response.headers.get('X-Rate-Limit-Remaining')
+    if remaining is None:
+        return None
+    try:
+        return float(remaining)
+    except ValueError:
+        return None
+
+
+def is_client_error(response: Response) -> bool:
+    """
+    Checks whether a response has a 4xx status code that will not succeed if the request is repeated.
+    Canvas signals throttling with a 403 and a "Rate Limit Exceeded" message, so that case is not a client error.
+
+    :param response: Response from ApiUtil.api_call
+    :type response: Response
+    :return: True or False depending on whether the response is a non-retryable client error
     :rtype: bool
     """
-    response_successful: bool = True
+    status_code: int = response.status_code
+    if status_code < 400 or status_code >= 500 or status_code in RETRYABLE_CLIENT_STATUS_CODES:
+        return False
+    if status_code == 403 and 'Rate Limit Exceeded' in response.text:
+        return False
+    return True
+
+
+def get_retry_delay(response: Union[Response, None], attempt_num: int, retry_policy: RetryPolicy) -> float:
+    """
+    Determines how many seconds to wait before the next attempt. A Retry-After header is honored when present;
+    otherwise the delay grows exponentially with the attempt number, up to max_delay, and is randomized with
+    full jitter unless Canvas reports that little of its rate limit quota remains. In that case the delay is
+    lengthened toward max_delay in proportion to how far the quota has fallen below rate_limit_threshold,
+    giving Canvas time to refill it.
+
+    :param response: Unsuccessful Response from ApiUtil.api_call, or None if the request raised an exception
+    :type response: Response or None
+    :param attempt_num: Number of the attempt that just failed, starting at 1
+    :type attempt_num: int
+    :param retry_policy: Settings for delays between attempts
+    :type retry_policy: RetryPolicy
+    :return: Number of seconds to wait
+    :rtype: float
+    """
+    retry_after: Union[float, None] = parse_retry_after(response) if response is not None else None
+    if retry_after is not None:
+        LOGGER.info(f'Server requested a wait of {retry_after} second(s) before retrying')
+        return retry_after
+
+    delay: float = min(retry_policy.max_delay, retry_policy.base_delay * 2 ** (attempt_num - 1))
+
+    rate_limit_remaining: Union[float, None] = (
+        parse_rate_limit_remaining(response) if response is not None else None
+    )
+    rate_limited: bool = (
+        rate_limit_remaining is not None and rate_limit_remaining < retry_policy.rate_limit_threshold
+    )
+    if rate_limited:
+        threshold: float = retry_policy.rate_limit_threshold
+        shortfall: float = min(1.0, (threshold - rate_limit_remaining) / threshold) if threshold > 0 else 1.0
+        delay += max(0.0, retry_policy.max_delay - delay) * shortfall
+        LOGGER.info(f'Canvas rate limit quota is low ({rate_limit_remaining}); waiting {delay} second(s)')
+    elif retry_policy.jitter:
+        delay = random.uniform(0, delay)
+    return delay
+
+
+@lru_cache(maxsize=None)
+def get_api_config(config_path: str) -> dict[str, dict[str, Any]]:
+    """
+    Reads the API configuration file used by ApiUtil.
+
+    :param config_path: Path to the JSON file with API configuration (e.g. config/apis.json)
+    :type config_path: string
+    :return: Dictionary mapping scope names to their configuration
+    :rtype: Dictionary with string keys and dictionaries as values
+    """
+    with open(config_path, 'r') as config_file:
+        return json.loads(config_file.read())
+
+
+@lru_cache(maxsize=None)
+def get_api_limits(config_path: str) -> dict[str, tuple[int, int]]:
+    """
+    Reads the published call limits for each scope from the API configuration file used by ApiUtil.
+
+    :param config_path: Path to the JSON file with API configuration (e.g. config/apis.json)
+    :type config_path: string
+    :return: Dictionary mapping scope names to tuples of the number of calls allowed and the period in seconds
+    :rtype: Dictionary with string keys and tuples of two integers as values
+    """
+    api_config: dict[str, dict[str, Any]] = get_api_config(config_path)
+    limits: dict[str, tuple[int, int]] = {
+        scope: (scope_config['limits_calls'], scope_config['limits_period'])
+        for scope, scope_config in api_config.items()
+        if 'limits_calls' in scope_config and 'limits_period' in scope_config
+    }
+    LOGGER.debug(limits)
+    return limits
+
+
+class SlidingWindowLimiter:
+    """
+    Thread-safe limiter allowing at most limits_calls calls in any period of limits_period seconds.
+    The times of recent calls, including calls scheduled for the future, are kept in a log; a new call is scheduled
+    no earlier than limits_period seconds after the call limits_calls places before it.
+    """
+
+    def __init__(self, limits_calls: int, limits_period: float) -> None:
+        """
+        Sets the limits and creates the empty log of call times.
+
+        :param limits_calls: Number of calls allowed per period
+        :type limits_calls: int
+        :param limits_period: Length of the period in seconds
+        :type limits_period: float
+        :return: None
+        :rtype: None
+        """
+        self.limits_calls: int = limits_calls
+        self.limits_period: float = limits_period
+        # Monotonic times of the most recent calls (at most limits_calls), in order
+        self.call_times: deque[float] = deque(maxlen=limits_calls)
+        self.lock: threading.Lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Schedules a call at the earliest time that keeps every period within the limit, without waiting.
+        Callers that cannot block (e.g. coroutines) can wait the returned time themselves.
+
+        :return: Number of seconds the caller must wait before making its call
+        :rtype: float
+        """
+        with self.lock:
+            now: float = time.monotonic()
+            call_time: float = now
+            if len(self.call_times) == self.limits_calls:
+                call_time = max(now, self.call_times[0] + self.limits_period)
+            # The deque's maxlen drops the oldest time, which no longer limits later calls
+            self.call_times.append(call_time)
+            return call_time - now
+
+    def acquire(self) -> float:
+        """
+        Schedules a call with reserve, sleeping until its time if necessary.
+
+        :return: Number of seconds spent waiting
+        :rtype: float
+        """
+        wait: float = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+RATE_LIMITERS: dict[str, SlidingWindowLimiter] = dict()
+RATE_LIMITERS_LOCK: threading.Lock = threading.Lock()
+
+
+def get_rate_limiter(scope: str, config_path: str = API_CONFIG_PATH) -> Union[SlidingWindowLimiter, None]:
+    """
+    Returns the SlidingWindowLimiter shared by all callers for a scope, creating it from the API configuration file
+    the first time it is requested.
+
+    :param scope: Name of the subscription or scope
+    :type scope: string
+    :param config_path: Path to the JSON file with API configuration
+    :type config_path: string, optional (default is API_CONFIG_PATH)
+    :return: SlidingWindowLimiter for the scope, or None if no limits are configured for it
+    :rtype: SlidingWindowLimiter or None
+    """
+    with RATE_LIMITERS_LOCK:
+        if scope not in RATE_LIMITERS:
+            limits: Union[tuple[int, int], None] = get_api_limits(config_path).get(scope)
+            if limits is None:
+                return None
+            LOGGER.debug(f'Creating rate limiter for {scope} allowing {limits[0]} call(s) per {limits[1]} second(s)')
+            RATE_LIMITERS[scope] = SlidingWindowLimiter(*limits)
+        return RATE_LIMITERS[scope]
+
+
+def wait_for_rate_limit(subscription: str) -> float:
+    """
+    Waits for the rate limiter for the subscription, if any, so that a request can be made within its limits.
+
+    :param subscription: Name of the subscription or scope the request will use
+    :type subscription: string
+    :return: Number of seconds waited
+    :rtype: float
+    """
+    rate_limiter: Union[SlidingWindowLimiter, None] = get_rate_limiter(subscription)
+    if rate_limiter is None:
+        return 0.0
+    waited: float = rate_limiter.acquire()
+    if waited > 0:
+        LOGGER.info(f'Waited {waited:.2f} second(s) to stay within the {subscription} rate limit')
+    return waited
+
+
+def rate_limited_api_call(api_handler: ApiUtil, url: str, subscription: str, *args: Any, **kwargs: Any) -> Response:
+    """
+    Waits for the rate limiter for the subscription (see wait_for_rate_limit) and then calls ApiUtil.api_call,
+    passing along all arguments unchanged.
+
+    :param api_handler: Instance of ApiUtil
+    :type api_handler: ApiUtil
+    :param url: URL ending for request
+    :type url: string
+    :param subscription: Name of the subscription or scope the request should use
+    :type subscription: string
+    :return: Response from ApiUtil.api_call
+    :rtype: Response
+    """
+    wait_for_rate_limit(subscription)
+    return api_handler.api_call(url, subscription, *args, **kwargs)
+
+
+class ParsedResponse(NamedTuple):
+    """A successful response along with the data parsed from its JSON text."""
+
+    response: Response
+    data: Any
+
+
+def loads_json(text: Union[str, bytes]) -> Any:
+    """
+    Parses JSON text using orjson if it is installed, or the standard library json module otherwise.
+    Both raise a JSONDecodeError for invalid JSON.
+
+    :param text: JSON text
+    :type text: string or bytes
+    :return: Parsed data
+    :rtype: Any
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_successful_response(response: Response) -> Union[ParsedResponse, None]:
+    """
+    Checks whether response has 200 status code and the JSON text can be parsed,
+    returning the response with the parsed data if so.
+
+    :param response: Response from ApiUtil.api_call
+    :type response: Response
+    :return: Either a ParsedResponse or None if the response was not successful
+    :rtype: ParsedResponse or None
+    """
+    parsed_response: Union[ParsedResponse, None] = None
 
     status_code: int = response.status_code
     if status_code != 200:
         LOGGER.warning(f'Received irregular status code: {status_code}')
-        response_successful = False
     else:
         try:
-            json.loads(response.text)
+            parsed_response = ParsedResponse(response, loads_json(response.text))
         except JSONDecodeError:
             LOGGER.warning('JSONDecodeError encountered')
-            response_successful = False
 
-    if not response_successful:
+    if parsed_response is None:
         LOGGER.warning(response.text)
-    return response_successful
+    return parsed_response
+
+
+def check_if_response_successful(response: Response) -> bool:
+    """
+    Checks whether response has 200 status code and the JSON text can be parsed.
+    Callers that need the parsed data should use parse_successful_response instead to avoid parsing it again.
+
+    :param response: Response from ApiUtil.api_call
+    :type response: Response
+    :return: True or False depending on whether the response was successful
+    :rtype: bool
+    """
+    return parse_successful_response(response) is not None
+
+
+def get_next_attempt_delay(
+    response: Union[Response, None], attempt_num: int, total_wait: float, retry_policy: RetryPolicy
+) -> Union[float, None]:
+    """
+    Determines how long to wait before the next attempt (see get_retry_delay), or None, after logging an error,
+    if waiting that long would exceed the policy's maximum total wait.
+
+    :param response: Unsuccessful response from the latest attempt, or None if the request raised an exception
+    :type response: Response or None
+    :param attempt_num: Number of the latest attempt, starting at 1
+    :type attempt_num: int
+    :param total_wait: Number of seconds already spent waiting between attempts
+    :type total_wait: float
+    :param retry_policy: Settings for delays between attempts
+    :type retry_policy: RetryPolicy
+    :return: Either a number of seconds to wait or None
+    :rtype: float or None
+    """
+    delay: float = get_retry_delay(response, attempt_num, retry_policy)
+    if total_wait + delay > retry_policy.max_total_wait:
+        LOGGER.error(
+            f'Waiting {delay:.2f} more second(s) would exceed the maximum total wait of ' +
+            f'{retry_policy.max_total_wait} second(s); returning None'
+        )
+        return None
+    LOGGER.info(f'Beginning next_attempt in {delay:.2f} second(s)')
+    return delay
+
+
+def check_attempt_response(
+    response: Union[Response, None], retry_policy: RetryPolicy
+) -> tuple[Union[ParsedResponse, None], bool]:
+    """
+    Checks the outcome of one request attempt for api_call_with_retries.
+
+    :param response: Response from the attempt, or None if the request raised a RequestException
+    :type response: Response or None
+    :param retry_policy: Settings for delays between attempts
+    :type retry_policy: RetryPolicy
+    :return: Tuple of the ParsedResponse (or None if unsuccessful) and whether another attempt may be made
+    :rtype: Tuple of a ParsedResponse or None and a bool
+    """
+    if response is None:
+        return (None, True)
+
+    LOGGER.debug(f'Response URL: {response.url}')
+    parsed_response: Union[ParsedResponse, None] = parse_successful_response(response)
+    if parsed_response is not None:
+        return (parsed_response, False)
+
+    if retry_policy.fail_fast_on_client_error and is_client_error(response):
+        LOGGER.error(f'Received client error status code {response.status_code}; returning None without retrying')
+        return (None, False)
+    return (None, True)
 
 
 def api_call_with_retries(
@@ -45,11 +440,17 @@ def api_call_with_retries(
     method: str,
     payload: Union[dict[str, Any], None] = None,
     max_req_attempts: int = 3,
-) -> Union[Response, None]:
+    retry_policy: Union[RetryPolicy, None] = None
+) -> Union[ParsedResponse, None]:
     """
     Pulls data from the UM API Directory, handling errors and retrying if necessary.
+    The JSON text of a successful response is parsed once and returned with the response.
 
-    When the maximum number of request attempts is reached, the function logs an error and returns None.
+    Waits between attempts according to retry_policy (see get_retry_delay). Requests that raise a RequestException
+    (e.g. a timeout or connection error) are retried like unsuccessful responses. Client errors (4xx responses
+    other than timeouts and rate limiting) are not retried when the policy says to fail fast.
+    When the maximum number of request attempts or the maximum total wait is reached,
+    the function logs an error and returns None.
     :param api_handler: Instance of ApiUtil
     :type api_handler: ApiUtil
     :param url: URL ending for request
@@ -62,25 +463,40 @@ def api_call_with_retries(
     :type payload: Dictionary with string keys or None, optional
     :param max_req_attempts: Number of request attempts to make before logging an error
     :type max_req_attempts: int, optional
-    :return: Either a Response object or None
-    :rtype: Response or None
+    :param retry_policy: Settings for delays between attempts
+    :type retry_policy: RetryPolicy or None, optional (default is the result of get_retry_policy for subscription)
+    :return: Either a ParsedResponse or None
+    :rtype: ParsedResponse or None
     """
     if payload is None:
         request_payload = dict()
     else:
         request_payload = payload
 
+    if retry_policy is None:
+        retry_policy = get_retry_policy(subscription)
+
     LOGGER.debug('Making a request for data...')
 
+    total_wait: float = 0.0
     for i in range(1, max_req_attempts + 1):
         LOGGER.debug(f'Attempt #{i}')
-        response = api_handler.api_call(url, subscription, method, request_payload)
-        LOGGER.debug(f'Response URL: {response.url}')
+        response: Union[Response, None] = None
+        try:
+            response = rate_limited_api_call(api_handler, url, subscription, method, request_payload)
+        except RequestException as e:
+            LOGGER.warning(f'The request failed: {e}')
+
+        parsed_response, should_retry = check_attempt_response(response, retry_policy)
+        if not should_retry:
+            return parsed_response
 
-        if not check_if_response_successful(response):
-            LOGGER.info('Beginning next_attempt')
-        else:
-            return response
+        if i < max_req_attempts:
+            delay: Union[float, None] = get_next_attempt_delay(response, i, total_wait, retry_policy)
+            if delay is None:
+                return None
+            time.sleep(delay)
+            total_wait += delay
 
     LOGGER.error('The maximum number of request attempts was reached; returning None')
     return None
@@ -1,62 +1,147 @@
 # standard libraries
-import logging
+import logging, os
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from logging import Logger
 from datetime import datetime, timedelta
 
 # third-party libraries
+from django.db import connection
 from django.utils.timezone import utc
 from umich_api.api_utils import ApiUtil
 
 # local libraries
-from pe.models import Exam, Report
-from pe.orchestration import ScoresOrchestration
-from pe.reporter import Reporter
+from pe.models import Exam, OutboxEmail, Report
+from pe.orchestration import ScoresOrchestration, reconcile_score_batches
+from pe.reporter import Reporter, send_outbox_emails
 
 
 LOGGER: Logger = logging.getLogger(__name__)
 
+# Number of exams to process at the same time; 1 processes exams serially
+EXAM_WORKERS: int = int(os.getenv('EXAM_WORKERS', '1'))
+# Whether to send queued report emails at the end of a run; otherwise the send_emails command sends them
+EMAIL_OUTBOX_DRAIN: bool = bool(int(os.getenv('EMAIL_OUTBOX_DRAIN', '1')))
 
-def main(api_util: ApiUtil) -> None:
+
+def process_exam(api_util: ApiUtil, exam: Exam) -> dict[str, datetime]:
+    """
+    Runs ScoresOrchestration for a single exam and returns time metadata for the Reporter.
+
+    :param api_util: Instance of ApiUtil for making API calls
+    :type api_util: ApiUtil
+    :param exam: Exam model instance for the exam to be processed
+    :type exam: Exam
+    :return: Dictionary with the start and end times of processing and the submission time filter used
+    :rtype: Dictionary with string keys and datetime values
+    """
+    LOGGER.info(f'Processing Exam: {exam.name}')
+    exam_start_time = datetime.now(tz=utc)
+    exam_orca: ScoresOrchestration = ScoresOrchestration(api_util, exam)
+    exam_orca.main()
+    exam_end_time = datetime.now(tz=utc)
+    metadata: dict[str, datetime] = {
+        'start_time': exam_start_time,
+        'end_time': exam_end_time,
+        'sub_time_filter': exam_orca.sub_time_filter
+    }
+    return metadata
+
+
+def process_exam_in_thread(api_util: ApiUtil, exam: Exam) -> dict[str, datetime]:
+    """
+    Wraps process_exam for use by a worker thread, closing the thread's database connection when finished.
+
+    :param api_util: Instance of ApiUtil for making API calls
+    :type api_util: ApiUtil
+    :param exam: Exam model instance for the exam to be processed
+    :type exam: Exam
+    :return: Time metadata returned by process_exam
+    :rtype: Dictionary with string keys and datetime values
+    """
+    try:
+        return process_exam(api_util, exam)
+    finally:
+        # Django opens a connection per thread; it will not be cleaned up automatically for pool threads.
+        connection.close()
+
+
+def process_exams_concurrently(api_util: ApiUtil, reporters: list[Reporter], num_workers: int) -> None:
+    """
+    Processes the exams for all reports using a bounded pool of worker threads,
+    assigning each exam's time metadata to the Reporter for its report.
+
+    :param api_util: Instance of ApiUtil for making API calls
+    :type api_util: ApiUtil
+    :param reporters: Reporter instances for the reports whose exams should be processed
+    :type reporters: List of Reporter instances
+    :param num_workers: Maximum number of exams to process at the same time
+    :type num_workers: int
+    :return: None
+    :rtype: None
+    """
+    LOGGER.info(f'Processing exams concurrently with up to {num_workers} worker(s)')
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='exam') as executor:
+        future_to_exam: dict[Future, tuple[Reporter, Exam]] = {}
+        for reporter in reporters:
+            for exam in reporter.report.exams.all():
+                future: Future = executor.submit(process_exam_in_thread, api_util, exam)
+                future_to_exam[future] = (reporter, exam)
+
+        for future in as_completed(future_to_exam):
+            reporter, exam = future_to_exam[future]
+            reporter.exams_time_metadata[exam.id] = future.result()
+
+
+def main(api_util: ApiUtil, exam_workers: int = EXAM_WORKERS, drain_outbox: bool = EMAIL_OUTBOX_DRAIN) -> None:
     """
     Runs the highest-level application process, coordinating the use of ScoresOrchestration and Reporter
-    classes and the transfer of data between them.
+    classes and the transfer of data between them. Report emails are queued in the outbox as each report is prepared,
+    so mail delivery does not hold up processing and is not lost if it fails.
 
     :param api_util: Instance of ApiUtil for making API calls
     :type api_util: ApiUtil
+    :param exam_workers: Number of exams to process at the same time; 1 processes exams serially
+    :type exam_workers: int, optional (default is the EXAM_WORKERS environment variable or 1)
+    :param drain_outbox: Whether to send the emails in the outbox once all reports are prepared
+    :type drain_outbox: bool, optional (default is the EMAIL_OUTBOX_DRAIN environment variable or True)
     :return: None
     :rtype: None
     """
     start_time: datetime = datetime.now(tz=utc)
     LOGGER.info(f'Starting new run at {start_time}')
 
-    reports: list[Report] = list(Report.objects.all())
-    LOGGER.debug(reports)
-
-    exams: list[Exam] = list(Exam.objects.all())
-    LOGGER.debug(exams)
-
-    for report in reports:
-        reporter: Reporter = Reporter(report)
-        for exam in report.exams.all():
-            LOGGER.info(f'Processing Exam: {exam.name}')
-            exam_start_time = datetime.now(tz=utc)
-            exam_orca: ScoresOrchestration = ScoresOrchestration(api_util, exam)
-            exam_orca.main()
-            exam_end_time = datetime.now(tz=utc)
-            metadata: dict[str, datetime] = {
-                'start_time': exam_start_time,
-                'end_time': exam_end_time,
-                'sub_time_filter': exam_orca.sub_time_filter
-            }
-            reporter.exams_time_metadata[exam.id] = metadata
+    # Settle any score batches an earlier run left in flight before finding scores to send
+    reconcile_score_batches()
+
+    # Each report's exams are loaded with it and reused for processing and reporting
+    reports: list[Report] = list(Report.objects.prefetch_related('exams'))
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug(reports)
+        LOGGER.debug([exam for report in reports for exam in report.exams.all()])
+
+    reporters: list[Reporter] = [Reporter(report) for report in reports]
+    if exam_workers > 1:
+        process_exams_concurrently(api_util, reporters, exam_workers)
+
+    for reporter in reporters:
+        report: Report = reporter.report
+        if exam_workers <= 1:
+            for exam in report.exams.all():
+                reporter.exams_time_metadata[exam.id] = process_exam(api_util, exam)
 
         reporter.prepare_context()
         if reporter.total_successes > 0 or reporter.total_failures > 0:
-            LOGGER.info(f'Sending {report.name} report email to {report.contact}')
-            reporter.send_email()
+            LOGGER.info(f'Queuing {report.name} report email to {report.contact}')
+            OutboxEmail.queue(reporter.make_email(), report)
         else:
             LOGGER.info(f'No email will be sent for the {report.name} report as there was no transmission activity.')
 
+    # Queued emails (including any left by earlier runs) are sent together over one mail server connection
+    if drain_outbox:
+        num_unsent: int = send_outbox_emails()
+        if num_unsent > 0:
+            LOGGER.error(f'{num_unsent} report email(s) could not be sent and remain in the outbox')
+
     end_time: datetime = datetime.now(tz=utc)
     delta: timedelta = end_time - start_time
 
@@ -7,12 +7,19 @@ from django.core.management.base import BaseCommand
 from umich_api.api_utils import ApiUtil
 
 # local libraries
+from api_retry.session import PooledApiUtil
 from constants import API_CONFIG_PATH
 from pe.main import main
+from pe.models import ApiToken
 
 
 LOGGER: Logger = logging.getLogger(__name__)
 
+# Whether to send API requests through one pooled session (see api_retry.session.PooledApiUtil)
+API_POOLED_SESSION: bool = bool(int(os.getenv('API_POOLED_SESSION', '0')))
+# Whether a pooled session should reuse access tokens stored in the database by earlier runs
+API_TOKEN_CACHE: bool = bool(int(os.getenv('API_TOKEN_CACHE', '1')))
+
 
 class Command(BaseCommand):
     """
@@ -23,18 +30,27 @@ class Command(BaseCommand):
         """
         Entrypoint method required by BaseCommand class (see Django docs).
         Checks whether the ApiUtil instance is properly configured, invoking the main function if so
-        and exiting if not.
+        and exiting if not. When API_POOLED_SESSION is set, one PooledApiUtil is built and shared by all requests;
+        unless API_TOKEN_CACHE is turned off, it checks ApiToken for tokens from earlier runs before authenticating.
         """
+        api_util_args: tuple[str, ...] = (
+            os.getenv('API_DIR_URL', ''),
+            os.getenv('API_DIR_CLIENT_ID', ''),
+            os.getenv('API_DIR_SECRET', ''),
+            API_CONFIG_PATH
+        )
         try:
-            api_util: ApiUtil = ApiUtil(
-                os.getenv('API_DIR_URL', ''),
-                os.getenv('API_DIR_CLIENT_ID', ''),
-                os.getenv('API_DIR_SECRET', ''),
-                API_CONFIG_PATH
-            )
+            if API_POOLED_SESSION:
+                api_util: ApiUtil = PooledApiUtil(*api_util_args, token_store=ApiToken if API_TOKEN_CACHE else None)
+            else:
+                api_util = ApiUtil(*api_util_args)
         except Exception as e:
             LOGGER.error(e)
             LOGGER.error('api_util was improperly configured; the program will exit.')
             sys.exit(1)
 
-        main(api_util)
+        try:
+            main(api_util)
+        finally:
+            if isinstance(api_util, PooledApiUtil):
+                api_util.close()
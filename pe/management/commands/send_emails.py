@@ -0,0 +1,28 @@
+# standard libraries
+import logging, sys
+from logging import Logger
+
+# third-party libraries
+from django.core.management.base import BaseCommand
+
+# local libraries
+from pe.reporter import send_outbox_emails
+
+
+LOGGER: Logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Django management command used for sending the report emails waiting in the outbox.
+    """
+
+    def handle(self, *args, **options) -> None:
+        """
+        Entrypoint method required by BaseCommand class (see Django docs).
+        Sends queued emails using send_outbox_emails, exiting with an error status if any could not be sent.
+        """
+        num_unsent: int = send_outbox_emails()
+        if num_unsent > 0:
+            LOGGER.error(f'{num_unsent} email(s) could not be sent and remain in the outbox')
+            sys.exit(1)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pe', '0005_auto_20200721_1225'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exam', 'transmitted', 'graded_timestamp'], name='sub_exam_trans_graded_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exam', 'graded_timestamp'], name='sub_exam_graded_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-17 06:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pe', '0006_submission_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamSyncCursor',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='Exam Sync Cursor ID')),
+                ('last_graded_timestamp', models.DateTimeField(null=True, verbose_name='Latest Stored Graded At Date & Time')),
+                ('last_page_url', models.CharField(default=None, max_length=2000, null=True, verbose_name='Canvas Page URL to Resume From')),
+                ('updated_timestamp', models.DateTimeField(auto_now=True, verbose_name='Updated At Date & Time')),
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_cursor', to='pe.exam')),
+            ],
+        ),
+    ]
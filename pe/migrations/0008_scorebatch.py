@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-17 07:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pe', '0007_examsynccursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreBatch',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='Score Batch ID')),
+                ('payload_hash', models.CharField(max_length=64, verbose_name='SHA-256 Hash of Request Payload')),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('received', 'Received'), ('completed', 'Completed'), ('failed', 'Failed'), ('abandoned', 'Abandoned')], db_index=True, default='pending', max_length=10, verbose_name='Batch State')),
+                ('response_text', models.TextField(default=None, null=True, verbose_name='M-Pathways Response Text')),
+                ('created_timestamp', models.DateTimeField(auto_now_add=True, verbose_name='Created At Date & Time')),
+                ('updated_timestamp', models.DateTimeField(auto_now=True, verbose_name='Updated At Date & Time')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_batches', to='pe.exam')),
+                ('submissions', models.ManyToManyField(related_name='score_batches', to='pe.submission')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pe', '0008_scorebatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiToken',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='API Token ID')),
+                ('scope', models.CharField(max_length=255, unique=True, verbose_name='API Directory Scope')),
+                ('access_token', models.TextField(verbose_name='Access Token')),
+                ('expires_timestamp', models.DateTimeField(verbose_name='Expires At Date & Time')),
+                ('updated_timestamp', models.DateTimeField(auto_now=True, verbose_name='Updated At Date & Time')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-17 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pe', '0009_apitoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='Outbox Email ID')),
+                ('subject', models.TextField(verbose_name='Email Subject')),
+                ('body', models.TextField(verbose_name='Plain Text Email Body')),
+                ('html_body', models.TextField(default=None, null=True, verbose_name='HTML Email Body')),
+                ('from_email', models.CharField(max_length=255, verbose_name='Email Sender')),
+                ('to', models.JSONField(verbose_name='Email Recipients')),
+                ('attachments', models.JSONField(default=list, verbose_name='Email Attachments')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Number of Sending Attempts')),
+                ('created_timestamp', models.DateTimeField(auto_now_add=True, verbose_name='Created At Date & Time')),
+                ('claimed_timestamp', models.DateTimeField(default=None, null=True, verbose_name='Claimed At Date & Time')),
+                ('sent_timestamp', models.DateTimeField(db_index=True, default=None, null=True, verbose_name='Sent At Date & Time')),
+                ('report', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox_emails', to='pe.report')),
+            ],
+        ),
+    ]
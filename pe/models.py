@@ -1,11 +1,15 @@
 # standard libaries
 import logging
 from datetime import datetime
-from typing import Union
+from typing import Any, NamedTuple, Union
 
 # third-party libraries
-from django.db import models
+from django.core.mail import EmailMultiAlternatives
+from django.db import models, transaction
+from django.db.models import Max, QuerySet
 from django.db.models.constraints import BaseConstraint
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import utc
 
 
 LOGGER = logging.getLogger(__name__)
@@ -39,17 +43,94 @@ class Exam(models.Model):
     def get_last_sub_graded_datetime(self) -> Union[datetime, None]:
         """
         Return latest graded_timestamp value for an exam's submissions, or None.
+        The exam's ExamSyncCursor is used when present; otherwise, the value is aggregated from the submissions.
 
         :return: Either a datetime object or null.
         :rtype: datetime.datetime or None
         """
-        last_graded_dt = None
-        sub_ordered_queryset = self.submissions.order_by('-graded_timestamp')
-        if sub_ordered_queryset.exists():
-            last_graded_dt = sub_ordered_queryset.first().graded_timestamp
+        try:
+            last_graded_dt: Union[datetime, None] = self.sync_cursor.last_graded_timestamp
+        except ExamSyncCursor.DoesNotExist:
+            last_graded_dt = None
+
+        if last_graded_dt is None:
+            last_graded_dt = self.submissions.aggregate(Max('graded_timestamp'))['graded_timestamp__max']
         LOGGER.debug(last_graded_dt)
         return last_graded_dt
 
+    def advance_sync_cursor(
+        self, graded_dt: Union[datetime, None], last_page_url: Union[str, None] = None
+    ) -> 'ExamSyncCursor':
+        """
+        Record the latest graded_timestamp of newly stored submissions and the Canvas page URL to resume from
+        in the exam's ExamSyncCursor, creating the cursor if needed. The graded_timestamp never moves backwards.
+        Call this only once all the submissions fetched since the last sync have been stored.
+
+        :param graded_dt: Latest graded_timestamp of the submissions just stored, or None if there were none
+        :type graded_dt: datetime.datetime or None
+        :param last_page_url: Canvas page URL at which fetching was interrupted, or None if it completed
+        :type last_page_url: str or None, optional (default is None)
+        :return: The updated cursor
+        :rtype: ExamSyncCursor
+        """
+        with transaction.atomic():
+            cursor, created = ExamSyncCursor.objects.select_for_update().get_or_create(exam=self)
+            if created and graded_dt is not None:
+                # Submissions stored before the cursor existed may have later timestamps than the new ones
+                last_stored_dt: Union[datetime, None] = (
+                    self.submissions.aggregate(Max('graded_timestamp'))['graded_timestamp__max']
+                )
+                if last_stored_dt is not None and last_stored_dt > graded_dt:
+                    graded_dt = last_stored_dt
+            if graded_dt is not None and (
+                cursor.last_graded_timestamp is None or graded_dt > cursor.last_graded_timestamp
+            ):
+                cursor.last_graded_timestamp = graded_dt
+            cursor.last_page_url = last_page_url
+            cursor.save()
+        self.sync_cursor = cursor
+        return cursor
+
+    def hold_sync_cursor(self, graded_dt: datetime, last_page_url: Union[str, None] = None) -> 'ExamSyncCursor':
+        """
+        Record the Canvas page URL to resume from in the exam's ExamSyncCursor after a fetch stopped partway,
+        without advancing its graded_timestamp. A new cursor starts at graded_dt rather than at the latest stored
+        submission, since submissions graded earlier may be on pages that were not fetched or stored.
+
+        :param graded_dt: The graded_timestamp the interrupted fetch started after
+        :type graded_dt: datetime.datetime
+        :param last_page_url: Canvas page URL at which fetching was interrupted, or None if it was not recorded
+        :type last_page_url: str or None, optional (default is None)
+        :return: The updated cursor
+        :rtype: ExamSyncCursor
+        """
+        with transaction.atomic():
+            cursor, _ = ExamSyncCursor.objects.select_for_update().get_or_create(
+                exam=self, defaults={'last_graded_timestamp': graded_dt}
+            )
+            if cursor.last_graded_timestamp is None:
+                cursor.last_graded_timestamp = graded_dt
+            cursor.last_page_url = last_page_url
+            cursor.save()
+        self.sync_cursor = cursor
+        return cursor
+
+
+class ExamSyncCursor(models.Model):
+    id = models.AutoField(primary_key=True, verbose_name='Exam Sync Cursor ID')
+    exam = models.OneToOneField(to='Exam', related_name='sync_cursor', on_delete=models.CASCADE)
+    last_graded_timestamp = models.DateTimeField(verbose_name='Latest Stored Graded At Date & Time', null=True)
+    last_page_url = models.CharField(
+        max_length=2000, verbose_name='Canvas Page URL to Resume From', null=True, default=None
+    )
+    updated_timestamp = models.DateTimeField(verbose_name='Updated At Date & Time', auto_now=True)
+
+    def __str__(self):
+        return (
+            f'(id={self.id}, exam_id={self.exam_id}, last_graded_timestamp={self.last_graded_timestamp}, ' +
+            f'last_page_url={self.last_page_url}, updated_timestamp={self.updated_timestamp})'
+        )
+
 
 class Submission(models.Model):
     id = models.AutoField(primary_key=True, verbose_name='Submission ID')
@@ -75,17 +156,240 @@ class Submission(models.Model):
         constraints: list[BaseConstraint] = [
             models.UniqueConstraint(fields=['submission_id', 'graded_timestamp'], name='unique_canvas_submission')
         ]
+        # Composite indexes matching how submissions are looked up for each exam during a run
+        indexes: list[models.Index] = [
+            # Un-transmitted submissions in graded order (ScoresOrchestration, Reporter)
+            models.Index(fields=['exam', 'transmitted', 'graded_timestamp'], name='sub_exam_trans_graded_ts_idx'),
+            # Latest graded submission and submissions graded since a time (Exam, Reporter)
+            models.Index(fields=['exam', 'graded_timestamp'], name='sub_exam_graded_ts_idx')
+        ]
 
-    def prepare_score(self) -> dict[str, str]:
+    @staticmethod
+    def format_score(student_uniqname: str, score: float, sa_code: str) -> dict[str, str]:
         """
-        Return condensed version of the submission needed by M-Pathways.
+        Return condensed version of a submission's values in the format needed by M-Pathways.
 
+        :param student_uniqname: Student uniqname for the submission
+        :type student_uniqname: str
+        :param score: Score for the submission
+        :type score: float
+        :param sa_code: SA code of the submission's exam
+        :type sa_code: str
         :return: Dictionary with strings for keys and values.
         :rtype: dictionary
         """
         score_dict: dict[str, str] = {
-            'ID': self.student_uniqname,
-            'Form': self.exam.sa_code,
-            'GradePoints': str(self.score)
+            'ID': student_uniqname,
+            'Form': sa_code,
+            'GradePoints': str(score)
         }
         return score_dict
+
+    def prepare_score(self) -> dict[str, str]:
+        """
+        Return condensed version of the submission needed by M-Pathways.
+        Note this accesses the related exam, which requires a query if the exam has not been loaded.
+
+        :return: Dictionary with strings for keys and values.
+        :rtype: dictionary
+        """
+        return self.format_score(self.student_uniqname, self.score, self.exam.sa_code)
+
+
+class SubmissionRecord(NamedTuple):
+    """
+    Compact form of the submission fields used while gathering, storing, and sending scores,
+    used in place of Canvas dictionaries and Submission model instances.
+    """
+
+    # None until the submission is stored
+    id: Union[int, None]
+    submission_id: int
+    attempt_num: Union[int, None]
+    student_uniqname: str
+    submitted_timestamp: Union[datetime, None]
+    graded_timestamp: datetime
+    score: float
+
+    @classmethod
+    def from_canvas(cls, sub_dict: dict[str, Any]) -> 'SubmissionRecord':
+        """
+        Creates a record from a Canvas submission dictionary, which must include the user's login_id
+        and a valid graded_at value; raises an exception if either is missing or malformed.
+
+        :param sub_dict: Submission dictionary from Canvas
+        :type sub_dict: Dictionary with string keys
+        :return: Record for the submission, without a database ID
+        :rtype: SubmissionRecord
+        """
+        submitted_at: Union[str, None] = sub_dict['submitted_at']
+        graded_timestamp: Union[datetime, None] = parse_datetime(sub_dict['graded_at'])
+        if graded_timestamp is None:
+            raise ValueError(f"Invalid graded_at value: {sub_dict['graded_at']}")
+        return cls(
+            id=None,
+            submission_id=sub_dict['id'],
+            attempt_num=sub_dict['attempt'],
+            student_uniqname=sub_dict['user']['login_id'].strip(),
+            submitted_timestamp=parse_datetime(submitted_at) if submitted_at is not None else None,
+            graded_timestamp=graded_timestamp,
+            score=sub_dict['score']
+        )
+
+    @classmethod
+    def load(cls, sub_qs: QuerySet) -> list['SubmissionRecord']:
+        """
+        Loads records for the submissions in a QuerySet using values_list, without creating model instances.
+
+        :param sub_qs: QuerySet of Submissions
+        :type sub_qs: QuerySet
+        :return: Records in the order of the QuerySet
+        :rtype: List of SubmissionRecords
+        """
+        return [cls._make(row) for row in sub_qs.values_list(*cls._fields)]
+
+
+class ScoreBatch(models.Model):
+    class State(models.TextChoices):
+        # Recorded before the request; the outcome is unknown until the state changes
+        PENDING = 'pending', 'Pending'
+        # The response was received and stored, but submissions have not yet been updated
+        RECEIVED = 'received', 'Received'
+        # Submissions were updated using the response
+        COMPLETED = 'completed', 'Completed'
+        # The request failed or M-Pathways returned an error; no scores were accepted
+        FAILED = 'failed', 'Failed'
+        # The run ended while the request was in flight; the scores will be sent again
+        ABANDONED = 'abandoned', 'Abandoned'
+
+    id = models.AutoField(primary_key=True, verbose_name='Score Batch ID')
+    exam = models.ForeignKey(to='Exam', related_name='score_batches', on_delete=models.CASCADE)
+    submissions = models.ManyToManyField(to='Submission', related_name='score_batches')
+    payload_hash = models.CharField(max_length=64, verbose_name='SHA-256 Hash of Request Payload')
+    state = models.CharField(
+        max_length=10, verbose_name='Batch State', choices=State.choices, default=State.PENDING, db_index=True
+    )
+    response_text = models.TextField(verbose_name='M-Pathways Response Text', null=True, default=None)
+    created_timestamp = models.DateTimeField(verbose_name='Created At Date & Time', auto_now_add=True)
+    updated_timestamp = models.DateTimeField(verbose_name='Updated At Date & Time', auto_now=True)
+
+    def __str__(self):
+        return (
+            f'(id={self.id}, exam_id={self.exam_id}, payload_hash={self.payload_hash}, state={self.state}, ' +
+            f'created_timestamp={self.created_timestamp}, updated_timestamp={self.updated_timestamp})'
+        )
+
+
+class ApiToken(models.Model):
+    id = models.AutoField(primary_key=True, verbose_name='API Token ID')
+    scope = models.CharField(max_length=255, verbose_name='API Directory Scope', unique=True)
+    access_token = models.TextField(verbose_name='Access Token')
+    expires_timestamp = models.DateTimeField(verbose_name='Expires At Date & Time')
+    updated_timestamp = models.DateTimeField(verbose_name='Updated At Date & Time', auto_now=True)
+
+    def __str__(self):
+        # The token itself is left out so it does not end up in logs
+        return (
+            f'(id={self.id}, scope={self.scope}, expires_timestamp={self.expires_timestamp}, ' +
+            f'updated_timestamp={self.updated_timestamp})'
+        )
+
+    @classmethod
+    def get_token(cls, scope: str) -> Union[tuple[str, float], None]:
+        """
+        Return the stored access token for a scope and when it expires, or None if there is none.
+
+        :param scope: Name of the API Directory scope
+        :type scope: str
+        :return: Either a tuple of the access token and its expiry time in seconds since the epoch, or None
+        :rtype: Tuple of a string and a float, or None
+        """
+        api_token: Union[ApiToken, None] = cls.objects.filter(scope=scope).first()
+        if api_token is None:
+            return None
+        return (api_token.access_token, api_token.expires_timestamp.timestamp())
+
+    @classmethod
+    def put_token(cls, scope: str, access_token: str, expires_at: float) -> None:
+        """
+        Store the access token for a scope, replacing any previous token.
+
+        :param scope: Name of the API Directory scope
+        :type scope: str
+        :param access_token: Access token
+        :type access_token: str
+        :param expires_at: Expiry time of the token in seconds since the epoch
+        :type expires_at: float
+        :return: None
+        :rtype: None
+        """
+        cls.objects.update_or_create(
+            scope=scope,
+            defaults={
+                'access_token': access_token,
+                'expires_timestamp': datetime.fromtimestamp(expires_at, tz=utc)
+            }
+        )
+
+
+class OutboxEmail(models.Model):
+    id = models.AutoField(primary_key=True, verbose_name='Outbox Email ID')
+    report = models.ForeignKey(to='Report', related_name='outbox_emails', null=True, on_delete=models.SET_NULL)
+    subject = models.TextField(verbose_name='Email Subject')
+    body = models.TextField(verbose_name='Plain Text Email Body')
+    html_body = models.TextField(verbose_name='HTML Email Body', null=True, default=None)
+    from_email = models.CharField(max_length=255, verbose_name='Email Sender')
+    to = models.JSONField(verbose_name='Email Recipients')
+    # Each attachment is a list of its filename, text content, and MIME type
+    attachments = models.JSONField(verbose_name='Email Attachments', default=list)
+    attempts = models.IntegerField(verbose_name='Number of Sending Attempts', default=0)
+    created_timestamp = models.DateTimeField(verbose_name='Created At Date & Time', auto_now_add=True)
+    # Set while a call to send_outbox_emails is sending the email, so other calls skip it
+    claimed_timestamp = models.DateTimeField(verbose_name='Claimed At Date & Time', null=True, default=None)
+    sent_timestamp = models.DateTimeField(verbose_name='Sent At Date & Time', null=True, default=None, db_index=True)
+
+    def __str__(self):
+        return (
+            f'(id={self.id}, report_id={self.report_id}, subject={self.subject}, to={self.to}, ' +
+            f'attempts={self.attempts}, created_timestamp={self.created_timestamp}, ' +
+            f'claimed_timestamp={self.claimed_timestamp}, sent_timestamp={self.sent_timestamp})'
+        )
+
+    @classmethod
+    def queue(cls, message: EmailMultiAlternatives, report: Union[Report, None] = None) -> 'OutboxEmail':
+        """
+        Store a rendered email message so it can be sent later.
+
+        :param message: Email message, with an optional HTML alternative and text attachments
+        :type message: EmailMultiAlternatives
+        :param report: Report the email is for
+        :type report: Report or None, optional
+        :return: Stored outbox email
+        :rtype: OutboxEmail
+        """
+        html_bodies: list[str] = [content for content, mimetype in message.alternatives if mimetype == 'text/html']
+        return cls.objects.create(
+            report=report,
+            subject=message.subject,
+            body=message.body,
+            html_body=html_bodies[0] if len(html_bodies) > 0 else None,
+            from_email=message.from_email,
+            to=list(message.to),
+            attachments=[list(attachment) for attachment in message.attachments]
+        )
+
+    def to_message(self) -> EmailMultiAlternatives:
+        """
+        Return the stored email as a message ready to be sent.
+
+        :return: Email message with the stored HTML alternative and attachments, if any
+        :rtype: EmailMultiAlternatives
+        """
+        message: EmailMultiAlternatives = EmailMultiAlternatives(
+            subject=self.subject, body=self.body, from_email=self.from_email, to=self.to
+        )
+        if self.html_body is not None:
+            message.attach_alternative(self.html_body, 'text/html')
+        for filename, content, mimetype in self.attachments:
+            message.attach(filename, content, mimetype)
+        return message
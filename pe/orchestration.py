@@ -1,26 +1,289 @@
 # standard libraries
-import json, logging, os
+import hashlib, json, logging, os, time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Iterable, Iterator, Union
+from urllib.parse import parse_qs, urlencode, urlparse
 
 # third-party libraries
-from django.db.models import Count, QuerySet
+from django.db import connection, transaction
 from django.utils.timezone import utc
 from requests import Response
+from requests.exceptions import RequestException
 from umich_api.api_utils import ApiUtil
 
 # local libraries
-from api_retry.util import api_call_with_retries, check_if_response_successful
+from api_retry.util import (
+    ParsedResponse, api_call_with_retries, get_api_limits, loads_json, parse_successful_response, wait_for_rate_limit
+)
 from constants import (
-    CANVAS_SCOPE, CANVAS_URL_BEGIN, ISO8601_FORMAT, MPATHWAYS_SCOPE, MPATHWAYS_URL
+    API_CONFIG_PATH, CANVAS_SCOPE, CANVAS_URL_BEGIN, ISO8601_FORMAT, MPATHWAYS_SCOPE, MPATHWAYS_URL
 )
-from pe.models import Exam, Submission
-from util import chunk_list
+from pe.models import Exam, ScoreBatch, Submission, SubmissionRecord
+from util import AdaptiveBatcher, chunk_list
 
 
 LOGGER = logging.getLogger(__name__)
 
 MAX_REQ_ATTEMPTS = int(os.getenv('MAX_REQ_ATTEMPTS', '3'))
+# Number of Canvas pages to fetch at the same time when page numbers are known; 1 fetches pages serially
+CANVAS_PAGE_WORKERS = int(os.getenv('CANVAS_PAGE_WORKERS', '1'))
+# Whether to insert Canvas submissions page by page as they arrive instead of after gathering them all
+STREAM_SUB_RECORDS = bool(int(os.getenv('STREAM_SUB_RECORDS', '0')))
+# Number of submissions to insert with each INSERT statement
+SUB_BATCH_SIZE = int(os.getenv('SUB_BATCH_SIZE', '500'))
+# How to handle Canvas submissions that are already stored: 'ignore', 'update', or 'error'
+SUB_CONFLICT_MODE = os.getenv('SUB_CONFLICT_MODE', 'ignore')
+SUB_CONFLICT_MODES: tuple[str, ...] = ('error', 'ignore', 'update')
+# Fields overwritten with Canvas values when SUB_CONFLICT_MODE is 'update'; transmission state is left alone
+SUB_CONFLICT_UPDATE_FIELDS: list[str] = ['attempt_num', 'student_uniqname', 'submitted_timestamp', 'score']
+# Whether to adapt the number of scores sent per M-Pathways request to recent latency and errors
+ADAPTIVE_SCORE_BATCHING = bool(int(os.getenv('ADAPTIVE_SCORE_BATCHING', '0')))
+SCORE_BATCH_MIN_SIZE = int(os.getenv('SCORE_BATCH_MIN_SIZE', '10'))
+SCORE_BATCH_MAX_SIZE = int(os.getenv('SCORE_BATCH_MAX_SIZE', '500'))
+# Number of seconds within which a request must succeed for the batch size to grow
+SCORE_BATCH_TARGET_LATENCY = float(os.getenv('SCORE_BATCH_TARGET_LATENCY', '5.0'))
+# Number of days to keep ScoreBatches that are completed, failed, or abandoned
+SCORE_BATCH_RETENTION_DAYS = int(os.getenv('SCORE_BATCH_RETENTION_DAYS', '30'))
+# Whether to keep only the Canvas submission fields used to create Submission records as each page is parsed
+SLIM_CANVAS_SUBS = bool(int(os.getenv('SLIM_CANVAS_SUBS', '0')))
+# Canvas submission fields used to create Submission records, besides the user's login_id
+CANVAS_SUB_FIELDS: tuple[str, ...] = ('id', 'attempt', 'submitted_at', 'graded_at', 'score')
+
+
+def get_last_page_num(response: Response) -> Union[int, None]:
+    """
+    Finds the last page number in the Link header of a Canvas response, if Canvas provided one.
+
+    Canvas omits the "last" link or uses opaque bookmarks instead of page numbers for some result sets;
+    None is returned in those cases.
+
+    :param response: Response from a paginated Canvas API request
+    :type response: Response
+    :return: Either the last page number or None
+    :rtype: int or None
+    """
+    last_link: Union[dict[str, str], None] = response.links.get('last')
+    if not last_link or 'url' not in last_link:
+        return None
+    page_values: list[str] = parse_qs(urlparse(last_link['url']).query).get('page', [])
+    if len(page_values) == 0 or not page_values[0].isdigit():
+        return None
+    return int(page_values[0])
+
+
+def project_sub_dicts(sub_dicts: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Reduces Canvas submission dictionaries to the fields used to create Submission records,
+    keeping only login_id from the user dictionary, so the rest of each page can be freed.
+
+    :param sub_dicts: Submission dictionaries from a Canvas page, including user dictionaries
+    :type sub_dicts: List of dictionaries with string keys
+    :return: Submission dictionaries with only the fields in CANVAS_SUB_FIELDS and user login_id
+    :rtype: List of dictionaries with string keys
+    """
+    return [
+        {
+            **{field: sub_dict[field] for field in CANVAS_SUB_FIELDS},
+            'user': {'login_id': sub_dict['user']['login_id']}
+        }
+        for sub_dict in sub_dicts
+    ]
+
+
+def get_page_url(url_ending: str, params: dict[str, Any]) -> str:
+    """
+    Combines a URL ending and request parameters into the URL (without the API base) of a Canvas page.
+
+    :param url_ending: URL ending for the Canvas request
+    :type url_ending: string
+    :param params: Parameters for the page request
+    :type params: Dictionary with string keys
+    :return: URL ending with the parameters as its query string
+    :rtype: string
+    """
+    return f'{url_ending}?{urlencode(params)}'
+
+
+def get_conflict_options(conflict_mode: str) -> dict[str, Any]:
+    """
+    Determines the bulk_create options for handling submissions that violate unique_canvas_submission,
+    based on the conflict mode and what the database supports. If the database does not support the mode,
+    a warning is logged and conflicts will cause errors.
+
+    :param conflict_mode: One of 'error', 'ignore', or 'update'
+    :type conflict_mode: string
+    :raises ValueError: If conflict_mode is not one of SUB_CONFLICT_MODES
+    :return: Keyword arguments for bulk_create
+    :rtype: Dictionary with string keys
+    """
+    if conflict_mode not in SUB_CONFLICT_MODES:
+        raise ValueError(f'Unknown submission conflict mode: {conflict_mode}')
+
+    if conflict_mode == 'ignore' and connection.features.supports_ignore_conflicts:
+        return {'ignore_conflicts': True}
+    if conflict_mode == 'update' and connection.features.supports_update_conflicts:
+        options: dict[str, Any] = {'update_conflicts': True, 'update_fields': SUB_CONFLICT_UPDATE_FIELDS}
+        # MySQL applies ON DUPLICATE KEY UPDATE to any unique key and does not accept a conflict target
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['submission_id', 'graded_timestamp']
+        return options
+    if conflict_mode != 'error':
+        LOGGER.warning(f'The database does not support conflict mode {conflict_mode}; conflicts will cause errors')
+    return {}
+
+
+def get_latest_graded_datetime(sub_records: Iterable[SubmissionRecord]) -> Union[datetime, None]:
+    """
+    Finds the latest graded timestamp among submission records.
+
+    :param sub_records: Records for submissions from Canvas
+    :type sub_records: Iterable of SubmissionRecords
+    :return: Either the latest graded timestamp or None if there were no submissions
+    :rtype: datetime or None
+    """
+    return max((sub_record.graded_timestamp for sub_record in sub_records), default=None)
+
+
+def to_sub_records(sub_dicts: Iterable[dict[str, Any]]) -> list[SubmissionRecord]:
+    """
+    Converts Canvas submission dictionaries to SubmissionRecords, skipping with a warning any dictionary
+    that is missing a required value or has one that cannot be converted.
+
+    :param sub_dicts: Dictionary results of Canvas API search
+    :type sub_dicts: Iterable of dictionaries with string keys
+    :return: Records for the submissions that could be converted
+    :rtype: List of SubmissionRecords
+    """
+    sub_records: list[SubmissionRecord] = []
+    for sub_dict in sub_dicts:
+        try:
+            sub_records.append(SubmissionRecord.from_canvas(sub_dict))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            LOGGER.warning(f"Skipped malformed Canvas submission {sub_dict.get('id')} ({e!r})")
+    return sub_records
+
+
+def get_success_uniqnames(resp_data: dict[str, Any]) -> set[str]:
+    """
+    Finds the uniqnames of the accepted scores in the parsed data of a successful M-Pathways response,
+    logging any record errors.
+
+    :param resp_data: Parsed data of the M-Pathways response
+    :type resp_data: Dictionary with string keys
+    :return: Uniqnames of the scores M-Pathways accepted
+    :rtype: Set of strings
+    """
+    LOGGER.debug(resp_data)
+
+    schema_name: str = 'putPlcExamScoreResponse'
+    results: dict[str, Any] = resp_data[schema_name][schema_name]
+
+    if results['BadCount'] > 0:
+        LOGGER.warning(f"Discovered {results['BadCount']} record error(s): {results['Errors']}")
+
+    # Hope this can be simplified in the future if API response data can be made to use consistent types
+    if results['GoodCount'] > 1:
+        success_uniqnames: set[str] = {success_dict['uniqname'] for success_dict in results['Success']}
+    elif results['GoodCount'] == 1:
+        success_uniqnames = {results['Success']['uniqname']}
+    else:
+        success_uniqnames = set()
+    return success_uniqnames
+
+
+def complete_score_batch(
+    score_batch: ScoreBatch, subs: list[SubmissionRecord], success_uniqnames: set[str]
+) -> None:
+    """
+    Marks the submissions whose scores M-Pathways accepted as transmitted and the ScoreBatch as completed,
+    in one transaction. Submissions are updated by ID, so Submission model instances can also be passed.
+
+    :param score_batch: ScoreBatch for the request that sent the scores
+    :type score_batch: ScoreBatch
+    :param subs: Submissions whose scores were sent
+    :type subs: List of SubmissionRecords
+    :param success_uniqnames: Uniqnames of the scores M-Pathways accepted
+    :type success_uniqnames: Set of strings
+    :return: None
+    :rtype: None
+    """
+    sub_ids_to_update: list[int] = [sub.id for sub in subs if sub.student_uniqname in success_uniqnames]
+
+    with transaction.atomic():
+        if len(sub_ids_to_update) > 0:
+            Submission.objects.filter(id__in=sub_ids_to_update).update(
+                transmitted=True, transmitted_timestamp=datetime.now(tz=utc)
+            )
+        score_batch.state = ScoreBatch.State.COMPLETED
+        score_batch.save(update_fields=['state', 'updated_timestamp'])
+
+    if len(sub_ids_to_update) == 0:
+        LOGGER.warning('No scores were transmitted successfully.')
+    else:
+        LOGGER.info(f'Transmitted {len(sub_ids_to_update)} score(s) successfully and updated submission record(s).')
+
+
+def prune_score_batches(retention_days: int) -> None:
+    """
+    Removes ScoreBatch data no longer needed for reconciliation. Failed and abandoned batches lose their links
+    to submissions, since those submissions were not transmitted by them, and batches that reached a final state
+    more than retention_days ago are deleted along with their links and stored responses.
+
+    :param retention_days: Number of days to keep completed, failed, and abandoned batches
+    :type retention_days: int
+    :return: None
+    :rtype: None
+    """
+    final_states: list[str] = [ScoreBatch.State.COMPLETED, ScoreBatch.State.FAILED, ScoreBatch.State.ABANDONED]
+    unsent_states: list[str] = [ScoreBatch.State.FAILED, ScoreBatch.State.ABANDONED]
+
+    num_links, _ = ScoreBatch.submissions.through.objects.filter(scorebatch__state__in=unsent_states).delete()
+    if num_links > 0:
+        LOGGER.info(f'Removed {num_links} submission link(s) from failed or abandoned score batches')
+
+    cutoff_dt: datetime = datetime.now(tz=utc) - timedelta(days=retention_days)
+    num_deleted, _ = ScoreBatch.objects.filter(state__in=final_states, updated_timestamp__lt=cutoff_dt).delete()
+    if num_deleted > 0:
+        LOGGER.info(f'Deleted {num_deleted} score batch object(s) older than {retention_days} day(s)')
+
+
+def reconcile_score_batches() -> None:
+    """
+    Reconciles ScoreBatches left in flight by an earlier run. Batches with a stored response are completed
+    using that response, without sending the scores again. Batches without one are marked abandoned;
+    their submissions are still un-transmitted, so they will be sent again. Old and unsent batches are then
+    pruned (see prune_score_batches).
+
+    :return: None
+    :rtype: None
+    """
+    received_batches: list[ScoreBatch] = list(ScoreBatch.objects.filter(state=ScoreBatch.State.RECEIVED))
+    for score_batch in received_batches:
+        LOGGER.info(f'Applying the stored M-Pathways response for score batch {score_batch.id}')
+        try:
+            success_uniqnames: set[str] = get_success_uniqnames(loads_json(score_batch.response_text))
+        except (KeyError, TypeError, ValueError) as e:
+            # A response that cannot be read now never will be, so the batch is given up on instead of retried
+            LOGGER.error(
+                f'The stored response for score batch {score_batch.id} could not be read ({e!r}); marking it failed'
+            )
+            ScoresOrchestration.update_score_batch(score_batch, ScoreBatch.State.FAILED)
+            continue
+        complete_score_batch(
+            score_batch, SubmissionRecord.load(score_batch.submissions.filter(transmitted=False)), success_uniqnames
+        )
+
+    num_abandoned: int = ScoreBatch.objects.filter(state=ScoreBatch.State.PENDING).update(
+        state=ScoreBatch.State.ABANDONED, updated_timestamp=datetime.now(tz=utc)
+    )
+    if num_abandoned > 0:
+        LOGGER.warning(
+            f'Found {num_abandoned} score batch(es) with no recorded response; un-transmitted scores will be re-sent'
+        )
+
+    prune_score_batches(SCORE_BATCH_RETENTION_DAYS)
 
 
 class ScoresOrchestration:
@@ -31,7 +294,8 @@ class ScoresOrchestration:
 
     def __init__(self, api_handler: ApiUtil, exam: Exam) -> None:
         """
-        Sets the ApiUtil instance and exam as instance variables, then determines the sub_time_filter value.
+        Sets the ApiUtil instance and exam as instance variables, then determines the sub_time_filter value
+        from the exam's sync cursor (see Exam.get_last_sub_graded_datetime).
 
         :param api_handler: Instance of ApiUtil for making API calls
         :type api_handler: ApiUtil
@@ -55,18 +319,20 @@ class ScoresOrchestration:
                 f'Setting submission time filter to last graded_timestamp value plus one second: {sub_time_filter}'
             )
         self.sub_time_filter: datetime = sub_time_filter
+        self.score_batcher: Union[AdaptiveBatcher, None] = None
+        # URL of the Canvas page that could not be fetched during the last fetch, if any
+        self.resume_page_url: Union[str, None] = None
 
-    def get_sub_dicts_for_exam(self, page_size: int = 50) -> list[dict[str, Any]]:
+    def get_canvas_subs_request(self, page_size: int) -> tuple[str, dict[str, Any]]:
         """
-        Gets the graded submissions for the exam using paging.
+        Builds the URL ending and parameters for the first page of the exam's graded submissions in Canvas.
 
         :param page_size: How many results from Canvas to include per page
-        :type page_size: int, optional (default is 50)
-        :return: List of submission dictionaries from Canvas returned based on the URL and parameters
-        :rtype: List of dictionaries with string keys
+        :type page_size: int
+        :return: Tuple of the URL ending and the parameters
+        :rtype: Tuple of a string and a dictionary with string keys
         """
         get_subs_url: str = f'{CANVAS_URL_BEGIN}/courses/{self.exam.course_id}/students/submissions'
-
         canvas_params: dict[str, Any] = {
             'student_ids[]': 'all',
             'assignment_ids[]': str(self.exam.assignment_id),
@@ -74,16 +340,125 @@ class ScoresOrchestration:
             'include[]': 'user',
             'graded_since': self.sub_time_filter.strftime(ISO8601_FORMAT)
         }
+        return (get_subs_url, canvas_params)
+
+    def iter_remaining_pages(
+        self,
+        get_subs_url: str,
+        canvas_params: dict[str, Any],
+        last_page_num: int,
+        page_workers: int,
+        slim_subs: bool = SLIM_CANVAS_SUBS
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Fetches pages two through last_page_num concurrently and yields their results in page order.
+        The number of pages requested but not yet yielded is bounded by page_workers and the canvasreadonly limits,
+        if the API configuration has them.
+        If a page cannot be fetched, results from that page and any later pages are discarded,
+        matching the behavior of serial paging, and the page's URL is kept as resume_page_url.
+
+        :param get_subs_url: URL ending for the Canvas submissions request
+        :type get_subs_url: string
+        :param canvas_params: Parameters used for the first page request
+        :type canvas_params: Dictionary with string keys
+        :param last_page_num: Last page number reported by Canvas
+        :type last_page_num: int
+        :param page_workers: Maximum number of pages to fetch at the same time
+        :type page_workers: int
+        :param slim_subs: Whether to reduce each page's submission dictionaries with project_sub_dicts
+        :type slim_subs: bool, optional (default is the SLIM_CANVAS_SUBS environment variable or False)
+        :return: Generator of lists of submission dictionaries, one list per page
+        :rtype: Iterator of lists of dictionaries with string keys
+        """
+        num_workers: int = min(page_workers, last_page_num - 1)
+        limits: Union[tuple[int, int], None] = get_api_limits(API_CONFIG_PATH).get(CANVAS_SCOPE)
+        if limits is None:
+            # Like get_rate_limiter, pages are fetched without throttling when no limits are configured
+            LOGGER.warning(f'No limits are configured for {CANVAS_SCOPE}; page workers will not be limited by them')
+        else:
+            limits_calls, limits_period = limits
+            num_workers = min(num_workers, max(1, limits_calls // max(1, limits_period)))
+        LOGGER.info(f'Fetching pages 2 through {last_page_num} using {num_workers} worker(s)')
+
+        def get_page(page_num: int) -> Union[ParsedResponse, None]:
+            LOGGER.debug(f'Page number {page_num}')
+            try:
+                parsed_response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler,
+                    get_subs_url,
+                    CANVAS_SCOPE,
+                    'GET',
+                    {**canvas_params, 'page': page_num},
+                    MAX_REQ_ATTEMPTS
+                )
+                # Reduced here so pages waiting to be yielded in order hold only the fields needed
+                if parsed_response is not None and slim_subs:
+                    return parsed_response._replace(data=project_sub_dicts(parsed_response.data))
+                return parsed_response
+            finally:
+                # A stored token lookup may open a database connection in this pool thread
+                connection.close()
+
+        page_nums: Iterator[int] = iter(range(2, last_page_num + 1))
+        # Futures for requested pages, in page order; at most num_workers are outstanding at a time
+        pending_pages: deque[tuple[int, Future[Union[ParsedResponse, None]]]] = deque()
+
+        def submit_next_page(executor: ThreadPoolExecutor) -> None:
+            page_num: Union[int, None] = next(page_nums, None)
+            if page_num is not None:
+                pending_pages.append((page_num, executor.submit(get_page, page_num)))
+
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='canvas-page') as executor:
+            try:
+                for _ in range(num_workers):
+                    submit_next_page(executor)
+                while len(pending_pages) > 0:
+                    page_num, future = pending_pages.popleft()
+                    parsed_response: Union[ParsedResponse, None] = future.result()
+                    if parsed_response is None:
+                        LOGGER.info(
+                            f'api_call_with_retries failed to get page {page_num}; no more data will be collected'
+                        )
+                        self.resume_page_url = get_page_url(get_subs_url, {**canvas_params, 'page': page_num})
+                        break
+                    # The next page is only requested as this one is handed off, so pages do not pile up
+                    submit_next_page(executor)
+                    yield parsed_response.data
+            finally:
+                # Pages not yet started are not needed after a failure or if the caller stops early
+                for _, future in pending_pages:
+                    future.cancel()
+
+    def iter_sub_dict_pages(
+        self, page_size: int = 50, page_workers: int = CANVAS_PAGE_WORKERS, slim_subs: bool = SLIM_CANVAS_SUBS
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Gets the graded submissions for the exam using paging, yielding the results one page at a time.
+        When page_workers is greater than one and Canvas reports the last page number,
+        the remaining pages are fetched concurrently. If a page cannot be fetched, its URL is kept as resume_page_url.
+        Canvas does not support selecting submission fields, so include[]=user is still requested;
+        with slim_subs, each page is reduced with project_sub_dicts as soon as it is parsed.
+
+        :param page_size: How many results from Canvas to include per page
+        :type page_size: int, optional (default is 50)
+        :param page_workers: Maximum number of pages to fetch at the same time
+        :type page_workers: int, optional (default is the CANVAS_PAGE_WORKERS environment variable or 1)
+        :param slim_subs: Whether to reduce each page's submission dictionaries with project_sub_dicts
+        :type slim_subs: bool, optional (default is the SLIM_CANVAS_SUBS environment variable or False)
+        :return: Generator of lists of submission dictionaries from Canvas, one list per page
+        :rtype: Iterator of lists of dictionaries with string keys
+        """
+        get_subs_url, canvas_params = self.get_canvas_subs_request(page_size)
 
         more_pages: bool = True
         page_num: int = 1
-        sub_dicts: list[dict[str, Any]] = []
         next_params: dict[str, Any] = canvas_params
         LOGGER.debug(f'Params for first request: {next_params}')
+        self.resume_page_url = None
 
         while more_pages:
             LOGGER.debug(f'Page number {page_num}')
-            response: Union[Response, None] = api_call_with_retries(
+            parsed_response: Union[ParsedResponse, None] = api_call_with_retries(
                 self.api_handler,
                 get_subs_url,
                 CANVAS_SCOPE,
@@ -91,165 +466,591 @@ class ScoresOrchestration:
                 next_params,
                 MAX_REQ_ATTEMPTS
             )
-            if response is None:
+            if parsed_response is None:
                 LOGGER.info('api_call_with_retries failed to get a response; no more data will be collected')
+                self.resume_page_url = get_page_url(get_subs_url, next_params)
                 more_pages = False
             else:
-                sub_dicts += json.loads(response.text)
-                page_info: Union[None, dict[str, Any]] = self.api_handler.get_next_page(response)
-                if not page_info:
+                yield project_sub_dicts(parsed_response.data) if slim_subs else parsed_response.data
+                response: Response = parsed_response.response
+                last_page_num: Union[int, None] = (
+                    get_last_page_num(response) if page_workers > 1 and page_num == 1 else None
+                )
+                if last_page_num is not None and last_page_num > 1:
+                    yield from self.iter_remaining_pages(
+                        get_subs_url, canvas_params, last_page_num, page_workers, slim_subs
+                    )
                     more_pages = False
                 else:
-                    LOGGER.debug(f'Params for next page: {page_info}')
-                    next_params = page_info
-                    page_num += 1
+                    page_info: Union[None, dict[str, Any]] = self.api_handler.get_next_page(response)
+                    if not page_info:
+                        more_pages = False
+                    else:
+                        LOGGER.debug(f'Params for next page: {page_info}')
+                        next_params = page_info
+                        page_num += 1
 
-        sub_dicts_with_scores: list[dict[str, Any]] = list(filter((lambda x: x['score'] is not None), sub_dicts))
-        filter_diff: int = len(sub_dicts) - len(sub_dicts_with_scores)
-        if filter_diff > 0:
-            LOGGER.info(f'Discarded {filter_diff} Canvas submission(s) with no score(s)')
+    def get_sub_dicts_for_exam(
+        self, page_size: int = 50, page_workers: int = CANVAS_PAGE_WORKERS
+    ) -> list[dict[str, Any]]:
+        """
+        Gets the graded submissions for the exam using paging and discards those without scores.
+
+        :param page_size: How many results from Canvas to include per page
+        :type page_size: int, optional (default is 50)
+        :param page_workers: Maximum number of pages to fetch at the same time
+        :type page_workers: int, optional (default is the CANVAS_PAGE_WORKERS environment variable or 1)
+        :return: List of submission dictionaries from Canvas returned based on the URL and parameters
+        :rtype: List of dictionaries with string keys
+        """
+        sub_dicts: list[dict[str, Any]] = []
+        for page_sub_dicts in self.iter_sub_dict_pages(page_size, page_workers):
+            sub_dicts += page_sub_dicts
+        return self.filter_sub_dicts_with_scores(sub_dicts)
+
+    @staticmethod
+    def filter_sub_dicts_with_scores(sub_dicts: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Discards Canvas submissions without scores, logging how many were discarded and gathered.
 
-        LOGGER.info(f'Gathered {len(sub_dicts_with_scores)} submission(s) from Canvas')
+        :param sub_dicts: Dictionary results of Canvas API search
+        :type sub_dicts: List of dictionaries with string keys
+        :return: Submission dictionaries with scores
+        :rtype: List of dictionaries with string keys
+        """
+        sub_dicts_with_scores: list[dict[str, Any]] = list(filter((lambda x: x['score'] is not None), sub_dicts))
+        ScoresOrchestration.log_gathered_subs(len(sub_dicts) - len(sub_dicts_with_scores), len(sub_dicts_with_scores))
         LOGGER.debug(sub_dicts_with_scores)
         return sub_dicts_with_scores
 
-    def create_sub_records(self, sub_dicts: list[dict[str, Any]]) -> None:
+    @staticmethod
+    def log_gathered_subs(num_discarded: int, num_gathered: int) -> None:
         """
-        Parses Canvas submission records and writes them to the database.
+        Logs how many Canvas submissions were discarded for having no score and how many were gathered.
 
-        :param sub_dicts: Dictionary results of Canvas API search in get_sub_dicts_for_exam
-        :type sub_dicts: List of dictionaries with string keys
+        :param num_discarded: Number of submissions without scores
+        :type num_discarded: int
+        :param num_gathered: Number of submissions with scores
+        :type num_gathered: int
+        :return: None
+        :rtype: None
+        """
+        if num_discarded > 0:
+            LOGGER.info(f'Discarded {num_discarded} Canvas submission(s) with no score(s)')
+        LOGGER.info(f'Gathered {num_gathered} submission(s) from Canvas')
+
+    def get_sub_records_for_exam(
+        self, page_size: int = 50, page_workers: int = CANVAS_PAGE_WORKERS
+    ) -> list[SubmissionRecord]:
+        """
+        Gets the graded submissions with scores for the exam like get_sub_dicts_for_exam, but converts each page
+        to SubmissionRecords as it arrives, so the Canvas dictionaries for only one page are held at a time.
+
+        :param page_size: How many results from Canvas to include per page
+        :type page_size: int, optional (default is 50)
+        :param page_workers: Maximum number of pages to fetch at the same time
+        :type page_workers: int, optional (default is the CANVAS_PAGE_WORKERS environment variable or 1)
+        :return: Records for the submissions with scores
+        :rtype: List of SubmissionRecords
+        """
+        sub_records: list[SubmissionRecord] = []
+        num_discarded: int = 0
+        for page_sub_dicts in self.iter_sub_dict_pages(page_size, page_workers):
+            scored_sub_dicts: list[dict[str, Any]] = [
+                sub_dict for sub_dict in page_sub_dicts if sub_dict.get('score') is not None
+            ]
+            num_discarded += len(page_sub_dicts) - len(scored_sub_dicts)
+            page_sub_records: list[SubmissionRecord] = to_sub_records(scored_sub_dicts)
+            sub_records += page_sub_records
+        self.log_gathered_subs(num_discarded, len(sub_records))
+        LOGGER.debug(sub_records)
+        return sub_records
+
+    def insert_sub_batch(
+        self,
+        sub_records: list[SubmissionRecord],
+        conflict_mode: str = SUB_CONFLICT_MODE,
+        batch_size: int = SUB_BATCH_SIZE
+    ) -> int:
+        """
+        Inserts a batch of records for Canvas submissions into the database. Errors are not handled.
+        Records already stored (according to unique_canvas_submission) are skipped or updated
+        depending on conflict_mode; with 'error', any such record makes the whole insert fail.
+
+        :param sub_records: Records for submissions from Canvas
+        :type sub_records: List of SubmissionRecords
+        :param conflict_mode: One of 'error', 'ignore', or 'update'
+        :type conflict_mode: string, optional (default is the SUB_CONFLICT_MODE environment variable or 'ignore')
+        :param batch_size: How many records to insert with each INSERT statement
+        :type batch_size: int, optional (default is the SUB_BATCH_SIZE environment variable or 500)
+        :return: Number of new Submission records inserted
+        :rtype: int
+        """
+        conflict_options: dict[str, Any] = get_conflict_options(conflict_mode)
+        # bulk_create cannot tell which rows were skipped or updated, so the batch's stored keys are looked up first
+        sub_keys: set[tuple[int, datetime]] = {
+            (sub_record.submission_id, sub_record.graded_timestamp) for sub_record in sub_records
+        }
+        num_stored: Union[int, None] = None
+        if conflict_options:
+            stored_sub_keys: set[tuple[int, datetime]] = set(
+                Submission.objects.filter(submission_id__in={sub_id for sub_id, _ in sub_keys})
+                .values_list('submission_id', 'graded_timestamp')
+            )
+            num_stored = len(sub_keys & stored_sub_keys)
+        Submission.objects.bulk_create(
+            objs=[
+                Submission(
+                    submission_id=sub_record.submission_id,
+                    attempt_num=sub_record.attempt_num,
+                    exam=self.exam,
+                    student_uniqname=sub_record.student_uniqname,
+                    submitted_timestamp=sub_record.submitted_timestamp,
+                    graded_timestamp=sub_record.graded_timestamp,
+                    score=sub_record.score,
+                    transmitted=False
+                )
+                for sub_record in sub_records
+            ],
+            batch_size=batch_size,
+            **conflict_options
+        )
+        if num_stored is None:
+            return len(sub_records)
+        return len(sub_keys) - num_stored
+
+    @staticmethod
+    def log_sub_conflicts(num_conflicts: int, conflict_mode: str) -> None:
+        """
+        Logs how many Canvas submission records were already stored and so were skipped or updated.
+
+        :param num_conflicts: Number of records that were not inserted as new records
+        :type num_conflicts: int
+        :param conflict_mode: One of 'ignore' or 'update'
+        :type conflict_mode: string
+        :return: None
+        :rtype: None
         """
-        if len(sub_dicts) == 0:
-            LOGGER.info('No sub_dicts were provided')
+        if num_conflicts > 0:
+            action: str = 'Updated' if conflict_mode == 'update' else 'Skipped'
+            LOGGER.info(f'{action} {num_conflicts} Canvas submission(s) already in the database')
+
+    def create_sub_records(
+        self, sub_records: list[SubmissionRecord], conflict_mode: str = SUB_CONFLICT_MODE
+    ) -> None:
+        """
+        Writes records for Canvas submissions to the database,
+        advancing the exam's sync cursor in the same transaction.
+
+        :param sub_records: Records from get_sub_records_for_exam (or to_sub_records)
+        :type sub_records: List of SubmissionRecords
+        :param conflict_mode: One of 'error', 'ignore', or 'update' (see insert_sub_batch)
+        :type conflict_mode: string, optional (default is the SUB_CONFLICT_MODE environment variable or 'ignore')
+        """
+        if len(sub_records) == 0:
+            LOGGER.info('No sub_records were provided')
         else:
             try:
-                Submission.objects.bulk_create(
-                    objs=[
-                        Submission(
-                            submission_id=sub_dict['id'],
-                            attempt_num=sub_dict['attempt'],
-                            exam=self.exam,
-                            student_uniqname=sub_dict['user']['login_id'].strip(),
-                            submitted_timestamp=sub_dict['submitted_at'],
-                            graded_timestamp=sub_dict['graded_at'],
-                            score=sub_dict['score'],
-                            transmitted=False
-                        )
-                        for sub_dict in sub_dicts
-                    ]
-                )
-                LOGGER.info(f'Inserted {len(sub_dicts)} new Submission record(s) in the database')
+                with transaction.atomic():
+                    num_inserted: int = self.insert_sub_batch(sub_records, conflict_mode)
+                    self.exam.advance_sync_cursor(get_latest_graded_datetime(sub_records), self.resume_page_url)
+                LOGGER.info(f'Inserted {num_inserted} new Submission record(s) in the database')
+                self.log_sub_conflicts(len(sub_records) - num_inserted, conflict_mode)
             except Exception as e:
                 LOGGER.error(e)
                 LOGGER.error('Submissions bulk creation failed')
 
-    def send_scores(self, subs_to_send: list[Submission]) -> None:
+    def stream_sub_records(
+        self,
+        page_size: int = 50,
+        page_workers: int = CANVAS_PAGE_WORKERS,
+        batch_size: int = SUB_BATCH_SIZE,
+        conflict_mode: str = SUB_CONFLICT_MODE
+    ) -> None:
         """
-        Sends scores in bulk for submissions with unique student_uniqname values and updates database when successful.
+        Gets the graded submissions for the exam and writes them to the database as pages arrive,
+        holding at most one page and one batch of submissions in memory at a time.
+        Each batch is committed in its own short transaction (see commit_sub_batch), so no transaction stays open
+        while pages are fetched. If a batch fails, no more batches are inserted; batches committed before it
+        stay in the database. Canvas pages are not in graded order, so the exam's sync cursor is only advanced,
+        to the latest graded_timestamp of all the submissions, once every page has been fetched and stored;
+        otherwise the cursor keeps the time this fetch started from (see Exam.hold_sync_cursor).
 
-        :param subs_to_send: List of un-transmitted Submissions with non-repeating student_uniqname values.
-        :type subs_to_send: List of Submission model instances
+        :param page_size: How many results from Canvas to include per page
+        :type page_size: int, optional (default is 50)
+        :param page_workers: Maximum number of pages to fetch at the same time
+        :type page_workers: int, optional (default is the CANVAS_PAGE_WORKERS environment variable or 1)
+        :param batch_size: How many submissions to insert with each bulk insert
+        :type batch_size: int, optional (default is the SUB_BATCH_SIZE environment variable or 500)
+        :param conflict_mode: One of 'error', 'ignore', or 'update' (see insert_sub_batch)
+        :type conflict_mode: string, optional (default is the SUB_CONFLICT_MODE environment variable or 'ignore')
         :return: None
         :rtype: None
         """
-        scores_to_send: list[dict[str, str]] = [sub.prepare_score() for sub in subs_to_send]
+        num_discarded: int = 0
+        num_gathered: int = 0
+        num_inserted: int = 0
+        latest_graded_dt: Union[datetime, None] = None
+        insert_failed: bool = False
+        batch: list[SubmissionRecord] = []
+
+        try:
+            for page_sub_dicts in self.iter_sub_dict_pages(page_size, page_workers):
+                scored_sub_dicts: list[dict[str, Any]] = [
+                    sub_dict for sub_dict in page_sub_dicts if sub_dict.get('score') is not None
+                ]
+                num_discarded += len(page_sub_dicts) - len(scored_sub_dicts)
+                page_sub_records: list[SubmissionRecord] = to_sub_records(scored_sub_dicts)
+                num_gathered += len(page_sub_records)
+                batch += page_sub_records
+                page_latest_graded_dt: Union[datetime, None] = get_latest_graded_datetime(page_sub_records)
+                if page_latest_graded_dt is not None and (
+                    latest_graded_dt is None or page_latest_graded_dt > latest_graded_dt
+                ):
+                    latest_graded_dt = page_latest_graded_dt
+                # Insert full batches, leaving any remainder to be combined with the next page
+                while len(batch) >= batch_size and not insert_failed:
+                    num_batch_inserted: Union[int, None] = self.commit_sub_batch(batch[:batch_size], conflict_mode)
+                    insert_failed = num_batch_inserted is None
+                    num_inserted += num_batch_inserted or 0
+                    batch = batch[batch_size:]
+                if insert_failed:
+                    break
+
+            if not insert_failed and len(batch) > 0:
+                num_batch_inserted = self.commit_sub_batch(batch, conflict_mode)
+                insert_failed = num_batch_inserted is None
+                num_inserted += num_batch_inserted or 0
+        except Exception:
+            self.exam.hold_sync_cursor(self.sub_time_filter - timedelta(seconds=1), self.resume_page_url)
+            raise
+
+        if insert_failed or self.resume_page_url is not None:
+            # Submissions on pages not yet fetched or stored may have been graded before those that were stored
+            self.exam.hold_sync_cursor(self.sub_time_filter - timedelta(seconds=1), self.resume_page_url)
+        elif num_gathered > 0:
+            self.exam.advance_sync_cursor(latest_graded_dt)
+
+        self.log_gathered_subs(num_discarded, num_gathered)
+        if num_gathered > 0:
+            LOGGER.info(f'Inserted {num_inserted} new Submission record(s) in the database')
+            if not insert_failed:
+                self.log_sub_conflicts(num_gathered - num_inserted, conflict_mode)
+
+    def commit_sub_batch(
+        self, sub_records: list[SubmissionRecord], conflict_mode: str = SUB_CONFLICT_MODE
+    ) -> Union[int, None]:
+        """
+        Inserts a batch of records for Canvas submissions in one transaction, logging any error.
+
+        :param sub_records: Records for submissions from Canvas
+        :type sub_records: List of SubmissionRecords
+        :param conflict_mode: One of 'error', 'ignore', or 'update' (see insert_sub_batch)
+        :type conflict_mode: string, optional (default is the SUB_CONFLICT_MODE environment variable or 'ignore')
+        :return: Number of new Submission records inserted, or None if the transaction failed
+        :rtype: int or None
+        """
+        try:
+            with transaction.atomic():
+                return self.insert_sub_batch(sub_records, conflict_mode)
+        except Exception as e:
+            LOGGER.error(e)
+            LOGGER.error('Submissions bulk creation failed')
+            return None
+
+    def build_scores_json(self, subs_to_send: list[SubmissionRecord]) -> str:
+        """
+        Builds the serialized putPlcExamScore payload for M-Pathways for the exam's submissions.
+
+        :param subs_to_send: List of Submissions with non-repeating student_uniqname values.
+        :type subs_to_send: List of SubmissionRecords
+        :return: JSON payload
+        :rtype: string
+        """
+        # The exam's SA code is used directly so that submissions without a cached exam do not each need a query
+        scores_to_send: list[dict[str, str]] = [
+            Submission.format_score(sub.student_uniqname, sub.score, self.exam.sa_code) for sub in subs_to_send
+        ]
         payload: dict[str, Any] = {'putPlcExamScore': {'Student': scores_to_send}}
         json_payload: str = json.dumps(payload)
         LOGGER.debug(json_payload)
+        return json_payload
 
-        extra_headers = [{'Content-Type': 'application/json'}]
+    def record_score_batch(self, subs_to_send: list[SubmissionRecord], json_payload: str) -> ScoreBatch:
+        """
+        Commits a pending ScoreBatch for the submissions about to be sent (see reconcile_score_batches).
+
+        :param subs_to_send: List of Submissions whose scores are in the payload
+        :type subs_to_send: List of SubmissionRecords
+        :param json_payload: JSON payload about to be sent
+        :type json_payload: string
+        :return: The new ScoreBatch
+        :rtype: ScoreBatch
+        """
+        with transaction.atomic():
+            score_batch: ScoreBatch = ScoreBatch.objects.create(
+                exam=self.exam, payload_hash=hashlib.sha256(json_payload.encode('utf-8')).hexdigest()
+            )
+            score_batch.submissions.add(*[sub.id for sub in subs_to_send])
+        return score_batch
+
+    @staticmethod
+    def update_score_batch(
+        score_batch: ScoreBatch, state: ScoreBatch.State, response_text: Union[str, None] = None
+    ) -> None:
+        """
+        Saves a new state for a ScoreBatch, along with the response text if one was received.
+
+        :param score_batch: ScoreBatch to update
+        :type score_batch: ScoreBatch
+        :param state: New state
+        :type state: ScoreBatch.State
+        :param response_text: Text of the M-Pathways response
+        :type response_text: string or None, optional (default is None)
+        :return: None
+        :rtype: None
+        """
+        score_batch.state = state
+        update_fields: list[str] = ['state', 'updated_timestamp']
+        if response_text is not None:
+            score_batch.response_text = response_text
+            update_fields.append('response_text')
+        score_batch.save(update_fields=update_fields)
 
-        response: Response = self.api_handler.api_call(
-            MPATHWAYS_URL,
-            MPATHWAYS_SCOPE,
-            'PUT',
-            payload=json_payload,
-            api_specific_headers=extra_headers
+    def prepare_score_batch(self, subs_to_send: list[SubmissionRecord]) -> tuple[str, ScoreBatch]:
+        """
+        Builds the payload for sending scores and commits a pending ScoreBatch for it (see record_score_batch).
+
+        :param subs_to_send: List of un-transmitted Submissions with non-repeating student_uniqname values.
+        :type subs_to_send: List of SubmissionRecords
+        :return: Tuple of the JSON payload and the new ScoreBatch
+        :rtype: Tuple of a string and a ScoreBatch
+        """
+        json_payload: str = self.build_scores_json(subs_to_send)
+        return (json_payload, self.record_score_batch(subs_to_send, json_payload))
+
+    @staticmethod
+    def handle_scores_response(
+        score_batch: ScoreBatch, subs_to_send: list[SubmissionRecord], response: Union[Response, None]
+    ) -> Union[set[str], None]:
+        """
+        Records the outcome of a request sending scores in its ScoreBatch and, when successful,
+        marks the submissions M-Pathways accepted as transmitted.
+
+        :param score_batch: ScoreBatch recorded for the request
+        :type score_batch: ScoreBatch
+        :param subs_to_send: List of Submissions whose scores were sent
+        :type subs_to_send: List of SubmissionRecords
+        :param response: M-Pathways response, or None if the request failed
+        :type response: Response or None
+        :return: Uniqnames of the scores M-Pathways accepted, or None if the request failed
+        :rtype: Set of strings or None
+        """
+        parsed_response: Union[ParsedResponse, None] = (
+            parse_successful_response(response) if response is not None else None
         )
+        if parsed_response is None:
+            if response is not None:
+                LOGGER.error('There is a problem with the response; refer to the logs')
+            LOGGER.info('No records will be updated in the database')
+            ScoresOrchestration.update_score_batch(score_batch, ScoreBatch.State.FAILED)
+            return None
 
-        if not check_if_response_successful(response):
-            LOGGER.error('There is a problem with the response; refer to the logs')
+        try:
+            success_uniqnames: set[str] = get_success_uniqnames(parsed_response.data)
+        except (KeyError, TypeError, ValueError) as e:
+            LOGGER.error(f'The M-Pathways response was not in the expected format ({e!r}); refer to the logs')
+            LOGGER.debug(parsed_response.response.text)
             LOGGER.info('No records will be updated in the database')
+            ScoresOrchestration.update_score_batch(score_batch, ScoreBatch.State.FAILED)
             return None
 
-        resp_data: dict[str, Any] = json.loads(response.text)
-        LOGGER.debug(resp_data)
+        # Stored before the updates below so the response can still be applied by a later run if they do not happen
+        ScoresOrchestration.update_score_batch(score_batch, ScoreBatch.State.RECEIVED, parsed_response.response.text)
+        complete_score_batch(score_batch, subs_to_send, success_uniqnames)
+        return success_uniqnames
 
-        schema_name: str = 'putPlcExamScoreResponse'
-        results: dict[str, Any] = resp_data[schema_name][schema_name]
+    def send_scores(self, subs_to_send: list[SubmissionRecord]) -> tuple[Union[set[str], None], float]:
+        """
+        Sends scores in bulk for submissions with unique student_uniqname values and updates database when successful.
+        A ScoreBatch is committed before the request and updated with its outcome (see reconcile_score_batches).
+        Only the request itself is timed, not the wait for the rate limit or the database work.
+
+        :param subs_to_send: List of un-transmitted Submissions with non-repeating student_uniqname values.
+        :type subs_to_send: List of SubmissionRecords
+        :return: Uniqnames of the scores M-Pathways accepted (or None if the request failed) and the request's latency
+        :rtype: Tuple of a set of strings or None and a float
+        """
+        json_payload, score_batch = self.prepare_score_batch(subs_to_send)
 
-        if results['BadCount'] > 0:
-            LOGGER.warning(f"Discovered {results['BadCount']} record error(s): {results['Errors']}")
+        extra_headers = [{'Content-Type': 'application/json'}]
 
-        # Hope this can be simplified in the future if API response data can be made to use consistent types
-        if results['GoodCount'] > 1:
-            success_uniqnames: list[str] = [success_dict['uniqname'] for success_dict in results['Success']]
-        elif results['GoodCount'] == 1:
-            success_uniqnames = [results['Success']['uniqname']]
-        else:
-            success_uniqnames = []
+        wait_for_rate_limit(MPATHWAYS_SCOPE)
+        response: Union[Response, None] = None
+        start: float = time.perf_counter()
+        try:
+            response = self.api_handler.api_call(
+                MPATHWAYS_URL,
+                MPATHWAYS_SCOPE,
+                'PUT',
+                payload=json_payload,
+                api_specific_headers=extra_headers
+            )
+        except RequestException as e:
+            LOGGER.error(f'The request to send scores failed: {e}')
+        latency: float = time.perf_counter() - start
+        return (self.handle_scores_response(score_batch, subs_to_send, response), latency)
 
-        if len(success_uniqnames) == 0:
-            LOGGER.warning('No scores were transmitted successfully.')
-        else:
-            timestamp: datetime = datetime.now(tz=utc)
-
-            subs_to_update: list[Submission] = []
-            for sub in subs_to_send:
-                if sub.student_uniqname in success_uniqnames:
-                    sub.transmitted = True
-                    sub.transmitted_timestamp = timestamp
-                    subs_to_update.append(sub)
-            Submission.objects.bulk_update(objs=subs_to_update, fields=['transmitted', 'transmitted_timestamp'])
-            LOGGER.info(f'Transmitted {len(subs_to_update)} score(s) successfully and updated submission record(s).')
-        return None
+    def send_scores_adaptively(self, subs_to_send: list[SubmissionRecord]) -> None:
+        """
+        Sends scores using an AdaptiveBatcher, which adjusts the number of scores per request
+        based on the latency of previous requests (as timed by send_scores) and their outcome.
+        The batcher is kept as score_batcher so its per-batch size and latency history can be inspected.
 
-    def main(self) -> None:
+        :param subs_to_send: List of un-transmitted Submissions with non-repeating student_uniqname values.
+        :type subs_to_send: List of SubmissionRecords
+        :return: None
+        :rtype: None
+        """
+        if self.score_batcher is None:
+            self.score_batcher = AdaptiveBatcher(
+                min_size=SCORE_BATCH_MIN_SIZE,
+                max_size=SCORE_BATCH_MAX_SIZE,
+                target_latency=SCORE_BATCH_TARGET_LATENCY
+            )
+
+        def send_batch(sub_batch: list[SubmissionRecord]) -> tuple[bool, float]:
+            success_uniqnames, latency = self.send_scores(sub_batch)
+            return (success_uniqnames is not None, latency)
+
+        self.score_batcher.process(subs_to_send, send_batch)
+
+    @staticmethod
+    def classify_subs_to_transmit(
+        subs_to_transmit: list[SubmissionRecord], sub_time_filter: datetime
+    ) -> tuple[list[SubmissionRecord], list[SubmissionRecord], list[SubmissionRecord]]:
+        """
+        Classifies un-transmitted submissions in a single pass, using hash-based grouping by uniqname.
+        Redo submissions were graded before sub_time_filter (i.e. gathered by a previous run); duplicate-uniqname
+        submissions share a uniqname with another submission; all others are regular.
+
+        :param subs_to_transmit: List of un-transmitted Submissions for an exam
+        :type subs_to_transmit: List of SubmissionRecords
+        :param sub_time_filter: Submission time filter for the current run
+        :type sub_time_filter: datetime
+        :return: Tuple of lists of redo, duplicate-uniqname, and regular Submissions; the last two do not overlap
+        :rtype: Tuple of three lists of SubmissionRecords
+        """
+        redo_subs: list[SubmissionRecord] = []
+        subs_by_uniqname: dict[str, list[SubmissionRecord]] = defaultdict(list)
+        for sub in subs_to_transmit:
+            subs_by_uniqname[sub.student_uniqname].append(sub)
+            if sub.graded_timestamp < sub_time_filter:
+                redo_subs.append(sub)
+
+        dup_uniqname_subs: list[SubmissionRecord] = []
+        regular_subs: list[SubmissionRecord] = []
+        for uniqname_subs in subs_by_uniqname.values():
+            if len(uniqname_subs) > 1:
+                dup_uniqname_subs += uniqname_subs
+            else:
+                regular_subs.append(uniqname_subs[0])
+        return (redo_subs, dup_uniqname_subs, regular_subs)
+
+    @staticmethod
+    def group_subs_into_rounds(dup_uniqname_subs: list[SubmissionRecord]) -> list[list[SubmissionRecord]]:
+        """
+        Groups submissions with duplicate uniqnames into rounds, where round k holds the k-th submission,
+        ordered by graded_timestamp, for each uniqname. No round contains the same uniqname twice.
+
+        :param dup_uniqname_subs: List of Submissions sharing student_uniqname values with other Submissions
+        :type dup_uniqname_subs: List of SubmissionRecords
+        :return: List of rounds, each a list of Submissions with non-repeating student_uniqname values
+        :rtype: List of lists of SubmissionRecords
+        """
+        subs_by_uniqname: dict[str, list[SubmissionRecord]] = defaultdict(list)
+        for sub in sorted(dup_uniqname_subs, key=lambda sub: (sub.graded_timestamp, sub.id)):
+            subs_by_uniqname[sub.student_uniqname].append(sub)
+
+        max_depth: int = max(len(uniqname_subs) for uniqname_subs in subs_by_uniqname.values())
+        return [
+            [uniqname_subs[k] for uniqname_subs in subs_by_uniqname.values() if len(uniqname_subs) > k]
+            for k in range(max_depth)
+        ]
+
+    def send_dup_uniqname_subs(self, dup_uniqname_subs: list[SubmissionRecord]) -> None:
+        """
+        Sends submissions with duplicate uniqnames in rounds (see group_subs_into_rounds), each round in chunks,
+        so every student's scores reach M-Pathways in graded order. If a student's score is not accepted in one round,
+        the student's later submissions are held back until a later run.
+
+        :param dup_uniqname_subs: List of Submissions sharing student_uniqname values with other Submissions
+        :type dup_uniqname_subs: List of SubmissionRecords
+        :return: None
+        :rtype: None
+        """
+        held_uniqnames: set[str] = set()
+        rounds: list[list[SubmissionRecord]] = self.group_subs_into_rounds(dup_uniqname_subs)
+        for round_num, round_subs in enumerate(rounds, start=1):
+            subs_to_send: list[SubmissionRecord] = [
+                sub for sub in round_subs if sub.student_uniqname not in held_uniqnames
+            ]
+            num_held: int = len(round_subs) - len(subs_to_send)
+            if num_held > 0:
+                LOGGER.info(f'Holding back {num_held} submission(s) in round {round_num} after earlier failures')
+            if len(subs_to_send) == 0:
+                continue
+
+            LOGGER.info(f'Sending round {round_num} of {len(rounds)} with {len(subs_to_send)} submission(s)')
+            for sub_list in chunk_list(subs_to_send):
+                accepted_uniqnames, _ = self.send_scores(sub_list)
+                success_uniqnames: set[str] = accepted_uniqnames or set()
+                held_uniqnames.update(
+                    sub.student_uniqname for sub in sub_list if sub.student_uniqname not in success_uniqnames
+                )
+
+    def main(self, stream_subs: bool = STREAM_SUB_RECORDS, adaptive_batching: bool = ADAPTIVE_SCORE_BATCHING) -> None:
         """
         High-level process method for class. Pulls Canvas data, sends data, and logs activity in the database.
 
+        :param stream_subs: Whether to insert Canvas submissions page by page using stream_sub_records
+        :type stream_subs: bool, optional (default is the STREAM_SUB_RECORDS environment variable or False)
+        :param adaptive_batching: Whether to send regular submissions using send_scores_adaptively
+        :type adaptive_batching: bool, optional (default is the ADAPTIVE_SCORE_BATCHING environment variable or False)
         :return: None
         :rtype: None
         """
         # Fetch data from Canvas API and store as submission records in the database
-        sub_dicts: list[dict[str, Any]] = self.get_sub_dicts_for_exam()
-        if len(sub_dicts) > 0:
-            self.create_sub_records(sub_dicts)
+        if stream_subs:
+            self.stream_sub_records()
+        else:
+            sub_records: list[SubmissionRecord] = self.get_sub_records_for_exam()
+            if len(sub_records) > 0:
+                self.create_sub_records(sub_records)
 
         # Find old and new submissions for exam to send to M-Pathways
-        sub_to_transmit_qs: QuerySet = self.exam.submissions.filter(transmitted=False)
-        subs_to_transmit: list[Submission] = list(sub_to_transmit_qs.all())
+        subs_to_transmit: list[SubmissionRecord] = SubmissionRecord.load(
+            self.exam.submissions.filter(transmitted=False)
+        )
+        redo_subs, dup_uniqname_subs, regular_subs = self.classify_subs_to_transmit(
+            subs_to_transmit, self.sub_time_filter
+        )
 
         # Identify old submissions for debugging purposes
-        redo_subs: list[Submission] = list(sub_to_transmit_qs.filter(graded_timestamp__lt=self.sub_time_filter))
         if len(redo_subs) > 0:
             LOGGER.info(f'Will try to re-send {len(redo_subs)} previously un-transmitted submissions')
             LOGGER.debug(f'Previously un-transmitted submissions: {redo_subs}')
 
-        # Identify and separate submissions to send with duplicate uniqnames
-        freq_qs: QuerySet = sub_to_transmit_qs.values('student_uniqname').annotate(frequency=Count('student_uniqname'))
-        dup_uniqnames: list[str] = [
-            uniqname_dict['student_uniqname'] for uniqname_dict in list(freq_qs) if uniqname_dict['frequency'] > 1
-        ]
-        dup_uniqname_subs: list[Submission] = []
-        regular_subs: list[Submission] = []
-        for sub_to_transmit in subs_to_transmit:
-            if sub_to_transmit.student_uniqname in dup_uniqnames:
-                dup_uniqname_subs.append(sub_to_transmit)
-            else:
-                regular_subs.append(sub_to_transmit)
-
         # Send scores and update the database
-        if len(regular_subs) > 0:
+        if len(regular_subs) > 0 and adaptive_batching:
+            self.send_scores_adaptively(regular_subs)
+        elif len(regular_subs) > 0:
             # Send regular submissions in chunks of 100
-            regular_sub_lists: list[list[Submission]] = chunk_list(regular_subs)
+            regular_sub_lists: list[list[SubmissionRecord]] = chunk_list(regular_subs)
             for regular_sub_list in regular_sub_lists:
                 self.send_scores(regular_sub_list)
         if len(dup_uniqname_subs) > 0:
-            LOGGER.info('Found submissions to send with duplicate uniqnames; they will be sent individually')
-            # Send each submission with a duplicate uniqname individually
-            for dup_uniqname_sub in dup_uniqname_subs:
-                self.send_scores([dup_uniqname_sub])
+            LOGGER.info('Found submissions to send with duplicate uniqnames; they will be sent in rounds')
+            self.send_dup_uniqname_subs(dup_uniqname_subs)
 
         return None
@@ -1,78 +1,182 @@
 # standard libraries
-import logging, os
-from datetime import datetime
-from smtplib import SMTPException
-from typing import Any
+import csv, logging, os, time
+from datetime import datetime, timedelta
+from functools import lru_cache, reduce
+from io import StringIO
+from operator import or_
+from smtplib import SMTPConnectError, SMTPException, SMTPResponseException, SMTPServerDisconnected
+from typing import Any, Callable, Iterator, Union
 
 # third-party libraries
-from django.core.mail import send_mail
-from django.db.models import QuerySet
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.db.models import Count, F, Q, QuerySet, Window
+from django.db.models.functions import RowNumber
 from django.forms.models import model_to_dict
-from django.template.loader import render_to_string
+from django.template.backends.django import Template
+from django.template.loader import get_template
 from django.utils.timezone import localtime, utc
 
 # local libraries
-from pe.models import Report
+from pe.models import Exam, OutboxEmail, Report, Submission
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Maximum number of failed submissions listed for each exam in a report email
+REPORT_MAX_FAILURES: int = int(os.getenv('REPORT_MAX_FAILURES', '100'))
+# Whether to attach the full list of failed submissions as a CSV file when an exam's list is cut off
+REPORT_FAILURES_CSV: bool = bool(int(os.getenv('REPORT_FAILURES_CSV', '0')))
+# Number of attempts to make to send each report email, and seconds to wait before the first retry (doubled each time)
+EMAIL_SEND_ATTEMPTS: int = int(os.getenv('EMAIL_SEND_ATTEMPTS', '3'))
+EMAIL_RETRY_DELAY: float = float(os.getenv('EMAIL_RETRY_DELAY', '1.0'))
+# Number of times send_outbox_emails tries to send a queued email before leaving it unsent
+EMAIL_OUTBOX_MAX_SENDS: int = int(os.getenv('EMAIL_OUTBOX_MAX_SENDS', '5'))
+# Seconds after which a queued email claimed by a send_outbox_emails call that never finished may be claimed again
+EMAIL_OUTBOX_CLAIM_TIMEOUT: int = int(os.getenv('EMAIL_OUTBOX_CLAIM_TIMEOUT', '600'))
+# Number of days to keep emails in the outbox after they were sent or given up on
+EMAIL_OUTBOX_RETENTION_DAYS: int = int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', '30'))
+
+
+@lru_cache(maxsize=None)
+def get_email_templates() -> tuple[Template, Template]:
+    """
+    Loads and compiles the plain text and HTML email templates, keeping them for the rest of the process.
+
+    :return: Compiled email.txt and email.html templates
+    :rtype: Tuple of two Template instances
+    """
+    return (get_template('email.txt'), get_template('email.html'))
+
+
+def render_email(context: dict[str, Any]) -> tuple[str, str]:
+    """
+    Renders a report context into the plain text and HTML email formats using the compiled templates.
+
+    :param context: Context prepared by Reporter.prepare_context
+    :type context: Dictionary with string keys
+    :return: Plain text and HTML email strings
+    :rtype: Tuple of two strings
+    """
+    plain_text_template, html_template = get_email_templates()
+    return (plain_text_template.render(context), html_template.render(context))
+
 
 class Reporter:
     """Utility class for collecting metadata, preparing report data, rendering templates, and sending email."""
 
     report_sub_fields: tuple[str, ...] = ('submission_id', 'student_uniqname', 'score', 'graded_timestamp')
+    failures_csv_chunk_size: int = 1000
 
-    def __init__(self, report: Report) -> None:
+    def __init__(
+        self, report: Report, max_failures: int = REPORT_MAX_FAILURES, failures_csv: bool = REPORT_FAILURES_CSV
+    ) -> None:
         """
         Assigns report and initializes other instance variables set externally or via prepare_context.
 
+        :param report: Report model instance for the report to be prepared and sent
+        :type report: Report
+        :param max_failures: Maximum number of failed submissions listed for each exam
+        :type max_failures: int, optional (default is the REPORT_MAX_FAILURES environment variable or 100)
+        :param failures_csv: Whether to attach all failed submissions as a CSV file when an exam's list is cut off
+        :type failures_csv: bool, optional (default is the REPORT_FAILURES_CSV environment variable or False)
         :return: None
         :rtype: None
         """
         self.report: Report = report
+        self.max_failures: int = max_failures
+        self.failures_csv: bool = failures_csv
+        self.exams: list[Exam] = []
         self.exams_time_metadata: dict[int, dict[str, datetime]] = dict()
         self.total_successes: int = 0
         self.total_failures: int = 0
         self.total_new: int = 0
         self.context: dict[str, Any] = dict()
 
+    def get_exam_sub_conditions(self, exams: list[Exam]) -> tuple[Q, Q, Q]:
+        """
+        Builds conditions matching the successful, failed, and new submissions for the exams,
+        using each exam's own time metadata.
+
+        :param exams: Exam model instances for the exams in the report
+        :type exams: List of Exam instances
+        :return: Conditions for successes, failures, and new submissions
+        :rtype: Tuple of three Q instances
+        """
+        success_q: Q = reduce(or_, [
+            Q(
+                exam_id=exam.id,
+                transmitted=True,
+                transmitted_timestamp__gte=self.exams_time_metadata[exam.id]['start_time']
+            )
+            for exam in exams
+        ])
+        # ScoresOrchestration tries to send everything that is un-transmitted,
+        # so anything left un-transmitted after a run is a failure.
+        failure_q: Q = Q(transmitted=False)
+        new_q: Q = reduce(or_, [
+            Q(exam_id=exam.id, graded_timestamp__gte=self.exams_time_metadata[exam.id]['sub_time_filter'])
+            for exam in exams
+        ])
+        return (success_q, failure_q, new_q)
+
     def prepare_context(self) -> None:
         """
         Prepares summary counts and the context in a dictionary structure that can be passed to the template
-        via render_to_string.
+        via render_email. The counts for all the report's exams come from one grouped query,
+        and the successes and failures from one more, so the number of queries does not depend on the number of exams.
+        Only the first max_failures failures (in graded order) are listed for each exam, though the counts cover all.
 
         :return: None
         :rtype: None
         """
-        exam_dicts: list[dict[str, Any]] = []
-        for exam in self.report.exams.all():
-            exam_dict: dict[str, Any] = model_to_dict(exam)
+        exams: list[Exam] = list(self.report.exams.all())
+        self.exams = exams
 
-            exam_dict['time'] = self.exams_time_metadata[exam.id]
-
-            success_sub_qs: QuerySet = exam.submissions.filter(
-                transmitted=True, transmitted_timestamp__gte=exam_dict['time']['start_time']
-            ).order_by('graded_timestamp')
-            num_successes: int = len(success_sub_qs)
-
-            # ScoresOrchestration tries to send everything that is un-transmitted,
-            # so anything left un-transmitted after a run is a failure.
-            failure_sub_qs: QuerySet = exam.submissions.filter(transmitted=False).order_by('graded_timestamp')
-            num_failures: int = len(failure_sub_qs)
+        counts_by_exam: dict[int, dict[str, int]] = dict()
+        subs_by_exam: dict[int, dict[str, list[dict[str, Any]]]] = {
+            exam.id: {'successes': [], 'failures': []} for exam in exams
+        }
+        if len(exams) > 0:
+            success_q, failure_q, new_q = self.get_exam_sub_conditions(exams)
+            report_sub_qs: QuerySet = Submission.objects.filter(exam_id__in=[exam.id for exam in exams])
 
-            new_sub_qs: QuerySet = exam.submissions.filter(graded_timestamp__gte=exam_dict['time']['sub_time_filter'])
-            num_new: int = len(new_sub_qs)
+            count_dicts: QuerySet = report_sub_qs.order_by().values('exam_id').annotate(
+                success_count=Count('id', filter=success_q),
+                failure_count=Count('id', filter=failure_q),
+                new_count=Count('id', filter=new_q)
+            )
+            for count_dict in count_dicts:
+                counts_by_exam[count_dict.pop('exam_id')] = count_dict
 
-            exam_dict['summary'] = {'success_count': num_successes, 'failure_count': num_failures, 'new_count': num_new}
+            # Rows are numbered separately for each exam's successes and failures, so failures can be cut off
+            sub_dicts: QuerySet = report_sub_qs.filter(success_q | failure_q) \
+                .annotate(row_num=Window(
+                    RowNumber(),
+                    partition_by=[F('exam_id'), F('transmitted')],
+                    order_by=[F('graded_timestamp').asc(), F('id').asc()]
+                )) \
+                .filter(Q(transmitted=True) | Q(row_num__lte=self.max_failures)) \
+                .order_by('graded_timestamp', 'id') \
+                .values('exam_id', 'transmitted', *self.report_sub_fields)
+            for sub_dict in sub_dicts:
+                exam_subs: dict[str, list[dict[str, Any]]] = subs_by_exam[sub_dict.pop('exam_id')]
+                exam_subs['successes' if sub_dict.pop('transmitted') else 'failures'].append(sub_dict)
 
-            exam_dict['successes'] = list(success_sub_qs.values(*self.report_sub_fields))
-            exam_dict['failures'] = list(failure_sub_qs.values(*self.report_sub_fields))
+        exam_dicts: list[dict[str, Any]] = []
+        for exam in exams:
+            exam_dict: dict[str, Any] = model_to_dict(exam)
+            exam_dict['time'] = self.exams_time_metadata[exam.id]
+            exam_dict['summary'] = counts_by_exam.get(
+                exam.id, {'success_count': 0, 'failure_count': 0, 'new_count': 0}
+            )
+            exam_dict.update(subs_by_exam[exam.id])
             exam_dicts.append(exam_dict)
 
-            self.total_successes += num_successes
-            self.total_failures += num_failures
-            self.total_new += num_new
+            self.total_successes += exam_dict['summary']['success_count']
+            self.total_failures += exam_dict['summary']['failure_count']
+            self.total_new += exam_dict['summary']['new_count']
 
         report_dict: dict[str, Any] = model_to_dict(self.report)
         report_dict['summary'] = {
@@ -82,7 +186,69 @@ class Reporter:
         }
 
         support_email: str = os.getenv('SUPPORT_EMAIL', 'its.tl.staff@umich.edu')
-        self.context = {'report': report_dict, 'exams': exam_dicts, 'support_email': support_email}
+        self.context = {
+            'report': report_dict,
+            'exams': exam_dicts,
+            'support_email': support_email,
+            'failures_attached': self.failures_csv and self.has_cut_off_failures(exam_dicts)
+        }
+
+    @staticmethod
+    def has_cut_off_failures(exam_dicts: list[dict[str, Any]]) -> bool:
+        """
+        Checks whether any exam has more failures than are listed.
+
+        :param exam_dicts: Dictionaries for exams prepared by prepare_context
+        :type exam_dicts: List of dictionaries with string keys
+        :return: Whether any exam's failures list was cut off
+        :rtype: bool
+        """
+        return any(
+            exam_dict['summary']['failure_count'] > len(exam_dict['failures']) for exam_dict in exam_dicts
+        )
+
+    def iter_failure_dicts(self, exam: Exam) -> Iterator[dict[str, Any]]:
+        """
+        Yields all the failed submissions for an exam in graded order, fetching them in chunks with keyset pagination
+        (continuing after the last graded timestamp and ID seen), so only one chunk is loaded at a time.
+
+        :param exam: Exam model instance for the exam whose failures should be yielded
+        :type exam: Exam
+        :return: Generator yielding dictionaries with the report_sub_fields for each failed submission
+        :rtype: Iterator of dictionaries with string keys
+        """
+        failure_sub_qs: QuerySet = exam.submissions.filter(transmitted=False).order_by('graded_timestamp', 'id')
+        last_sub_dict: Union[dict[str, Any], None] = None
+        while True:
+            chunk_qs: QuerySet = failure_sub_qs
+            if last_sub_dict is not None:
+                chunk_qs = chunk_qs.filter(
+                    Q(graded_timestamp__gt=last_sub_dict['graded_timestamp']) |
+                    Q(graded_timestamp=last_sub_dict['graded_timestamp'], id__gt=last_sub_dict['id'])
+                )
+            chunk: list[dict[str, Any]] = list(
+                chunk_qs.values('id', *self.report_sub_fields)[:self.failures_csv_chunk_size]
+            )
+            for sub_dict in chunk:
+                yield {field: sub_dict[field] for field in self.report_sub_fields}
+            if len(chunk) < self.failures_csv_chunk_size:
+                return
+            last_sub_dict = chunk[-1]
+
+    def make_failures_csv(self) -> str:
+        """
+        Writes all the failed submissions for the report's exams as CSV text, with the exam's SA code on each row.
+
+        :return: CSV text with a header row
+        :rtype: string
+        """
+        csv_file: StringIO = StringIO()
+        writer = csv.writer(csv_file)
+        writer.writerow(['sa_code', *self.report_sub_fields])
+        for exam in self.exams:
+            for sub_dict in self.iter_failure_dicts(exam):
+                writer.writerow([exam.sa_code, *sub_dict.values()])
+        return csv_file.getvalue()
 
     def get_subject(self) -> str:
         """
@@ -102,25 +268,196 @@ class Reporter:
         LOGGER.debug(subject)
         return subject
 
+    def make_email(self) -> EmailMultiAlternatives:
+        """
+        Uses the context to render email text (plain and HTML) and creates a multi-part email,
+        attaching the failures CSV if the context says to.
+
+        :return: Email message for the report, ready to be sent
+        :rtype: EmailMultiAlternatives
+        """
+        plain_text_email, html_email = render_email(self.context)
+
+        message: EmailMultiAlternatives = EmailMultiAlternatives(
+            subject=self.get_subject(),
+            body=plain_text_email,
+            from_email=os.getenv('SMTP_FROM', ''),
+            to=[self.report.contact]
+        )
+        message.attach_alternative(html_email, 'text/html')
+        if self.context['failures_attached']:
+            message.attach(f'{self.report.name} failures.csv', self.make_failures_csv(), 'text/csv')
+        return message
+
     def send_email(self) -> None:
         """
-        Uses the context to render email text (plain and HTML) and then sends a multi-part email.
+        Creates the email for the report with make_email and sends it using send_emails.
 
         :return: None
         :rtype: None
         """
-        plain_text_email: str = render_to_string('email.txt', self.context)
-        html_email: str = render_to_string('email.html', self.context)
+        send_emails([self.make_email()])
 
-        try:
-            result = send_mail(
-                subject=self.get_subject(),
-                message=plain_text_email,
-                from_email=os.getenv('SMTP_FROM', ''),
-                recipient_list=[self.report.contact],
-                html_message=html_email
-            )
-            LOGGER.debug(result)
-            LOGGER.info('Successfully sent email')
-        except SMTPException as e:
-            LOGGER.error(f'Error: unable to send email due to {e}')
+
+def is_transient_smtp_error(error: Exception) -> bool:
+    """
+    Checks whether an error from sending email is likely to pass, i.e. a dropped or refused connection,
+    a network error, or a 4xx SMTP reply.
+
+    :param error: Exception raised while sending email
+    :type error: Exception
+    :return: Whether sending again may succeed
+    :rtype: bool
+    """
+    if isinstance(error, (SMTPServerDisconnected, SMTPConnectError)):
+        return True
+    if isinstance(error, SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError) and not isinstance(error, SMTPException)
+
+
+def send_emails(
+    messages: list[EmailMessage],
+    max_attempts: int = EMAIL_SEND_ATTEMPTS,
+    retry_delay: float = EMAIL_RETRY_DELAY,
+    on_result: Union[Callable[[EmailMessage, bool], None], None] = None
+) -> list[EmailMessage]:
+    """
+    Sends the messages one at a time over a single connection from get_connection, so the connection
+    (and TLS session) is set up once for all of them. A message failing with a transient error is retried
+    on a new connection after an exponentially increasing delay; a failing message does not stop the others.
+
+    :param messages: Email messages to send
+    :type messages: List of EmailMessage instances
+    :param max_attempts: Number of attempts to make for each message
+    :type max_attempts: int, optional (default is the EMAIL_SEND_ATTEMPTS environment variable or 3)
+    :param retry_delay: Seconds to wait before the first retry of a message; doubled for each later retry
+    :type retry_delay: float, optional (default is the EMAIL_RETRY_DELAY environment variable or 1.0)
+    :param on_result: Function called with each message and whether it was sent, once it is done with
+    :type on_result: Function taking an EmailMessage and a bool, or None, optional (default is None)
+    :return: Messages that could not be sent
+    :rtype: List of EmailMessage instances
+    """
+    failed_messages: list[EmailMessage] = []
+    connection: BaseEmailBackend = get_connection()
+    try:
+        for message in messages:
+            sent: bool = False
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    # Opening is skipped when the connection is already open
+                    connection.open()
+                    connection.send_messages([message])
+                    LOGGER.info(f'Successfully sent email "{message.subject}"')
+                    sent = True
+                    break
+                except (SMTPException, OSError) as e:
+                    if attempt == max_attempts or not is_transient_smtp_error(e):
+                        LOGGER.error(f'Error: unable to send email "{message.subject}" due to {e}')
+                        failed_messages.append(message)
+                        break
+                    delay: float = retry_delay * 2 ** (attempt - 1)
+                    LOGGER.warning(f'Sending email failed due to {e}; trying again in {delay} second(s)')
+                    connection.close()
+                    time.sleep(delay)
+            if on_result is not None:
+                on_result(message, sent)
+    finally:
+        connection.close()
+
+    LOGGER.info(f'Sent {len(messages) - len(failed_messages)} of {len(messages)} email(s)')
+    return failed_messages
+
+
+def prune_outbox_emails(max_sends: int, retention_days: int) -> None:
+    """
+    Deletes emails from the outbox that were sent, or that were tried max_sends times without being sent,
+    more than retention_days ago.
+
+    :param max_sends: Number of calls that may try to send an email before it is left unsent
+    :type max_sends: int
+    :param retention_days: Number of days to keep sent and given-up emails
+    :type retention_days: int
+    :return: None
+    :rtype: None
+    """
+    cutoff_dt: datetime = datetime.now(tz=utc) - timedelta(days=retention_days)
+    num_deleted, _ = OutboxEmail.objects.filter(
+        Q(sent_timestamp__lt=cutoff_dt)
+        | Q(sent_timestamp__isnull=True, attempts__gte=max_sends, created_timestamp__lt=cutoff_dt)
+    ).delete()
+    if num_deleted > 0:
+        LOGGER.info(f'Deleted {num_deleted} outbox email(s) older than {retention_days} day(s)')
+
+
+def claim_outbox_emails(max_sends: int, claim_timeout: int) -> list[OutboxEmail]:
+    """
+    Claims the unsent emails in the outbox that have been tried fewer than max_sends times, counting an attempt
+    for each. Emails claimed by another call are skipped unless their claim is older than claim_timeout seconds,
+    in which case that call is assumed to have stopped before finishing. The rows are only locked while claiming.
+
+    :param max_sends: Number of calls that may try to send an email before it is left unsent
+    :type max_sends: int
+    :param claim_timeout: Seconds after which another call's claim may be taken over
+    :type claim_timeout: int
+    :return: Claimed outbox emails, in the order they were queued
+    :rtype: List of OutboxEmail instances
+    """
+    now: datetime = datetime.now(tz=utc)
+    with transaction.atomic():
+        outbox_emails: list[OutboxEmail] = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(sent_timestamp__isnull=True, attempts__lt=max_sends)
+            .filter(Q(claimed_timestamp__isnull=True) | Q(claimed_timestamp__lt=now - timedelta(seconds=claim_timeout)))
+            .order_by('id')
+        )
+        OutboxEmail.objects.filter(id__in=[outbox_email.id for outbox_email in outbox_emails]) \
+            .update(claimed_timestamp=now, attempts=F('attempts') + 1)
+    return outbox_emails
+
+
+def send_outbox_emails(
+    max_sends: int = EMAIL_OUTBOX_MAX_SENDS,
+    claim_timeout: int = EMAIL_OUTBOX_CLAIM_TIMEOUT,
+    retention_days: int = EMAIL_OUTBOX_RETENTION_DAYS
+) -> int:
+    """
+    Sends the emails waiting in the outbox using send_emails, counting an attempt for each.
+    Emails that fail stay in the outbox for a later call, until they have been tried max_sends times.
+    Emails sent or given up on more than retention_days ago are first deleted (see prune_outbox_emails).
+    Emails are claimed in a short transaction before sending (see claim_outbox_emails), so concurrent calls
+    (e.g. from main and the send_emails command) skip them, and each one is marked sent or released
+    as soon as it is done with, so a call that stops partway does not leave sent emails to be sent again.
+
+    :param max_sends: Number of calls that may try to send an email before it is left unsent
+    :type max_sends: int, optional (default is the EMAIL_OUTBOX_MAX_SENDS environment variable or 5)
+    :param claim_timeout: Seconds after which an email claimed by an unfinished call may be claimed again
+    :type claim_timeout: int, optional (default is the EMAIL_OUTBOX_CLAIM_TIMEOUT environment variable or 600)
+    :param retention_days: Number of days to keep sent and given-up emails
+    :type retention_days: int, optional (default is the EMAIL_OUTBOX_RETENTION_DAYS environment variable or 30)
+    :return: Number of emails that could not be sent
+    :rtype: int
+    """
+    prune_outbox_emails(max_sends, retention_days)
+    outbox_emails: list[OutboxEmail] = claim_outbox_emails(max_sends, claim_timeout)
+    if len(outbox_emails) == 0:
+        LOGGER.info('No emails are waiting in the outbox')
+        return 0
+
+    LOGGER.info(f'Sending {len(outbox_emails)} email(s) from the outbox')
+    messages: list[EmailMessage] = [outbox_email.to_message() for outbox_email in outbox_emails]
+    outbox_email_ids: dict[int, int] = {
+        id(message): outbox_email.id for outbox_email, message in zip(outbox_emails, messages)
+    }
+
+    def mark_outbox_email(message: EmailMessage, sent: bool) -> None:
+        sent_timestamp: Union[datetime, None] = datetime.now(tz=utc) if sent else None
+        OutboxEmail.objects.filter(id=outbox_email_ids[id(message)]) \
+            .update(claimed_timestamp=None, sent_timestamp=sent_timestamp)
+
+    failed_message_ids: set[int] = {id(message) for message in send_emails(messages, on_result=mark_outbox_email)}
+
+    for outbox_email, message in zip(outbox_emails, messages):
+        if id(message) in failed_message_ids and outbox_email.attempts + 1 >= max_sends:
+            LOGGER.error(f'Outbox email {outbox_email.id} was not sent after {max_sends} attempt(s); giving up')
+    return len(failed_message_ids)
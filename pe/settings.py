@@ -80,7 +80,15 @@ TEMPLATES: list[dict[str, Any]] = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': ['templates'],
-        'APP_DIRS': True
+        'OPTIONS': {
+            # Templates are found in DIRS and then app directories, and are compiled once per process
+            'loaders': [
+                (
+                    'django.template.loaders.cached.Loader',
+                    ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+                )
+            ]
+        }
     }
 ]
 
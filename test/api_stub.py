@@ -0,0 +1,148 @@
+# standard libraries
+import json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Union
+from urllib.parse import parse_qs, urlparse
+
+
+# A route handler receives the query parameters and request body and returns a status code, headers, and body
+RouteHandler = Callable[[dict[str, list[str]], str], tuple[int, dict[str, str], str]]
+
+
+class StubApiServer:
+    """
+    Local HTTP server standing in for the UM API Directory in tests, with an OAuth token endpoint
+    and handlers added per test for other paths. Requests received are recorded.
+    """
+
+    def __init__(self) -> None:
+        """
+        Starts the server on a free local port in a daemon thread.
+
+        :return: None
+        :rtype: None
+        """
+        self.routes: dict[tuple[str, str], RouteHandler] = {}
+        self.requests: list[dict[str, Any]] = []
+        self.lock: threading.Lock = threading.Lock()
+        self.add_json_route('POST', '/um/oauth2/token', {'access_token': 'stub-token', 'expires_in': 3600})
+
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler_class())
+        self.server.daemon_threads = True
+        self.thread: threading.Thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url: str = f'http://127.0.0.1:{self.server.server_address[1]}/um'
+
+    def add_route(self, method: str, path: str, handler: RouteHandler) -> None:
+        """
+        Sets the handler for requests with the method and path.
+
+        :param method: Request method (e.g. "GET", "PUT")
+        :type method: string
+        :param path: Request path, without the query string
+        :type path: string
+        :param handler: Function returning the status code, headers, and body of the response
+        :type handler: RouteHandler
+        :return: None
+        :rtype: None
+        """
+        self.routes[(method, path)] = handler
+
+    def add_json_route(
+        self, method: str, path: str, data: Any, status: int = 200, headers: Union[dict[str, str], None] = None
+    ) -> None:
+        """
+        Sets a handler for requests with the method and path that always responds with the same JSON data.
+
+        :param method: Request method (e.g. "GET", "PUT")
+        :type method: string
+        :param path: Request path, without the query string
+        :type path: string
+        :param data: Data to serialize as the response body
+        :type data: Any
+        :param status: Status code of the response
+        :type status: int, optional (default is 200)
+        :param headers: Extra response headers
+        :type headers: Dictionary with string keys and values or None, optional
+        :return: None
+        :rtype: None
+        """
+        body: str = json.dumps(data)
+        self.add_route(method, path, lambda query, request_body: (status, headers or {}, body))
+
+    def get_requests(self, method: str, path: str) -> list[dict[str, Any]]:
+        """
+        Returns the recorded requests with the method and path.
+
+        :param method: Request method (e.g. "GET", "PUT")
+        :type method: string
+        :param path: Request path, without the query string
+        :type path: string
+        :return: Recorded requests, with their query parameters, headers, and body
+        :rtype: List of dictionaries with string keys
+        """
+        with self.lock:
+            return [request for request in self.requests if request['method'] == method and request['path'] == path]
+
+    def make_handler_class(self) -> type[BaseHTTPRequestHandler]:
+        """
+        Creates the request handler class used by the server, dispatching requests to the routes.
+
+        :return: Request handler class
+        :rtype: Subclass of BaseHTTPRequestHandler
+        """
+        stub: StubApiServer = self
+
+        class StubRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_any(self) -> None:
+                parsed_url = urlparse(self.path)
+                query: dict[str, list[str]] = parse_qs(parsed_url.query)
+                length: int = int(self.headers.get('Content-Length', '0'))
+                request_body: str = self.rfile.read(length).decode('utf-8') if length else ''
+                with stub.lock:
+                    stub.requests.append({
+                        'method': self.command,
+                        'path': parsed_url.path,
+                        'query': query,
+                        'headers': dict(self.headers),
+                        'body': request_body
+                    })
+
+                handler: Union[RouteHandler, None] = stub.routes.get((self.command, parsed_url.path))
+                if handler is None:
+                    status, headers, body = (404, {}, json.dumps({'error': 'Not found'}))
+                else:
+                    status, headers, body = handler(query, request_body)
+
+                encoded_body: bytes = body.encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(encoded_body)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(encoded_body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting (e.g. after a read timeout)
+                    self.close_connection = True
+
+            do_GET = do_POST = do_PUT = handle_any
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return StubRequestHandler
+
+    def close(self) -> None:
+        """
+        Stops the server and closes its socket.
+
+        :return: None
+        :rtype: None
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -1,5 +1,5 @@
 # standard libraries
-import json, logging, os
+import json, logging, os, threading, time
 from datetime import datetime
 from typing import Any, Union
 from unittest.mock import MagicMock, patch
@@ -8,11 +8,19 @@ from unittest.mock import MagicMock, patch
 from django.test import TestCase
 from django.utils.timezone import utc
 from requests import Response
+from requests.exceptions import ConnectionError, HTTPError, ReadTimeout
 from umich_api.api_utils import ApiUtil
 
 # Local libraries
-from api_retry.util import api_call_with_retries, check_if_response_successful
-from constants import API_FIXTURES_DIR, CANVAS_SCOPE, CANVAS_URL_BEGIN, ISO8601_FORMAT, ROOT_DIR
+from api_retry.session import PooledApiUtil
+from api_retry.util import (
+    ParsedResponse, RetryPolicy, SlidingWindowLimiter, api_call_with_retries, check_if_response_successful,
+    get_rate_limiter, get_retry_delay, get_retry_policy, loads_json, parse_successful_response, rate_limited_api_call
+)
+from constants import (
+    API_FIXTURES_DIR, CANVAS_SCOPE, CANVAS_URL_BEGIN, ISO8601_FORMAT, MPATHWAYS_SCOPE, MPATHWAYS_URL, ROOT_DIR
+)
+from test.api_stub import StubApiServer
 
 
 LOGGER = logging.getLogger(__name__)
@@ -84,8 +92,68 @@ class TestApiRetry(TestCase):
         result: bool = check_if_response_successful(response)
         self.assertFalse(result)
 
+    def test_parse_successful_response_returns_response_with_data(self):
+        """
+        parse_successful_response returns the Response with its parsed data, or None if the JSON is invalid.
+        """
+        response: MagicMock = MagicMock(
+            spec=Response, status_code=200, text=json.dumps(self.canvas_potions_val_subs), url=self.get_scores_url
+        )
+        self.assertEqual(
+            parse_successful_response(response), ParsedResponse(response, self.canvas_potions_val_subs)
+        )
+
+        response.text = response.text[:20]
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(parse_successful_response(response))
+
+    def test_loads_json_without_orjson(self):
+        """loads_json falls back to the json module without orjson and raises JSONDecodeError either way."""
+        text: str = json.dumps(self.canvas_potions_val_subs)
+        with patch('api_retry.util.orjson', None):
+            self.assertEqual(loads_json(text), self.canvas_potions_val_subs)
+            with self.assertRaises(json.JSONDecodeError):
+                loads_json(text[:20])
+        with self.assertRaises(json.JSONDecodeError):
+            loads_json(text[:20])
+
+    def test_api_call_with_retries_parses_response_text_once(self):
+        """api_call_with_retries parses the text of a successful response only once."""
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch('api_retry.util.loads_json', autospec=True, side_effect=loads_json) as mock_loads:
+                mock_api_call.return_value = MagicMock(
+                    spec=Response, status_code=200, text=json.dumps(self.canvas_potions_val_subs),
+                    url=self.get_scores_url
+                )
+                parsed_response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params
+                )
+
+        self.assertEqual(mock_loads.call_count, 1)
+        self.assertEqual(parsed_response.data, self.canvas_potions_val_subs)
+
+    def test_parse_successful_response_parses_large_page_once(self):
+        """
+        parse_successful_response validates a full Canvas page and returns its data with one parse of the text,
+        where validating it and then parsing it again, as was done before, took two.
+        """
+        with open(os.path.join(API_FIXTURES_DIR, 'canvas_subs.json'), 'r') as test_canvas_subs_file:
+            canvas_subs_dict: dict[str, list[dict[str, Any]]] = json.loads(test_canvas_subs_file.read())
+        fixture_subs: list[dict[str, Any]] = [sub for subs in canvas_subs_dict.values() for sub in subs]
+        # Roughly the size of a page of 50 submissions with include[]=user
+        page_subs: list[dict[str, Any]] = fixture_subs * (50 // len(fixture_subs))
+        response: MagicMock = MagicMock(
+            spec=Response, status_code=200, text=json.dumps(page_subs), url=self.get_scores_url
+        )
+
+        with patch('api_retry.util.loads_json', autospec=True, side_effect=loads_json) as mock_loads:
+            parsed_response: Union[ParsedResponse, None] = parse_successful_response(response)
+
+        self.assertEqual(mock_loads.call_count, 1)
+        self.assertEqual(parsed_response.data, page_subs)
+
     def test_api_call_with_retries_when_no_errors(self):
-        """api_call_with_retries returns Response object when a valid Response is found."""
+        """api_call_with_retries returns the Response with its parsed data when a valid Response is found."""
 
         with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
             mock_api_call.return_value = MagicMock(
@@ -105,8 +173,8 @@ class TestApiRetry(TestCase):
 
         self.assertEqual(mock_api_call.call_count, 1)
         mock_api_call.assert_called_with(self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params)
-        self.assertTrue(response.ok)
-        self.assertEqual(json.loads(response.text), self.canvas_potions_val_subs)
+        self.assertTrue(response.response.ok)
+        self.assertEqual(response.data, self.canvas_potions_val_subs)
 
     def test_api_call_with_retries_with_all_errors(self):
         """api_call_with_retries returns None when no valid Response is found after the maximum number of attempts."""
@@ -114,23 +182,428 @@ class TestApiRetry(TestCase):
         num_attempts: int = 4
         resp_mocks: list[MagicMock] = [
             MagicMock(
-                spec=Response, status_code=504, text=json.dumps({'message': 'Gateway Timeout'}), url=full_url
+                spec=Response, status_code=504, text=json.dumps({'message': 'Gateway Timeout'}), url=full_url,
+                headers={}
             )
             for i in range(num_attempts + 1)
         ]
 
         with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
-            mock_api_call.side_effect = resp_mocks
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                mock_api_call.side_effect = resp_mocks
 
-            response: Union[MagicMock, None] = api_call_with_retries(
-                self.api_handler,
-                self.get_scores_url,
-                CANVAS_SCOPE,
-                'GET',
-                self.canvas_params,
-                max_req_attempts=num_attempts
-            )
+                response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler,
+                    self.get_scores_url,
+                    CANVAS_SCOPE,
+                    'GET',
+                    self.canvas_params,
+                    max_req_attempts=num_attempts
+                )
 
         self.assertEqual(mock_api_call.call_count, 4)
+        # No wait after the last attempt
+        self.assertEqual(mock_sleep.call_count, 3)
         mock_api_call.assert_called_with(self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params)
         self.assertEqual(response, None)
+
+    def test_api_call_with_retries_honors_retry_after(self):
+        """api_call_with_retries waits for the number of seconds in a Retry-After header before the next attempt."""
+        full_url: str = '/'.join([self.api_handler.base_url, self.get_scores_url])
+        resp_mocks: list[MagicMock] = [
+            MagicMock(
+                spec=Response, status_code=429, text=json.dumps({'message': 'Too Many Requests'}), url=full_url,
+                headers={'Retry-After': '7'}
+            ),
+            MagicMock(spec=Response, status_code=200, text=json.dumps(self.canvas_potions_val_subs), url=full_url)
+        ]
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                mock_api_call.side_effect = resp_mocks
+                response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params
+                )
+
+        self.assertEqual(mock_api_call.call_count, 2)
+        mock_sleep.assert_called_once_with(7.0)
+        self.assertEqual(response, ParsedResponse(resp_mocks[1], self.canvas_potions_val_subs))
+
+    def test_api_call_with_retries_fails_fast_on_client_error(self):
+        """api_call_with_retries returns None without retrying or waiting when it receives a 4xx client error."""
+        full_url: str = '/'.join([self.api_handler.base_url, self.get_scores_url])
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                mock_api_call.return_value = MagicMock(
+                    spec=Response, status_code=404, text=json.dumps({'message': 'Not Found'}), url=full_url,
+                    headers={}
+                )
+                response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params
+                )
+
+        self.assertEqual(mock_api_call.call_count, 1)
+        mock_sleep.assert_not_called()
+        self.assertIsNone(response)
+
+    def test_api_call_with_retries_retries_canvas_throttling(self):
+        """
+        api_call_with_retries retries a Canvas 403 "Rate Limit Exceeded" response, waiting max_delay
+        because X-Rate-Limit-Remaining shows no quota left.
+        """
+        full_url: str = '/'.join([self.api_handler.base_url, self.get_scores_url])
+        resp_mocks: list[MagicMock] = [
+            MagicMock(
+                spec=Response, status_code=403, text='403 Forbidden (Rate Limit Exceeded)', url=full_url,
+                headers={'X-Rate-Limit-Remaining': '0.0'}
+            )
+            for i in range(2)
+        ] + [MagicMock(spec=Response, status_code=200, text=json.dumps(self.canvas_potions_val_subs), url=full_url)]
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                mock_api_call.side_effect = resp_mocks
+                response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params,
+                    retry_policy=RetryPolicy(base_delay=2.0, max_delay=10.0)
+                )
+
+        self.assertEqual(mock_api_call.call_count, 3)
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [10.0, 10.0])
+        self.assertEqual(response, ParsedResponse(resp_mocks[2], self.canvas_potions_val_subs))
+
+    def test_api_call_with_retries_stops_at_max_total_wait(self):
+        """api_call_with_retries returns None when waiting before the next attempt would exceed max_total_wait."""
+        full_url: str = '/'.join([self.api_handler.base_url, self.get_scores_url])
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                mock_api_call.return_value = MagicMock(
+                    spec=Response, status_code=503, text=json.dumps({'message': 'Service Unavailable'}),
+                    url=full_url, headers={'Retry-After': '90'}
+                )
+                response: Union[ParsedResponse, None] = api_call_with_retries(
+                    self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params,
+                    max_req_attempts=5, retry_policy=RetryPolicy(max_total_wait=120.0)
+                )
+
+        self.assertEqual(mock_api_call.call_count, 2)
+        mock_sleep.assert_called_once_with(90.0)
+        self.assertIsNone(response)
+
+    def test_api_call_with_retries_retries_request_exceptions(self):
+        """
+        api_call_with_retries retries requests that raise a RequestException, like unsuccessful responses,
+        and returns None once the attempts run out.
+        """
+        full_url: str = '/'.join([self.api_handler.base_url, self.get_scores_url])
+        success_response: MagicMock = MagicMock(
+            spec=Response, status_code=200, text=json.dumps(self.canvas_potions_val_subs), url=full_url
+        )
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                mock_api_call.side_effect = [
+                    ReadTimeout('Read timed out'), ConnectionError('Connection refused'), success_response
+                ]
+                with self.assertLogs(level='WARNING'):
+                    response: Union[ParsedResponse, None] = api_call_with_retries(
+                        self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params,
+                        retry_policy=RetryPolicy(base_delay=2.0, jitter=False)
+                    )
+
+                self.assertEqual(response, ParsedResponse(success_response, self.canvas_potions_val_subs))
+                self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [2.0, 4.0])
+
+                mock_api_call.side_effect = HTTPError('401 Client Error: Unauthorized')
+                with self.assertLogs(level='ERROR'):
+                    response = api_call_with_retries(
+                        self.api_handler, self.get_scores_url, CANVAS_SCOPE, 'GET', self.canvas_params,
+                        retry_policy=RetryPolicy(base_delay=2.0, jitter=False)
+                    )
+
+        self.assertIsNone(response)
+        self.assertEqual(mock_api_call.call_count, 6)
+
+    def test_get_retry_delay_uses_jitter_within_exponential_bound(self):
+        """get_retry_delay returns a jittered delay no greater than base_delay * 2 ** (attempt_num - 1) or max_delay."""
+        response: MagicMock = MagicMock(spec=Response, status_code=504, text='', headers={})
+        retry_policy: RetryPolicy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+
+        for attempt_num, bound in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)]:
+            delay: float = get_retry_delay(response, attempt_num, retry_policy)
+            self.assertTrue(0 <= delay <= bound)
+
+    def test_get_retry_delay_waits_longer_as_rate_limit_quota_falls(self):
+        """
+        get_retry_delay waits longer the further X-Rate-Limit-Remaining falls below rate_limit_threshold,
+        from the full exponential delay at the threshold up to max_delay when no quota remains.
+        """
+        retry_policy: RetryPolicy = RetryPolicy(base_delay=1.0, max_delay=21.0, rate_limit_threshold=50.0)
+
+        def get_delay(remaining: str) -> float:
+            response: MagicMock = MagicMock(
+                spec=Response, status_code=403, text='403 Forbidden (Rate Limit Exceeded)',
+                headers={'X-Rate-Limit-Remaining': remaining}
+            )
+            with self.assertLogs(level='INFO'):
+                return get_retry_delay(response, 1, retry_policy)
+
+        delays: list[float] = [get_delay(remaining) for remaining in ['49.5', '25.0', '0.0', '-10.0']]
+        self.assertEqual(delays, [1.2, 11.0, 21.0, 21.0])
+
+    def test_get_retry_policy_with_scope_specific_override(self):
+        """get_retry_policy prefers scope-specific environment variables over general ones."""
+        with patch.dict(
+            os.environ, {'RETRY_BASE_DELAY': '3', 'PLACEMENTSCORES_RETRY_BASE_DELAY': '10', 'RETRY_JITTER': '0'}
+        ):
+            canvas_policy: RetryPolicy = get_retry_policy(CANVAS_SCOPE)
+            mpathways_policy: RetryPolicy = get_retry_policy('placementscores')
+
+        self.assertEqual((canvas_policy.base_delay, canvas_policy.jitter), (3.0, False))
+        self.assertEqual((mpathways_policy.base_delay, mpathways_policy.jitter), (10.0, False))
+
+
+class TestRateLimiting(TestCase):
+
+    def setUp(self):
+        """Set up ApiUtil instance used by test methods."""
+        self.api_handler: ApiUtil = ApiUtil(
+            os.getenv('API_DIR_URL', ''),
+            os.getenv('API_DIR_CLIENT_ID', ''),
+            os.getenv('API_DIR_SECRET', ''),
+            os.path.join(ROOT_DIR, 'config', 'apis.json')
+        )
+
+    def test_sliding_window_limiter_allows_limit_then_waits(self):
+        """SlidingWindowLimiter.acquire returns immediately for limits_calls calls and then waits."""
+        limiter: SlidingWindowLimiter = SlidingWindowLimiter(2, 0.2)
+        self.assertEqual(limiter.acquire(), 0.0)
+        self.assertEqual(limiter.acquire(), 0.0)
+        self.assertGreater(limiter.acquire(), 0.0)
+
+    def test_sliding_window_limiter_never_exceeds_limit_in_any_period(self):
+        """
+        With a simulated clock, no period of limits_period seconds contains more than limits_calls calls,
+        whether callers arrive in bursts or steadily.
+        """
+        clock: list[float] = [1000.0]
+        with patch('api_retry.util.time.monotonic', autospec=True, side_effect=lambda: clock[0]):
+            limiter: SlidingWindowLimiter = SlidingWindowLimiter(200, 60)
+            call_times: list[float] = []
+            waits: list[float] = []
+            for i in range(1000):
+                # Bursts of callers every 45 seconds, with a steady trickle in between
+                if i % 250 == 0:
+                    clock[0] += 45.0
+                else:
+                    clock[0] += 0.01
+                waits.append(limiter.reserve())
+                call_times.append(clock[0] + waits[-1])
+
+        call_times.sort()
+        for i in range(len(call_times) - 200):
+            # Call i + 200 falls outside the period beginning at call i
+            self.assertGreaterEqual(call_times[i + 200] - call_times[i], 60.0)
+        # Callers are only delayed once the limit is reached
+        self.assertEqual(waits[:200], [0.0] * 200)
+        self.assertGreater(waits[200], 0.0)
+
+    def test_sliding_window_limiter_is_shared_safely_across_threads(self):
+        """SlidingWindowLimiter allows limits_calls calls without waiting when many threads acquire at once."""
+        limiter: SlidingWindowLimiter = SlidingWindowLimiter(40, 1000)
+        waits: list[float] = []
+
+        def acquire_ten() -> None:
+            for i in range(10):
+                waits.append(limiter.acquire())
+
+        threads: list[threading.Thread] = [threading.Thread(target=acquire_ten) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(waits, [0.0] * 40)
+        self.assertEqual(len(limiter.call_times), 40)
+        self.assertGreater(limiter.reserve(), 900.0)
+
+    def test_get_rate_limiter_uses_limits_from_config(self):
+        """get_rate_limiter returns one shared SlidingWindowLimiter per scope built from apis.json."""
+        mpathways_limiter: SlidingWindowLimiter = get_rate_limiter(MPATHWAYS_SCOPE)
+        self.assertEqual((mpathways_limiter.limits_calls, mpathways_limiter.limits_period), (200, 60))
+        self.assertIs(get_rate_limiter(MPATHWAYS_SCOPE), mpathways_limiter)
+        self.assertIsNone(get_rate_limiter('someotherscope'))
+
+    def test_rate_limited_api_call_acquires_limiter_and_passes_arguments(self):
+        """rate_limited_api_call waits on the scope limiter, then calls ApiUtil.api_call with the same arguments."""
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            with patch.object(SlidingWindowLimiter, 'acquire', autospec=True) as mock_acquire:
+                mock_acquire.return_value = 0.0
+                rate_limited_api_call(
+                    self.api_handler, MPATHWAYS_URL, MPATHWAYS_SCOPE, 'PUT',
+                    payload='{}', api_specific_headers=[{'Content-Type': 'application/json'}]
+                )
+
+        mock_acquire.assert_called_once_with(get_rate_limiter(MPATHWAYS_SCOPE))
+        mock_api_call.assert_called_once_with(
+            self.api_handler, MPATHWAYS_URL, MPATHWAYS_SCOPE, 'PUT',
+            payload='{}', api_specific_headers=[{'Content-Type': 'application/json'}]
+        )
+
+
+class TestPooledApiUtil(TestCase):
+
+    def setUp(self):
+        """Set up PooledApiUtil instance and token response used by test methods."""
+        self.api_handler: PooledApiUtil = PooledApiUtil(
+            'https://some-api.umich.edu/um',
+            'some-client-id',
+            'some-secret',
+            os.path.join(ROOT_DIR, 'config', 'apis.json'),
+            pool_size=4,
+            connect_timeout=2.0,
+            read_timeout=20.0
+        )
+        self.token_response: MagicMock = MagicMock(spec=Response, status_code=200)
+        self.token_response.json.return_value = {'access_token': 'some-token', 'expires_in': 3600}
+
+    def tearDown(self):
+        """Close the session of the PooledApiUtil instance."""
+        self.api_handler.close()
+
+    def test_session_mounts_adapter_with_pool_size(self):
+        """PooledApiUtil mounts one HTTPAdapter sized by pool_size for HTTPS and HTTP."""
+        https_adapter = self.api_handler.session.get_adapter('https://some-api.umich.edu/um')
+        self.assertIs(https_adapter, self.api_handler.session.get_adapter('http://some-api.umich.edu/um'))
+        self.assertEqual(https_adapter._pool_maxsize, 4)
+        self.assertEqual(https_adapter.max_retries.total, 0)
+
+    def test_api_call_reuses_token_and_session(self):
+        """
+        api_call requests one token per scope and sends every request through the shared session
+        with the configured timeouts.
+        """
+        with patch.object(self.api_handler.session, 'post', autospec=True) as mock_post:
+            with patch.object(self.api_handler.session, 'request', autospec=True) as mock_request:
+                mock_post.return_value = self.token_response
+                mock_request.return_value = MagicMock(spec=Response, status_code=200)
+                for _ in range(3):
+                    self.api_handler.api_call(CANVAS_URL_BEGIN, CANVAS_SCOPE, 'GET', {'page': 1})
+                self.api_handler.api_call(
+                    MPATHWAYS_URL, MPATHWAYS_SCOPE, 'PUT', '{}', [{'Content-Type': 'application/json'}]
+                )
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(
+            [call.kwargs['data']['scope'] for call in mock_post.call_args_list], [CANVAS_SCOPE, MPATHWAYS_SCOPE]
+        )
+        self.assertEqual(mock_post.call_args.args[0], 'https://some-api.umich.edu/um/oauth2/token')
+        self.assertEqual(mock_request.call_count, 4)
+
+        get_call, put_call = mock_request.call_args_list[0], mock_request.call_args_list[3]
+        self.assertEqual(get_call.args, ('GET', f'https://some-api.umich.edu/um/{CANVAS_URL_BEGIN}'))
+        self.assertEqual(get_call.kwargs['params'], {'page': 1})
+        self.assertEqual(get_call.kwargs['timeout'], (2.0, 20.0))
+        self.assertEqual(get_call.kwargs['headers']['Authorization'], 'Bearer some-token')
+        self.assertEqual(put_call.kwargs['data'], '{}')
+        self.assertEqual(put_call.kwargs['headers']['Content-Type'], 'application/json')
+
+    def test_get_cached_token_refreshes_before_expiry(self):
+        """get_cached_token requests a new token when the cached one expires within the refresh margin."""
+        self.api_handler.tokens[CANVAS_SCOPE] = ('old-token', time.time() + 30)
+        with patch.object(self.api_handler.session, 'post', autospec=True) as mock_post:
+            mock_post.return_value = self.token_response
+            token: str = self.api_handler.get_cached_token(CANVAS_SCOPE)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(token, 'some-token')
+
+    def test_api_call_replaces_rejected_token_once(self):
+        """api_call replaces a token that was rejected with a 401 status code and sends the request again once."""
+        self.api_handler.tokens[CANVAS_SCOPE] = ('revoked-token', time.time() + 3600)
+        with patch.object(self.api_handler.session, 'post', autospec=True) as mock_post:
+            with patch.object(self.api_handler.session, 'request', autospec=True) as mock_request:
+                mock_post.return_value = self.token_response
+                mock_request.side_effect = [
+                    MagicMock(spec=Response, status_code=401), MagicMock(spec=Response, status_code=200)
+                ]
+                with self.assertLogs(level='WARNING'):
+                    response: Response = self.api_handler.api_call(CANVAS_URL_BEGIN, CANVAS_SCOPE)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(
+            [call.kwargs['headers']['Authorization'] for call in mock_request.call_args_list],
+            ['Bearer revoked-token', 'Bearer some-token']
+        )
+
+    def test_get_cached_token_uses_fresh_stored_token(self):
+        """get_cached_token uses a fresh token from the token_store without requesting a new one."""
+        token_store: MagicMock = MagicMock()
+        token_store.get_token.return_value = ('stored-token', time.time() + 1800)
+        self.api_handler.token_store = token_store
+
+        with patch.object(self.api_handler.session, 'post', autospec=True) as mock_post:
+            tokens: list[str] = [self.api_handler.get_cached_token(CANVAS_SCOPE) for _ in range(2)]
+
+        self.assertEqual(tokens, ['stored-token', 'stored-token'])
+        mock_post.assert_not_called()
+        token_store.get_token.assert_called_once_with(CANVAS_SCOPE)
+        token_store.put_token.assert_not_called()
+
+    def test_get_cached_token_renews_expiring_stored_token(self):
+        """
+        get_cached_token requests a new token when the stored one expires within the refresh margin,
+        and stores the new token.
+        """
+        token_store: MagicMock = MagicMock()
+        token_store.get_token.return_value = ('stored-token', time.time() + 30)
+        self.api_handler.token_store = token_store
+
+        with patch.object(self.api_handler.session, 'post', autospec=True) as mock_post:
+            mock_post.return_value = self.token_response
+            token: str = self.api_handler.get_cached_token(CANVAS_SCOPE)
+
+        self.assertEqual(token, 'some-token')
+        self.assertEqual(mock_post.call_count, 1)
+        stored_scope, stored_token, stored_expires_at = token_store.put_token.call_args.args
+        self.assertEqual((stored_scope, stored_token), (CANVAS_SCOPE, 'some-token'))
+        self.assertAlmostEqual(stored_expires_at, time.time() + 3600, delta=5)
+
+    def test_api_call_with_retries_retries_read_timeout_from_stub_server(self):
+        """
+        api_call_with_retries retries a GET that times out waiting for the server (with finite timeouts set
+        by PooledApiUtil) and returns the response to the next attempt.
+        """
+        stub: StubApiServer = StubApiServer()
+        stub_path: str = f'/um/{CANVAS_URL_BEGIN}/courses/888888/students/submissions'
+        num_requests: list[int] = [0]
+        release: threading.Event = threading.Event()
+
+        def slow_then_fast(query: dict[str, list[str]], body: str) -> tuple[int, dict[str, str], str]:
+            num_requests[0] += 1
+            if num_requests[0] == 1:
+                # Event.wait is used so the test's patch of time.sleep does not shorten the delay
+                release.wait(2.0)
+            return (200, {}, json.dumps([{'id': 1}]))
+
+        stub.add_route('GET', stub_path, slow_then_fast)
+        timeout_api_handler: PooledApiUtil = PooledApiUtil(
+            stub.base_url, 'some-client-id', 'some-secret', os.path.join(ROOT_DIR, 'config', 'apis.json'),
+            read_timeout=0.5
+        )
+        try:
+            with patch('api_retry.util.time.sleep', autospec=True) as mock_sleep:
+                with self.assertLogs(level='WARNING') as cm:
+                    parsed_response: Union[ParsedResponse, None] = api_call_with_retries(
+                        timeout_api_handler, stub_path.removeprefix('/um/'), CANVAS_SCOPE, 'GET', {'per_page': 50},
+                        retry_policy=RetryPolicy(base_delay=1.0, jitter=False)
+                    )
+        finally:
+            release.set()
+            timeout_api_handler.close()
+            stub.close()
+
+        self.assertTrue(any('Read timed out' in line for line in cm.output))
+        mock_sleep.assert_called_once_with(1.0)
+        self.assertEqual(parsed_response.data, [{'id': 1}])
+        self.assertEqual(len(stub.get_requests('GET', stub_path)), 2)
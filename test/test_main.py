@@ -1,19 +1,23 @@
 # standard libraries
-import json, os
+import json, os, threading
 from typing import Any
 from unittest.mock import MagicMock, patch
 
 # third-party libraries
 from django.core import mail
+from django.core.management import call_command
+from django.db import connection
 from django.db.models import QuerySet
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from requests import Response
 from umich_api.api_utils import ApiUtil
 
 # local libraries
+from api_retry.util import ParsedResponse
 from constants import API_FIXTURES_DIR, ROOT_DIR
 from pe.main import main
-from pe.models import Report
+from pe.models import Exam, OutboxEmail, Report
 
 
 class MainTestCase(TestCase):
@@ -45,8 +49,8 @@ class MainTestCase(TestCase):
         """
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
             with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
-                mock_get.return_value = MagicMock(
-                    spec=Response, status_code=200, text=json.dumps(self.canvas_dada_place_subs)
+                mock_get.return_value = ParsedResponse(
+                    MagicMock(spec=Response, status_code=200), self.canvas_dada_place_subs
                 )
                 mock_send.return_value = MagicMock(
                     spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[7])
@@ -67,7 +71,7 @@ class MainTestCase(TestCase):
         (Note this also implies that there were no new submissions found.)
         """
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
-            mock_get.return_value = MagicMock(spec=Response, status_code=200, text=json.dumps([]))
+            mock_get.return_value = ParsedResponse(MagicMock(spec=Response, status_code=200), [])
             main(self.api_handler)
 
         dada_report: Report = Report.objects.get(id=3)
@@ -75,14 +79,33 @@ class MainTestCase(TestCase):
         self.assertFalse(new_submissions_qs.exists())
         self.assertEqual(len(mail.outbox), 0)
 
+    def test_main_query_count_does_not_depend_on_debug_logging(self):
+        """
+        Function main loads reports and their exams once for the whole run, and debug logging of them
+        does not add queries.
+        """
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            mock_get.return_value = ParsedResponse(MagicMock(spec=Response, status_code=200), [])
+            with CaptureQueriesContext(connection) as queries:
+                main(self.api_handler)
+            with self.assertLogs('pe.main', level='DEBUG') as cm:
+                with self.assertNumQueries(15):
+                    main(self.api_handler)
+
+        self.assertEqual(len(queries), 15)
+        exam_table: str = connection.ops.quote_name(Exam._meta.db_table)
+        exam_queries: list[str] = [query['sql'] for query in queries if f'FROM {exam_table}' in query['sql']]
+        self.assertEqual(len(exam_queries), 1)
+        self.assertTrue(any('DADA Placement' in line for line in cm.output))
+
     def test_main_sends_email_when_only_transmission_failures(self):
         """
         Function main still sends email when there are failed transmissions.
         """
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
             with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
-                mock_get.return_value = MagicMock(
-                    spec=Response, status_code=200, text=json.dumps(self.canvas_dada_place_subs)
+                mock_get.return_value = ParsedResponse(
+                    MagicMock(spec=Response, status_code=200), self.canvas_dada_place_subs
                 )
                 mock_send.return_value = MagicMock(spec=Response, status_code=500, text=json.dumps({}))
                 main(self.api_handler)
@@ -91,3 +114,87 @@ class MainTestCase(TestCase):
         failed_submissions_qs: QuerySet = dada_report.exams.first().submissions.filter(transmitted=False)
         self.assertTrue(len(failed_submissions_qs), 2)
         self.assertEqual(len(mail.outbox), 1)
+
+    def test_main_without_drain_queues_email_for_send_emails_command(self):
+        """
+        Function main only queues report emails when drain_outbox is False; the send_emails command sends them.
+        """
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                mock_get.return_value = ParsedResponse(
+                    MagicMock(spec=Response, status_code=200), self.canvas_dada_place_subs
+                )
+                mock_send.return_value = MagicMock(
+                    spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[7])
+                )
+                main(self.api_handler, drain_outbox=False)
+
+        self.assertEqual(len(mail.outbox), 0)
+        outbox_email: OutboxEmail = OutboxEmail.objects.get()
+        self.assertEqual(
+            (outbox_email.report_id, outbox_email.to, outbox_email.attempts), (3, ['rlupin@hogwarts.edu'], 0)
+        )
+        self.assertIsNone(outbox_email.sent_timestamp)
+
+        call_command('send_emails')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, outbox_email.subject)
+        outbox_email.refresh_from_db()
+        self.assertIsNotNone(outbox_email.sent_timestamp)
+
+
+class MainConcurrencyTestCase(TransactionTestCase):
+    fixtures: list[str] = ['test_01.json', 'test_03.json']
+
+    def setUp(self):
+        """
+        Initializes api_handler and API response data used for patching.
+        """
+        self.api_handler: ApiUtil = ApiUtil(
+            os.getenv('API_DIR_URL', ''),
+            os.getenv('API_DIR_CLIENT_ID', ''),
+            os.getenv('API_DIR_SECRET', ''),
+            os.path.join(ROOT_DIR, 'config', 'apis.json')
+        )
+
+        with open(os.path.join(API_FIXTURES_DIR, 'canvas_subs.json'), 'r') as test_canvas_subs_file:
+            canvas_subs_dict: dict[str, list[dict[str, Any]]] = json.loads(test_canvas_subs_file.read())
+
+        self.canvas_dada_place_subs: list[dict[str, Any]] = canvas_subs_dict['DADA_Placement_1']
+
+        with open(os.path.join(API_FIXTURES_DIR, 'mpathways_resp_data.json'), 'r') as mpathways_resp_data_file:
+            self.mpathways_resp_data: list[dict[str, Any]] = json.loads(mpathways_resp_data_file.read())
+
+    def test_main_with_exam_workers_processes_exams_in_worker_threads(self):
+        """
+        Function main processes every exam in a worker thread when exam_workers is greater than one and
+        still reports on the results by email.
+        """
+        thread_names: list[str] = []
+
+        def fake_get(api_handler, url, *args, **kwargs) -> ParsedResponse:
+            thread_names.append(threading.current_thread().name)
+            # Only the DADA Placement exam (course 999999) has new submissions
+            sub_dicts: list[dict[str, Any]] = self.canvas_dada_place_subs if '999999' in url else []
+            return ParsedResponse(MagicMock(spec=Response, status_code=200), sub_dicts)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                mock_get.side_effect = fake_get
+                mock_send.return_value = MagicMock(
+                    spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[7])
+                )
+                main(self.api_handler, exam_workers=2)
+
+        self.assertEqual(len(thread_names), 3)
+        self.assertTrue(all(thread_name.startswith('exam') for thread_name in thread_names))
+
+        dada_report: Report = Report.objects.get(id=3)
+        new_submissions_qs: QuerySet = dada_report.exams.first().submissions.all()
+        self.assertEqual(
+            list(new_submissions_qs.values('student_uniqname', 'score', 'transmitted')),
+            [{'student_uniqname': 'nlongbottom', 'score': 500.0, 'transmitted': True}]
+        )
+        # Only the DADA report had transmission activity
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['rlupin@hogwarts.edu'])
@@ -1,23 +1,27 @@
 # standard libraries
-import json, logging, os
-from datetime import datetime
-from typing import Any
+import hashlib, json, logging, os, time, tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Union
 from unittest.mock import MagicMock, patch
 from urllib.parse import quote_plus
 
 # third-party libraries
+from django.db import connection
 from django.db.models import QuerySet
-from django.test import TestCase
+from django.db.models.signals import post_init
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import utc
 from requests import Response
 from umich_api.api_utils import ApiUtil
 
 # local libraries
+from api_retry.util import ParsedResponse
 from constants import (
-    API_FIXTURES_DIR, CANVAS_URL_BEGIN, ISO8601_FORMAT, MPATHWAYS_SCOPE, MPATHWAYS_URL, ROOT_DIR
+    API_FIXTURES_DIR, CANVAS_SCOPE, CANVAS_URL_BEGIN, ISO8601_FORMAT, MPATHWAYS_SCOPE, MPATHWAYS_URL, ROOT_DIR
 )
-from pe.models import Exam, Submission
-from pe.orchestration import ScoresOrchestration
+from pe.models import Exam, ExamSyncCursor, ScoreBatch, Submission, SubmissionRecord
+from pe.orchestration import ScoresOrchestration, reconcile_score_batches, to_sub_records
 
 
 LOGGER = logging.getLogger(__name__)
@@ -50,9 +54,9 @@ class ScoresOrchestrationTestCase(TestCase):
         with open(os.path.join(API_FIXTURES_DIR, 'mpathways_resp_data.json'), 'r') as mpathways_resp_data_file:
             self.mpathways_resp_data: list[dict[str, Any]] = json.loads(mpathways_resp_data_file.read())
 
-        self.dup_get_mocks: list[MagicMock] = [
-            MagicMock(spec=Response, status_code=200, text=json.dumps(canvas_subs_dict['Potions_Placement_1'])),
-            MagicMock(spec=Response, status_code=200, text=json.dumps(canvas_subs_dict['Potions_Placement_2']))
+        self.dup_get_mocks: list[ParsedResponse] = [
+            ParsedResponse(MagicMock(spec=Response, status_code=200), canvas_subs_dict['Potions_Placement_1']),
+            ParsedResponse(MagicMock(spec=Response, status_code=200), canvas_subs_dict['Potions_Placement_2'])
         ]
 
     def test_constructor_uses_latest_graded_dt_when_subs(self):
@@ -74,6 +78,16 @@ class ScoresOrchestrationTestCase(TestCase):
         some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
         self.assertEqual(some_orca.sub_time_filter, datetime(2020, 7, 1, 0, 0, 0, tzinfo=utc))
 
+    def test_constructor_uses_sync_cursor_when_present(self):
+        """
+        Constructor assigns the exam's sync cursor value plus one second to sub_time_filter when the exam has a cursor.
+        """
+        ExamSyncCursor.objects.create(exam_id=1, last_graded_timestamp=datetime(2020, 6, 13, 8, 0, 0, tzinfo=utc))
+        potions_place_exam: Exam = Exam.objects.get(id=1)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_place_exam)
+
+        self.assertEqual(some_orca.sub_time_filter, datetime(2020, 6, 13, 8, 0, 1, tzinfo=utc))
+
     def test_get_sub_dicts_for_exam_with_null_response(self):
         """
         get_sub_dicts_for_exam stops collecting data and paginating if api_call_with_retries returns None.
@@ -94,8 +108,8 @@ class ScoresOrchestrationTestCase(TestCase):
         some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
 
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
-            mock_retry_func.return_value = MagicMock(
-                spec=Response, ok=True, links={}, text=json.dumps(self.canvas_potions_val_subs[:1])
+            mock_retry_func.return_value = ParsedResponse(
+                MagicMock(spec=Response, ok=True, links={}), self.canvas_potions_val_subs[:1]
             )
             sub_dicts: list[dict[str, Any]] = some_orca.get_sub_dicts_for_exam()
 
@@ -123,9 +137,9 @@ class ScoresOrchestrationTestCase(TestCase):
             }
         }
 
-        mocks: list[MagicMock] = [
-            MagicMock(spec=Response, ok=True, links=first_links, text=json.dumps(self.canvas_potions_val_subs[0:1])),
-            MagicMock(spec=Response, ok=True, links={}, text=json.dumps(self.canvas_potions_val_subs[1:]))
+        mocks: list[ParsedResponse] = [
+            ParsedResponse(MagicMock(spec=Response, ok=True, links=first_links), self.canvas_potions_val_subs[0:1]),
+            ParsedResponse(MagicMock(spec=Response, ok=True, links={}), self.canvas_potions_val_subs[1:])
         ]
 
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
@@ -136,6 +150,136 @@ class ScoresOrchestrationTestCase(TestCase):
         self.assertEqual(len(sub_dicts), 2)
         self.assertEqual(sub_dicts, self.canvas_potions_val_subs)
 
+    def test_get_sub_dicts_for_exam_with_page_workers_fetches_remaining_pages_concurrently(self):
+        """
+        get_sub_dicts_for_exam uses the last page number from the first response to fetch the remaining pages
+        concurrently and merges them in page order.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        page_url: str = (
+            f'{os.getenv("API_DIR_URL", "https://some-api.umich.edu")}/{CANVAS_URL_BEGIN}' +
+            f'/courses/{some_orca.exam.course_id}/students/submissions?per_page=1'
+        )
+        first_links: dict[str, Any] = {
+            'next': {'url': f'{page_url}&page=2', 'rel': 'next'},
+            'last': {'url': f'{page_url}&page=3', 'rel': 'last'}
+        }
+        page_sub_dicts: dict[int, list[dict[str, Any]]] = {
+            1: self.canvas_potions_val_subs[0:1],
+            2: self.canvas_potions_val_subs[1:],
+            3: self.canvas_dada_place_subs_one
+        }
+
+        def fake_get(api_handler, url, subscription, method, payload, max_req_attempts) -> ParsedResponse:
+            page_num: int = payload.get('page', 1)
+            links: dict[str, Any] = first_links if page_num == 1 else {}
+            return ParsedResponse(MagicMock(spec=Response, ok=True, links=links), page_sub_dicts[page_num])
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.side_effect = fake_get
+            sub_dicts: list[dict[str, Any]] = some_orca.get_sub_dicts_for_exam(1, page_workers=2)
+
+        self.assertEqual(mock_retry_func.call_count, 3)
+        self.assertEqual(
+            sorted(call.args[4].get('page', 1) for call in mock_retry_func.call_args_list), [1, 2, 3]
+        )
+        self.assertEqual(sub_dicts, self.canvas_potions_val_subs + self.canvas_dada_place_subs_one)
+
+    def test_get_sub_dicts_for_exam_with_page_workers_and_no_canvas_limits(self):
+        """
+        get_sub_dicts_for_exam fetches the remaining pages with page_workers workers, logging a warning,
+        when the API configuration has no limits for the Canvas scope.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        page_url: str = f'https://some-api.umich.edu/{CANVAS_URL_BEGIN}/courses/{some_orca.exam.course_id}?per_page=1'
+        first_links: dict[str, Any] = {
+            'next': {'url': f'{page_url}&page=2', 'rel': 'next'},
+            'last': {'url': f'{page_url}&page=3', 'rel': 'last'}
+        }
+        page_sub_dicts: dict[int, list[dict[str, Any]]] = {
+            1: self.canvas_potions_val_subs[0:1],
+            2: self.canvas_potions_val_subs[1:],
+            3: self.canvas_dada_place_subs_one
+        }
+
+        def fake_get(api_handler, url, subscription, method, payload, max_req_attempts) -> ParsedResponse:
+            page_num: int = payload.get('page', 1)
+            links: dict[str, Any] = first_links if page_num == 1 else {}
+            return ParsedResponse(MagicMock(spec=Response, ok=True, links=links), page_sub_dicts[page_num])
+
+        with patch('pe.orchestration.get_api_limits', autospec=True, return_value={}):
+            with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+                mock_retry_func.side_effect = fake_get
+                with self.assertLogs(level='INFO') as cm:
+                    sub_dicts: list[dict[str, Any]] = some_orca.get_sub_dicts_for_exam(1, page_workers=2)
+
+        self.assertEqual(mock_retry_func.call_count, 3)
+        self.assertTrue(
+            f'WARNING:pe.orchestration:No limits are configured for {CANVAS_SCOPE}; ' +
+            'page workers will not be limited by them' in cm.output
+        )
+        self.assertTrue('INFO:pe.orchestration:Fetching pages 2 through 3 using 2 worker(s)' in cm.output)
+        self.assertEqual(sub_dicts, self.canvas_potions_val_subs + self.canvas_dada_place_subs_one)
+
+    def test_get_sub_dicts_for_exam_with_page_workers_stops_at_failed_page(self):
+        """
+        get_sub_dicts_for_exam discards the results of a failed page and any later pages when fetching concurrently.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        first_links: dict[str, Any] = {
+            'last': {'url': f'https://some-api.umich.edu/{CANVAS_URL_BEGIN}/courses/888888?page=3', 'rel': 'last'}
+        }
+
+        def fake_get(
+            api_handler, url, subscription, method, payload, max_req_attempts
+        ) -> Union[ParsedResponse, None]:
+            page_num: int = payload.get('page', 1)
+            if page_num == 2:
+                return None
+            links: dict[str, Any] = first_links if page_num == 1 else {}
+            return ParsedResponse(MagicMock(spec=Response, ok=True, links=links), self.canvas_potions_val_subs)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.side_effect = fake_get
+            sub_dicts: list[dict[str, Any]] = some_orca.get_sub_dicts_for_exam(2, page_workers=2)
+
+        # The request for page 3 is cancelled if it has not started by the time page 2 fails
+        self.assertIn(mock_retry_func.call_count, (2, 3))
+        self.assertEqual(sub_dicts, self.canvas_potions_val_subs)
+
+    def test_iter_remaining_pages_requests_only_a_window_of_pages_ahead(self):
+        """
+        iter_remaining_pages requests at most page_workers pages beyond those already yielded,
+        and pages not yet requested are never fetched if the caller stops early.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        get_subs_url, canvas_params = some_orca.get_canvas_subs_request(1)
+
+        def fake_get(api_handler, url, subscription, method, payload, max_req_attempts) -> ParsedResponse:
+            return ParsedResponse(MagicMock(spec=Response, ok=True, links={}), self.canvas_potions_val_subs)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.side_effect = fake_get
+            pages: Iterator[list[dict[str, Any]]] = some_orca.iter_remaining_pages(
+                get_subs_url, canvas_params, 10, page_workers=2
+            )
+            self.assertEqual(next(pages), self.canvas_potions_val_subs)
+            # Gives the workers time to fetch ahead while the first page is processed
+            time.sleep(0.2)
+            pages.close()
+
+        # Page 2 was yielded, page 3 was outstanding, and page 4 was requested as page 2 was yielded
+        self.assertLessEqual(mock_retry_func.call_count, 3)
+        requested_page_nums: list[int] = [call.args[4]['page'] for call in mock_retry_func.call_args_list]
+        self.assertEqual(sorted(requested_page_nums), list(range(2, 2 + mock_retry_func.call_count)))
+
     def test_get_sub_dicts_for_exam_discards_subs_with_null_scores(self):
         """
         get_sub_dicts_for_exam discards a Canvas submission without a score and keeps another submission with a score.
@@ -144,8 +288,8 @@ class ScoresOrchestrationTestCase(TestCase):
         some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
 
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
-            mock_retry_func.return_value = MagicMock(
-                spec=Response, ok=True, links={}, text=json.dumps(self.canvas_dada_place_subs_two)
+            mock_retry_func.return_value = ParsedResponse(
+                MagicMock(spec=Response, ok=True, links={}), self.canvas_dada_place_subs_two
             )
             with self.assertLogs(level='INFO') as cm:
                 sub_dicts: list[dict[str, Any]] = some_orca.get_sub_dicts_for_exam()
@@ -155,13 +299,58 @@ class ScoresOrchestrationTestCase(TestCase):
         sub_dict: dict[str, Any] = sub_dicts[0]
         self.assertEqual((sub_dict['id'], sub_dict['score'], sub_dict['user']['login_id']), (888889, 600.0, 'hpotter'))
 
+    def test_iter_sub_dict_pages_with_slim_subs_keeps_only_used_fields(self):
+        """
+        iter_sub_dict_pages with slim_subs reduces submission dictionaries from serial and concurrent pages
+        to the fields used by create_sub_records, which creates the same records from them.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        first_links: dict[str, Any] = {
+            'last': {'url': f'https://some-api.umich.edu/{CANVAS_URL_BEGIN}/courses/888888?page=2', 'rel': 'last'}
+        }
+
+        def fake_get(api_handler, url, subscription, method, payload, max_req_attempts) -> ParsedResponse:
+            page_num: int = payload.get('page', 1)
+            links: dict[str, Any] = first_links if page_num == 1 else {}
+            page_subs: list[dict[str, Any]] = self.canvas_potions_val_subs[page_num - 1:page_num]
+            return ParsedResponse(MagicMock(spec=Response, ok=True, links=links), page_subs)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.side_effect = fake_get
+            pages: list[list[dict[str, Any]]] = list(some_orca.iter_sub_dict_pages(page_workers=2, slim_subs=True))
+
+        self.assertEqual(len(pages), 2)
+        sub_dicts: list[dict[str, Any]] = pages[0] + pages[1]
+        for sub_dict, canvas_sub_dict in zip(sub_dicts, self.canvas_potions_val_subs):
+            self.assertEqual(
+                sub_dict,
+                {
+                    'id': canvas_sub_dict['id'],
+                    'attempt': canvas_sub_dict['attempt'],
+                    'submitted_at': canvas_sub_dict['submitted_at'],
+                    'graded_at': canvas_sub_dict['graded_at'],
+                    'score': canvas_sub_dict['score'],
+                    'user': {'login_id': canvas_sub_dict['user']['login_id']}
+                }
+            )
+
+        some_orca.create_sub_records(to_sub_records(sub_dicts))
+        self.assertEqual(
+            list(
+                some_orca.exam.submissions.filter(submission_id__in=[444444, 444445])
+                .order_by('submission_id').values_list('submission_id', 'student_uniqname', 'score')
+            ),
+            [(444444, 'hpotter', 125.0), (444445, 'cchang', 200.0)]
+        )
+
     def test_create_sub_records(self):
         """
         create_sub_records parses Canvas submission dictionaries and creates records in the database.
         """
         potions_val_exam = Exam.objects.get(id=2)
         some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
-        some_orca.create_sub_records(self.canvas_potions_val_subs)
+        some_orca.create_sub_records(to_sub_records(self.canvas_potions_val_subs))
 
         new_potions_val_sub_qs: QuerySet = some_orca.exam.submissions.filter(submission_id__in=[444444, 444445])
         self.assertEqual(len(new_potions_val_sub_qs), 2)
@@ -192,6 +381,33 @@ class ScoresOrchestrationTestCase(TestCase):
             }
         )
 
+    def test_create_sub_records_advances_sync_cursor(self):
+        """
+        create_sub_records records the latest graded_timestamp of the new submissions in the exam's sync cursor.
+        """
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+        some_orca.create_sub_records(
+            to_sub_records(self.canvas_dada_place_subs_one + self.canvas_dada_place_subs_two[:1])
+        )
+
+        cursor: ExamSyncCursor = ExamSyncCursor.objects.get(exam_id=3)
+        self.assertEqual(cursor.last_graded_timestamp, datetime(2020, 7, 9, 10, 15, 0, tzinfo=utc))
+        self.assertIsNone(cursor.last_page_url)
+
+    def test_create_sub_records_leaves_sync_cursor_when_insert_fails(self):
+        """
+        create_sub_records does not create or advance the sync cursor when the inserts fail.
+        """
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+        # The same Canvas submission twice violates unique_canvas_submission
+        with self.assertLogs(level='ERROR'):
+            some_orca.create_sub_records(to_sub_records(self.canvas_dada_place_subs_one * 2), conflict_mode='error')
+
+        self.assertFalse(ExamSyncCursor.objects.filter(exam_id=3).exists())
+        self.assertEqual(len(dada_place_exam.submissions.all()), 0)
+
     def test_create_sub_records_with_null_submitted_timestamp_and_attempt_num(self):
         """
         create_sub_records stores submissions when submitted_timestamp and attempt_num are not provided.
@@ -199,7 +415,7 @@ class ScoresOrchestrationTestCase(TestCase):
         """
         dada_place_exam: Exam = Exam.objects.get(id=3)
         some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
-        some_orca.create_sub_records(self.canvas_dada_place_subs_one)
+        some_orca.create_sub_records(to_sub_records(self.canvas_dada_place_subs_one))
 
         new_dada_place_sub_qs: QuerySet = some_orca.exam.submissions.filter(submission_id=888888)
         self.assertEqual(len(new_dada_place_sub_qs), 1)
@@ -222,12 +438,261 @@ class ScoresOrchestrationTestCase(TestCase):
         """create_sub_records strips leading and trailing whitespace characters from Canvas login_ids."""
         potions_place_exam: Exam = Exam.objects.get(id=1)
         some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_place_exam)
-        some_orca.create_sub_records(self.canvas_potions_place_subs_three)
+        some_orca.create_sub_records(to_sub_records(self.canvas_potions_place_subs_three))
 
         latest_two_subs: list[Submission] = list(Submission.objects.filter(exam=potions_place_exam).order_by('-id'))[:2]
         uniqnames: list[str] = [sub.student_uniqname for sub in latest_two_subs]
         self.assertEqual(uniqnames, ['visitor_two@magicking.edu', 'visitor_one@magicking.edu'])
 
+    @skipUnlessDBFeature('supports_ignore_conflicts')
+    def test_create_sub_records_skips_stored_subs_when_ignoring_conflicts(self):
+        """
+        create_sub_records inserts new submissions, skips those already stored, and logs both counts.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        some_orca.create_sub_records(to_sub_records(self.canvas_potions_val_subs[:1]))
+
+        with self.assertLogs(level='INFO') as cm:
+            some_orca.create_sub_records(to_sub_records(self.canvas_potions_val_subs), conflict_mode='ignore')
+
+        self.assertTrue('INFO:pe.orchestration:Inserted 1 new Submission record(s) in the database' in cm.output)
+        self.assertTrue('INFO:pe.orchestration:Skipped 1 Canvas submission(s) already in the database' in cm.output)
+        self.assertEqual(len(some_orca.exam.submissions.filter(submission_id__in=[444444, 444445])), 2)
+
+    @skipUnlessDBFeature('supports_update_conflicts')
+    def test_create_sub_records_updates_stored_subs_when_updating_conflicts(self):
+        """
+        create_sub_records overwrites the Canvas values of submissions already stored without changing
+        their transmission state.
+        """
+        potions_place_exam: Exam = Exam.objects.get(id=1)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_place_exam)
+        # Same submission_id and graded_at as the transmitted hgranger submission in test_04.json
+        regraded_sub_dict: dict[str, Any] = {
+            'id': 123457,
+            'attempt': 2,
+            'user': {'login_id': 'hgranger'},
+            'submitted_at': '2020-06-12T06:07:45Z',
+            'graded_at': '2020-06-12T09:35:00Z',
+            'score': 310.0
+        }
+
+        with self.assertLogs(level='INFO') as cm:
+            some_orca.create_sub_records(to_sub_records([regraded_sub_dict]), conflict_mode='update')
+
+        self.assertTrue('INFO:pe.orchestration:Inserted 0 new Submission record(s) in the database' in cm.output)
+        self.assertTrue('INFO:pe.orchestration:Updated 1 Canvas submission(s) already in the database' in cm.output)
+        updated_sub: Submission = Submission.objects.get(submission_id=123457)
+        self.assertEqual((updated_sub.attempt_num, updated_sub.score, updated_sub.transmitted), (2, 310.0, True))
+        self.assertEqual(len(Submission.objects.filter(submission_id=123457)), 1)
+
+    @skipUnlessDBFeature('supports_ignore_conflicts')
+    def test_insert_sub_batch_counts_new_subs_from_stored_keys(self):
+        """
+        insert_sub_batch counts new records by looking up which of the batch's keys are already stored,
+        without counting the exam's submissions.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        sub_records: list[SubmissionRecord] = to_sub_records(self.canvas_potions_val_subs)
+        some_orca.insert_sub_batch(sub_records[:1], conflict_mode='ignore')
+
+        with CaptureQueriesContext(connection) as queries:
+            num_inserted: int = some_orca.insert_sub_batch(sub_records, conflict_mode='ignore')
+
+        self.assertEqual(num_inserted, 1)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(len(some_orca.exam.submissions.filter(submission_id__in=[444444, 444445])), 2)
+
+    def test_insert_sub_batch_with_unknown_conflict_mode(self):
+        """insert_sub_batch raises a ValueError for an unknown conflict mode before inserting anything."""
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        with self.assertRaises(ValueError):
+            some_orca.insert_sub_batch(to_sub_records(self.canvas_potions_val_subs), conflict_mode='overwrite')
+        self.assertEqual(len(some_orca.exam.submissions.filter(submission_id__in=[444444, 444445])), 0)
+
+    def test_stream_sub_records_inserts_batches_and_logs_counts(self):
+        """
+        stream_sub_records discards submissions without scores, inserts the rest in batches as pages arrive,
+        and logs the same counts as get_sub_dicts_for_exam and create_sub_records.
+        No transaction is held open while pages are fetched.
+        """
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+
+        next_links: dict[str, Any] = {
+            'next': {'url': f'https://some-api.umich.edu/{CANVAS_URL_BEGIN}/courses/999999?page=2', 'rel': 'next'}
+        }
+        mocks: list[ParsedResponse] = [
+            ParsedResponse(MagicMock(spec=Response, ok=True, links=next_links), self.canvas_dada_place_subs_two),
+            ParsedResponse(MagicMock(spec=Response, ok=True, links={}), self.canvas_dada_place_subs_one)
+        ]
+
+        # Depth of the atomic blocks open when each page is requested
+        fetch_atomic_depths: list[int] = []
+
+        def fake_get(*args) -> ParsedResponse:
+            fetch_atomic_depths.append(len(connection.atomic_blocks))
+            return mocks.pop(0)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.side_effect = fake_get
+            with self.assertLogs(level='INFO') as cm:
+                some_orca.stream_sub_records(batch_size=1)
+
+        self.assertEqual(mock_retry_func.call_count, 2)
+        # Pages are fetched outside the transactions that insert batches
+        self.assertEqual(fetch_atomic_depths, [len(connection.atomic_blocks)] * 2)
+        self.assertTrue('INFO:pe.orchestration:Discarded 1 Canvas submission(s) with no score(s)' in cm.output)
+        self.assertTrue('INFO:pe.orchestration:Gathered 2 submission(s) from Canvas' in cm.output)
+        self.assertTrue('INFO:pe.orchestration:Inserted 2 new Submission record(s) in the database' in cm.output)
+
+        uniqnames: list[tuple[str]] = list(
+            some_orca.exam.submissions.order_by('submission_id').values_list('student_uniqname')
+        )
+        self.assertEqual(uniqnames, [('nlongbottom',), ('hpotter',)])
+        # The pages are not in graded order; the cursor moves to the latest graded_timestamp of all of them
+        cursor: ExamSyncCursor = ExamSyncCursor.objects.get(exam_id=3)
+        self.assertEqual(cursor.last_graded_timestamp, datetime(2020, 7, 9, 10, 15, 0, tzinfo=utc))
+        self.assertIsNone(cursor.last_page_url)
+
+    def test_stream_sub_records_keeps_resume_page_url_when_fetch_interrupted(self):
+        """
+        stream_sub_records stores the submissions it received and records the URL of the page
+        that could not be fetched in the exam's sync cursor, without advancing the cursor's graded_timestamp,
+        since the remaining pages may hold submissions graded earlier.
+        """
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+        start_filter: datetime = some_orca.sub_time_filter
+
+        next_page_params: dict[str, Any] = {'page': 'bookmark:abc', 'per_page': 50}
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            with patch.object(ApiUtil, 'get_next_page', autospec=True) as mock_next_page:
+                mock_retry_func.side_effect = [
+                    ParsedResponse(MagicMock(spec=Response, ok=True, links={}), self.canvas_dada_place_subs_two),
+                    None
+                ]
+                mock_next_page.return_value = next_page_params
+                some_orca.stream_sub_records()
+
+        cursor: ExamSyncCursor = ExamSyncCursor.objects.get(exam_id=3)
+        self.assertEqual(dada_place_exam.submissions.count(), 1)
+        self.assertEqual(cursor.last_graded_timestamp, start_filter - timedelta(seconds=1))
+        self.assertEqual(ScoresOrchestration(self.api_handler, dada_place_exam).sub_time_filter, start_filter)
+        self.assertEqual(
+            cursor.last_page_url,
+            f'{CANVAS_URL_BEGIN}/courses/999999/students/submissions?page=bookmark%3Aabc&per_page=50'
+        )
+        self.assertEqual(some_orca.resume_page_url, cursor.last_page_url)
+
+    def test_stream_sub_records_keeps_committed_batches_when_batch_fails(self):
+        """
+        stream_sub_records stops when one of its batches fails to insert, keeping the batches committed before it
+        but leaving the sync cursor's graded_timestamp where it was, so the next run fetches the failed batch again.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        start_filter: datetime = some_orca.sub_time_filter
+        num_subs_before: int = Submission.objects.count()
+
+        real_insert_sub_batch = ScoresOrchestration.insert_sub_batch
+
+        def insert_then_fail(orca: ScoresOrchestration, sub_dicts: list[dict[str, Any]], *args) -> int:
+            # The first batch is really inserted; the second fails as a constraint violation would
+            if mock_insert.call_count > 1:
+                raise Exception('Duplicate entry')
+            return real_insert_sub_batch(orca, sub_dicts, *args)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            with patch.object(ScoresOrchestration, 'insert_sub_batch', autospec=True) as mock_insert:
+                mock_retry_func.return_value = ParsedResponse(
+                    MagicMock(spec=Response, ok=True, links={}), self.canvas_potions_val_subs
+                )
+                mock_insert.side_effect = insert_then_fail
+                with self.assertLogs(level='INFO') as cm:
+                    some_orca.stream_sub_records(batch_size=1)
+
+        self.assertEqual(mock_insert.call_count, 2)
+        self.assertTrue('ERROR:pe.orchestration:Submissions bulk creation failed' in cm.output)
+        self.assertTrue('INFO:pe.orchestration:Inserted 1 new Submission record(s) in the database' in cm.output)
+        self.assertEqual(Submission.objects.count(), num_subs_before + 1)
+        self.assertTrue(some_orca.exam.submissions.filter(submission_id=444444).exists())
+        self.assertEqual(ScoresOrchestration(self.api_handler, potions_val_exam).sub_time_filter, start_filter)
+
+    @skipUnlessDBFeature('supports_ignore_conflicts')
+    def test_stream_sub_records_skips_stored_subs_when_ignoring_conflicts(self):
+        """
+        stream_sub_records keeps inserting batches after a batch with already-stored submissions,
+        counting only new records as inserted.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        some_orca.create_sub_records(to_sub_records(self.canvas_potions_val_subs[:1]))
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.return_value = ParsedResponse(
+                MagicMock(spec=Response, ok=True, links={}), self.canvas_potions_val_subs
+            )
+            with self.assertLogs(level='INFO') as cm:
+                some_orca.stream_sub_records(batch_size=1, conflict_mode='ignore')
+
+        self.assertTrue('INFO:pe.orchestration:Inserted 1 new Submission record(s) in the database' in cm.output)
+        self.assertTrue('INFO:pe.orchestration:Skipped 1 Canvas submission(s) already in the database' in cm.output)
+        self.assertEqual(len(some_orca.exam.submissions.filter(submission_id__in=[444444, 444445])), 2)
+
+    def get_malformed_potions_val_subs(self) -> list[dict[str, Any]]:
+        """
+        Returns the Potions Validation submissions followed by copies missing user.login_id or graded_at.
+        """
+        no_login_sub: dict[str, Any] = {**self.canvas_potions_val_subs[0], 'id': 444446, 'user': {}}
+        no_graded_sub: dict[str, Any] = {**self.canvas_potions_val_subs[1], 'id': 444447, 'graded_at': None}
+        return self.canvas_potions_val_subs + [no_login_sub, no_graded_sub]
+
+    def test_stream_sub_records_skips_malformed_subs(self):
+        """
+        stream_sub_records skips Canvas submissions that cannot be converted, with a warning, and stores the rest.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.return_value = ParsedResponse(
+                MagicMock(spec=Response, ok=True, links={}), self.get_malformed_potions_val_subs()
+            )
+            with self.assertLogs(level='INFO') as cm:
+                some_orca.stream_sub_records()
+
+        self.assertEqual(len([line for line in cm.output if 'Skipped malformed Canvas submission' in line]), 2)
+        self.assertTrue(any(line.startswith('WARNING:pe.orchestration:Skipped malformed Canvas submission 444446')
+                            for line in cm.output))
+        self.assertTrue('INFO:pe.orchestration:Inserted 2 new Submission record(s) in the database' in cm.output)
+        new_sub_ids: list[int] = list(
+            some_orca.exam.submissions.filter(submission_id__gt=444443)
+            .order_by('submission_id').values_list('submission_id', flat=True)
+        )
+        self.assertEqual(new_sub_ids, [444444, 444445])
+
+    def test_get_sub_records_for_exam_skips_malformed_subs(self):
+        """
+        get_sub_records_for_exam skips Canvas submissions that cannot be converted, with a warning.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_retry_func:
+            mock_retry_func.return_value = ParsedResponse(
+                MagicMock(spec=Response, ok=True, links={}), self.get_malformed_potions_val_subs()
+            )
+            with self.assertLogs(level='WARNING') as cm:
+                sub_records: list[SubmissionRecord] = some_orca.get_sub_records_for_exam()
+
+        self.assertEqual(len(cm.output), 2)
+        self.assertEqual([sub_record.submission_id for sub_record in sub_records], [444444, 444445])
+
     def test_send_scores_when_successful(self):
         """
         send_scores properly transmits data to M-Pathways API and updates all submission records.
@@ -265,6 +730,27 @@ class ScoresOrchestrationTestCase(TestCase):
         # with the same uniqname (rweasley) was not updated.
         self.assertFalse(Submission.objects.get(submission_id=123458).transmitted)
 
+    def test_send_scores_does_not_query_exam_per_submission(self):
+        """
+        send_scores does not load the exam for each submission, even when the submissions were loaded
+        without the related exam cached.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        # Loaded through the manager rather than exam.submissions, so sub.exam is not cached
+        val_subs: list[Submission] = list(Submission.objects.filter(exam_id=2, transmitted=False))
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_api_call:
+            mock_api_call.return_value = MagicMock(
+                spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[0])
+            )
+            with CaptureQueriesContext(connection) as captured:
+                some_orca.send_scores(val_subs)
+
+        exam_queries: list[str] = [query['sql'] for query in captured.captured_queries if 'pe_exam' in query['sql']]
+        self.assertEqual(exam_queries, [])
+        self.assertEqual(len(Submission.objects.filter(exam=potions_val_exam, transmitted=True)), 2)
+
     def test_send_scores_when_mix_of_success_and_error(self):
         """
         send_scores updates exam-specific records with transmitted as True and timestamp only when successful.
@@ -315,6 +801,168 @@ class ScoresOrchestrationTestCase(TestCase):
         untransmitted_qs: QuerySet = some_orca.exam.submissions.filter(transmitted=False)
         self.assertEqual(len(untransmitted_qs), 2)
 
+    def test_send_scores_records_completed_score_batch(self):
+        """
+        send_scores records a ScoreBatch for the request with the submissions, payload hash, and response,
+        and marks it completed along with the submission updates.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        val_subs: list[Submission] = list(some_orca.exam.submissions.filter(transmitted=False))
+        resp_text: str = json.dumps(self.mpathways_resp_data[0])
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+            mock_send.return_value = MagicMock(spec=Response, status_code=200, text=resp_text)
+            some_orca.send_scores(val_subs)
+
+        json_payload: str = mock_send.call_args.kwargs['payload']
+        score_batch: ScoreBatch = ScoreBatch.objects.get(exam=potions_val_exam)
+        self.assertEqual(score_batch.state, ScoreBatch.State.COMPLETED)
+        self.assertEqual(score_batch.payload_hash, hashlib.sha256(json_payload.encode('utf-8')).hexdigest())
+        self.assertEqual(score_batch.response_text, resp_text)
+        self.assertEqual(set(score_batch.submissions.all()), set(val_subs))
+
+    def test_send_scores_records_failed_score_batch_when_not_successful(self):
+        """send_scores marks its ScoreBatch as failed when M-Pathways returns an error."""
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        val_subs: list[Submission] = list(some_orca.exam.submissions.filter(transmitted=False))
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+            mock_send.return_value = MagicMock(spec=Response, status_code=404, text=json.dumps({}))
+            some_orca.send_scores(val_subs)
+
+        score_batch: ScoreBatch = ScoreBatch.objects.get(exam=potions_val_exam)
+        self.assertEqual(score_batch.state, ScoreBatch.State.FAILED)
+        self.assertIsNone(score_batch.response_text)
+
+    def test_send_scores_records_failed_score_batch_when_response_body_is_malformed(self):
+        """
+        send_scores marks its ScoreBatch as failed, not received, when M-Pathways returns a 200 response
+        whose body is not in the expected format, and a later reconcile_score_batches is unaffected.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        val_subs: list[Submission] = list(some_orca.exam.submissions.filter(transmitted=False))
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+            mock_send.return_value = MagicMock(spec=Response, status_code=200, text=json.dumps({'unexpected': {}}))
+            with self.assertLogs(level='ERROR'):
+                success_uniqnames, _ = some_orca.send_scores(val_subs)
+
+        self.assertIsNone(success_uniqnames)
+        score_batch: ScoreBatch = ScoreBatch.objects.get(exam=potions_val_exam)
+        self.assertEqual(score_batch.state, ScoreBatch.State.FAILED)
+        self.assertIsNone(score_batch.response_text)
+        self.assertEqual(len(some_orca.exam.submissions.filter(transmitted=False)), 2)
+        reconcile_score_batches()
+
+    def test_reconcile_score_batches_fails_batch_with_malformed_stored_response(self):
+        """
+        reconcile_score_batches marks a received ScoreBatch whose stored response cannot be read as failed
+        and goes on to the other batches instead of raising.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        val_subs: list[Submission] = list(potions_val_exam.submissions.filter(transmitted=False))
+        bad_batch: ScoreBatch = ScoreBatch.objects.create(
+            exam=potions_val_exam, payload_hash='0' * 64, state=ScoreBatch.State.RECEIVED, response_text='{"a": 1}'
+        )
+        good_batch: ScoreBatch = ScoreBatch.objects.create(
+            exam=potions_val_exam, payload_hash='1' * 64, state=ScoreBatch.State.RECEIVED,
+            response_text=json.dumps(self.mpathways_resp_data[0])
+        )
+        good_batch.submissions.add(*val_subs)
+
+        with self.assertLogs(level='ERROR') as cm:
+            reconcile_score_batches()
+
+        self.assertTrue(any(f'score batch {bad_batch.id} could not be read' in line for line in cm.output))
+        bad_batch.refresh_from_db()
+        good_batch.refresh_from_db()
+        self.assertEqual(bad_batch.state, ScoreBatch.State.FAILED)
+        self.assertEqual(good_batch.state, ScoreBatch.State.COMPLETED)
+        self.assertEqual(len(potions_val_exam.submissions.filter(transmitted=False)), 0)
+
+    def test_reconcile_score_batches_applies_stored_response(self):
+        """
+        reconcile_score_batches completes a ScoreBatch whose response was stored before the submission updates failed,
+        without sending the scores again.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        val_subs: list[Submission] = list(some_orca.exam.submissions.filter(transmitted=False))
+
+        with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+            mock_send.return_value = MagicMock(
+                spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[0])
+            )
+            # Simulates the run ending after the response arrived but before the submissions were updated
+            with patch('pe.orchestration.complete_score_batch', autospec=True) as mock_complete:
+                mock_complete.side_effect = Exception('Lost connection to MySQL server')
+                with self.assertRaises(Exception):
+                    some_orca.send_scores(val_subs)
+
+            score_batch: ScoreBatch = ScoreBatch.objects.get(exam=potions_val_exam)
+            self.assertEqual(score_batch.state, ScoreBatch.State.RECEIVED)
+            self.assertEqual(len(some_orca.exam.submissions.filter(transmitted=False)), 2)
+
+            reconcile_score_batches()
+
+        self.assertEqual(mock_send.call_count, 1)
+        score_batch.refresh_from_db()
+        self.assertEqual(score_batch.state, ScoreBatch.State.COMPLETED)
+        self.assertEqual(len(some_orca.exam.submissions.filter(transmitted=False)), 0)
+
+    def test_reconcile_score_batches_abandons_pending_batches(self):
+        """
+        reconcile_score_batches marks ScoreBatches without a recorded response as abandoned,
+        leaving their submissions to be sent again.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        score_batch: ScoreBatch = ScoreBatch.objects.create(exam=potions_val_exam, payload_hash='0' * 64)
+        score_batch.submissions.add(*potions_val_exam.submissions.filter(transmitted=False))
+
+        with self.assertLogs(level='WARNING') as cm:
+            reconcile_score_batches()
+
+        self.assertTrue(
+            'WARNING:pe.orchestration:Found 1 score batch(es) with no recorded response; ' +
+            'un-transmitted scores will be re-sent' in cm.output
+        )
+        score_batch.refresh_from_db()
+        self.assertEqual(score_batch.state, ScoreBatch.State.ABANDONED)
+        self.assertEqual(len(potions_val_exam.submissions.filter(transmitted=False)), 2)
+
+    def test_reconcile_score_batches_prunes_unsent_and_old_batches(self):
+        """
+        reconcile_score_batches removes submission links from failed batches and deletes batches in a final state
+        older than the retention period, leaving recent completed batches alone.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        val_subs: list[Submission] = list(potions_val_exam.submissions.filter(transmitted=False))
+        batches: dict[str, ScoreBatch] = {}
+        for name, state in [
+            ('failed', ScoreBatch.State.FAILED),
+            ('recent', ScoreBatch.State.COMPLETED),
+            ('old', ScoreBatch.State.COMPLETED)
+        ]:
+            batches[name] = ScoreBatch.objects.create(
+                exam=potions_val_exam, payload_hash='0' * 64, state=state, response_text=json.dumps({})
+            )
+            batches[name].submissions.add(*val_subs)
+        ScoreBatch.objects.filter(id=batches['old'].id).update(
+            updated_timestamp=datetime.now(tz=utc) - timedelta(days=31)
+        )
+
+        with patch('pe.orchestration.SCORE_BATCH_RETENTION_DAYS', 30):
+            reconcile_score_batches()
+
+        self.assertEqual(batches['failed'].submissions.count(), 0)
+        self.assertEqual(set(batches['recent'].submissions.all()), set(val_subs))
+        self.assertFalse(ScoreBatch.objects.filter(id=batches['old'].id).exists())
+        self.assertEqual(ScoreBatch.submissions.through.objects.filter(scorebatch_id=batches['old'].id).count(), 0)
+        self.assertEqual(len(potions_val_exam.submissions.filter(transmitted=False)), 2)
+
     def test_main(self):
         """main process method handles both previously un-transmitted and new submissions."""
         potions_val_exam: Exam = Exam.objects.get(id=2)
@@ -338,8 +986,8 @@ class ScoresOrchestrationTestCase(TestCase):
 
         with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
             with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
-                mock_get.return_value = MagicMock(
-                    spec=Response, status_code=200, text=json.dumps(self.canvas_potions_val_subs)
+                mock_get.return_value = ParsedResponse(
+                    MagicMock(spec=Response, status_code=200), self.canvas_potions_val_subs
                 )
                 mock_send.return_value = MagicMock(
                     spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[2])
@@ -362,6 +1010,286 @@ class ScoresOrchestrationTestCase(TestCase):
         self.assertEqual(len(brand_new_subs), 2)
         self.assertEqual([sub.student_uniqname for sub in brand_new_subs], ['cchang', 'hpotter'])
 
+    def test_main_with_adaptive_batching(self):
+        """
+        main sends regular submissions through an AdaptiveBatcher, shrinking the batch after a failed request,
+        growing it after a fast success, and recording the size and outcome of each batch.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                with patch.multiple('pe.orchestration', SCORE_BATCH_MIN_SIZE=1, SCORE_BATCH_MAX_SIZE=2):
+                    mock_get.return_value = ParsedResponse(
+                        MagicMock(spec=Response, status_code=200), self.canvas_potions_val_subs
+                    )
+                    mock_send.side_effect = [
+                        MagicMock(spec=Response, status_code=504, text=json.dumps({})),
+                        MagicMock(spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[2])),
+                        MagicMock(spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[2]))
+                    ]
+                    some_orca.main(adaptive_batching=True)
+
+        # Two un-transmitted subs from test_04.json and two new subs from Canvas; the first batch of two fails.
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertEqual(
+            [(record.size, record.success) for record in some_orca.score_batcher.history],
+            [(2, False), (1, True), (1, True)]
+        )
+        self.assertEqual(some_orca.score_batcher.batch_size, 2)
+        self.assertEqual(len(some_orca.exam.submissions.filter(transmitted=False)), 2)
+
+    def test_send_scores_adaptively_records_request_latency_only(self):
+        """
+        send_scores_adaptively records the latency of each M-Pathways request as timed by send_scores,
+        which leaves out the wait for the rate limit.
+        """
+        potions_val_exam: Exam = Exam.objects.get(id=2)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_val_exam)
+        val_subs: list[SubmissionRecord] = SubmissionRecord.load(some_orca.exam.submissions.filter(transmitted=False))
+
+        with patch('pe.orchestration.wait_for_rate_limit', autospec=True) as mock_wait:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                # A long wait for the rate limit before the request
+                mock_wait.side_effect = lambda subscription: time.sleep(0.5) or 0.5
+                mock_send.return_value = MagicMock(
+                    spec=Response, status_code=200, text=json.dumps(self.mpathways_resp_data[0])
+                )
+                some_orca.send_scores_adaptively(val_subs)
+
+        mock_wait.assert_called_once_with(MPATHWAYS_SCOPE)
+        self.assertEqual(len(some_orca.score_batcher.history), 1)
+        self.assertTrue(some_orca.score_batcher.history[0].success)
+        self.assertLess(some_orca.score_batcher.history[0].latency, 0.5)
+
+    def test_classify_subs_to_transmit(self):
+        """classify_subs_to_transmit separates redo, duplicate-uniqname, and regular submissions."""
+        potions_place_exam: Exam = Exam.objects.get(id=1)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, potions_place_exam)
+        some_orca.create_sub_records(to_sub_records(self.dup_get_mocks[0].data))
+        subs_to_transmit: list[Submission] = list(some_orca.exam.submissions.filter(transmitted=False).order_by('id'))
+
+        redo_subs, dup_uniqname_subs, regular_subs = ScoresOrchestration.classify_subs_to_transmit(
+            subs_to_transmit, some_orca.sub_time_filter
+        )
+
+        # rweasley's submission from test_04.json is the only one graded before the filter
+        self.assertEqual([sub.submission_id for sub in redo_subs], [123458])
+        self.assertEqual(len(dup_uniqname_subs), 0)
+        self.assertEqual([sub.student_uniqname for sub in regular_subs], ['rweasley', 'hgranger'])
+
+        hgranger_sub: Submission = Submission(
+            submission_id=123499, exam=potions_place_exam, student_uniqname='hgranger', score=100.0,
+            graded_timestamp=datetime(2020, 6, 30, 0, 0, 0, tzinfo=utc), transmitted=False
+        )
+        redo_subs, dup_uniqname_subs, regular_subs = ScoresOrchestration.classify_subs_to_transmit(
+            subs_to_transmit + [hgranger_sub], some_orca.sub_time_filter
+        )
+        self.assertEqual([sub.student_uniqname for sub in dup_uniqname_subs], ['hgranger', 'hgranger'])
+        self.assertEqual([sub.student_uniqname for sub in regular_subs], ['rweasley'])
+
+    def test_classify_subs_to_transmit_reads_each_uniqname_once(self):
+        """
+        classify_subs_to_transmit handles many pending submissions, many with duplicate uniqnames, in a single pass,
+        reading each submission's uniqname once (comparing each submission with the others would read it
+        once for every other submission).
+        """
+        sub_time_filter: datetime = datetime(2020, 6, 15, 0, 0, 0, tzinfo=utc)
+        num_uniqname_reads: int = 0
+
+        class CountingSub:
+            def __init__(self, uniqname: str, graded_dt: datetime):
+                self.uniqname: str = uniqname
+                self.graded_timestamp: datetime = graded_dt
+
+            @property
+            def student_uniqname(self) -> str:
+                nonlocal num_uniqname_reads
+                num_uniqname_reads += 1
+                return self.uniqname
+
+        # Every third uniqname is shared by two submissions; half of the submissions are redos.
+        subs: list[CountingSub] = [
+            CountingSub(
+                f'student{i - 1 if i % 3 == 1 else i}', datetime(2020, 6, 10 + (i % 2) * 10, 0, 0, 0, tzinfo=utc)
+            )
+            for i in range(3000)
+        ]
+
+        redo_subs, dup_uniqname_subs, regular_subs = ScoresOrchestration.classify_subs_to_transmit(
+            subs, sub_time_filter
+        )
+        self.assertEqual(num_uniqname_reads, 3000)
+        self.assertEqual(len(redo_subs), 1500)
+        self.assertEqual(len(dup_uniqname_subs) + len(regular_subs), 3000)
+        self.assertEqual(len(dup_uniqname_subs), 2 * 1000)
+
+    def test_submission_records_load_without_model_instances_and_use_less_memory(self):
+        """
+        Loading pending submissions as SubmissionRecords with values_list takes one query and creates
+        no Submission model instances, the records take less memory than instances, as were loaded before,
+        and they are classified the same way.
+        """
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+        graded_dt: datetime = datetime(2020, 7, 1, 0, 0, 0, tzinfo=utc)
+        Submission.objects.bulk_create([
+            Submission(
+                submission_id=1000000 + i, attempt_num=1, exam=dada_place_exam, student_uniqname=f'student{i // 2}',
+                submitted_timestamp=graded_dt, graded_timestamp=graded_dt + timedelta(seconds=i), score=100.0,
+                transmitted=False
+            )
+            for i in range(2000)
+        ])
+        sub_qs: QuerySet = some_orca.exam.submissions.filter(transmitted=False).order_by('id')
+
+        num_instances: int = 0
+
+        def count_instance(**kwargs) -> None:
+            nonlocal num_instances
+            num_instances += 1
+
+        post_init.connect(count_instance, sender=Submission)
+        try:
+            with self.assertNumQueries(1):
+                sub_records: list[SubmissionRecord] = SubmissionRecord.load(sub_qs.all())
+            self.assertEqual(num_instances, 0)
+            subs: list[Submission] = list(sub_qs.all())
+            self.assertEqual(num_instances, len(subs))
+        finally:
+            post_init.disconnect(count_instance, sender=Submission)
+        self.assertEqual(len(sub_records), len(subs))
+
+        # all() is used for a new QuerySet each time, so results are not cached between loads
+        def trace_load_memory(load_subs) -> int:
+            tracemalloc.start()
+            loaded_subs: list[Any] = load_subs(sub_qs.all())
+            memory: int = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            self.assertEqual(len(loaded_subs), len(subs))
+            return memory
+
+        self.assertLess(trace_load_memory(SubmissionRecord.load), trace_load_memory(list) / 2)
+
+        record_classes, instance_classes = (
+            ScoresOrchestration.classify_subs_to_transmit(loaded_subs, some_orca.sub_time_filter)
+            for loaded_subs in (sub_records, subs)
+        )
+        for record_class, instance_class in zip(record_classes, instance_classes):
+            self.assertEqual([sub.id for sub in record_class], [sub.id for sub in instance_class])
+
+    @staticmethod
+    def make_mpathways_resp_text(success_uniqnames: list[str], placement_type: str) -> str:
+        """Builds M-Pathways response text reporting success for the given uniqnames."""
+        success_dicts: list[dict[str, str]] = [
+            {'uniqname': uniqname, 'placementType': placement_type} for uniqname in success_uniqnames
+        ]
+        results: dict[str, Any] = {
+            'GoodCount': len(success_uniqnames),
+            # M-Pathways returns a single success as an object rather than a list
+            'Success': success_dicts[0] if len(success_dicts) == 1 else success_dicts,
+            'BadCount': 0,
+            'Errors': 'No errors found'
+        }
+        return json.dumps({'putPlcExamScoreResponse': {'putPlcExamScoreResponse': results}})
+
+    def create_dup_uniqname_subs(self, exam: Exam, uniqname_depths: dict[str, int]) -> None:
+        """Creates un-transmitted submissions for an exam, with the given number of submissions per uniqname."""
+        subs: list[Submission] = []
+        for uniqname, depth in uniqname_depths.items():
+            for k in range(depth):
+                subs.append(Submission(
+                    submission_id=900000 + len(subs),
+                    attempt_num=k + 1,
+                    exam=exam,
+                    student_uniqname=uniqname,
+                    submitted_timestamp=None,
+                    # Later submissions for each uniqname are created first to check graded order is used
+                    graded_timestamp=datetime(2020, 7, 2, 12, 0, 0, tzinfo=utc).replace(hour=12 + depth - k),
+                    score=float(100 * (depth - k)),
+                    transmitted=False
+                ))
+        Submission.objects.bulk_create(subs)
+
+    def test_group_subs_into_rounds(self):
+        """group_subs_into_rounds puts the k-th submission by graded_timestamp for each uniqname in round k."""
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        self.create_dup_uniqname_subs(dada_place_exam, {'hpotter': 2, 'hgranger': 3, 'rweasley': 2})
+        dup_subs: list[Submission] = list(dada_place_exam.submissions.all())
+
+        rounds: list[list[Submission]] = ScoresOrchestration.group_subs_into_rounds(dup_subs)
+
+        self.assertEqual(
+            [sorted(sub.student_uniqname for sub in round_subs) for round_subs in rounds],
+            [['hgranger', 'hpotter', 'rweasley'], ['hgranger', 'hpotter', 'rweasley'], ['hgranger']]
+        )
+        for round_subs in rounds:
+            self.assertEqual(len(round_subs), len(set(sub.student_uniqname for sub in round_subs)))
+        hgranger_dts: list[datetime] = [
+            sub.graded_timestamp for round_subs in rounds for sub in round_subs if sub.student_uniqname == 'hgranger'
+        ]
+        self.assertEqual(hgranger_dts, sorted(hgranger_dts))
+
+    def test_main_sends_dup_uniqname_subs_in_rounds(self):
+        """
+        main sends submissions with duplicate uniqnames with one request per round
+        instead of one request per submission.
+        """
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        self.create_dup_uniqname_subs(dada_place_exam, {'hpotter': 2, 'hgranger': 3, 'rweasley': 2})
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                mock_get.return_value = ParsedResponse(MagicMock(spec=Response, status_code=200), [])
+                mock_send.side_effect = [
+                    MagicMock(
+                        spec=Response, status_code=200,
+                        text=self.make_mpathways_resp_text(['hpotter', 'hgranger', 'rweasley'], 'DDP')
+                    ),
+                    MagicMock(
+                        spec=Response, status_code=200,
+                        text=self.make_mpathways_resp_text(['hpotter', 'hgranger', 'rweasley'], 'DDP')
+                    ),
+                    MagicMock(spec=Response, status_code=200, text=self.make_mpathways_resp_text(['hgranger'], 'DDP'))
+                ]
+                some_orca.main()
+
+        self.assertEqual(mock_send.call_count, 3)
+        sent_scores: list[list[dict[str, str]]] = [
+            json.loads(call.kwargs['payload'])['putPlcExamScore']['Student'] for call in mock_send.call_args_list
+        ]
+        # hgranger's scores are sent in graded order: 100.0 graded first, 300.0 graded last
+        hgranger_scores: list[str] = [
+            score['GradePoints'] for round_scores in sent_scores for score in round_scores if score['ID'] == 'hgranger'
+        ]
+        self.assertEqual(hgranger_scores, ['100.0', '200.0', '300.0'])
+        self.assertFalse(some_orca.exam.submissions.filter(transmitted=False).exists())
+
+    def test_main_holds_back_later_rounds_after_failure(self):
+        """main does not send a student's later submissions when an earlier one was not accepted in its round."""
+        dada_place_exam: Exam = Exam.objects.get(id=3)
+        self.create_dup_uniqname_subs(dada_place_exam, {'hpotter': 2, 'hgranger': 3})
+        some_orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, dada_place_exam)
+
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                mock_get.return_value = ParsedResponse(MagicMock(spec=Response, status_code=200), [])
+                mock_send.side_effect = [
+                    MagicMock(spec=Response, status_code=200, text=self.make_mpathways_resp_text(['hpotter'], 'DDP')),
+                    MagicMock(spec=Response, status_code=200, text=self.make_mpathways_resp_text(['hpotter'], 'DDP'))
+                ]
+                some_orca.main()
+
+        # Round three only has hgranger, who was held back after round one, so it is not sent.
+        self.assertEqual(mock_send.call_count, 2)
+        second_round_scores: list[dict[str, str]] = (
+            json.loads(mock_send.call_args_list[1].kwargs['payload'])['putPlcExamScore']['Student']
+        )
+        self.assertEqual([score['ID'] for score in second_round_scores], ['hpotter'])
+        self.assertEqual(len(some_orca.exam.submissions.filter(transmitted=False, student_uniqname='hgranger')), 3)
+
     def test_main_with_exam_scores_with_duplicate_uniqnames_sent_on_different_runs(self):
         """
         The main process pulls, stores, and sends scores with duplicate uniqnames on different runs.
@@ -1,15 +1,25 @@
 # standard libraries
-import logging
+import json, logging, os
 from datetime import datetime
-from typing import Union
+from typing import Any, Union
+from unittest.mock import MagicMock, patch
 
 # third-party libraries
 from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import utc
+from requests import Response
+from umich_api.api_utils import ApiUtil
 
 # Local libraries
-from pe.models import Report, Exam, Submission
+from api_retry.util import ParsedResponse
+from constants import API_FIXTURES_DIR, ROOT_DIR
+from pe.models import ApiToken, Report, Exam, ExamSyncCursor, Submission, SubmissionRecord
+from pe.orchestration import ScoresOrchestration
+from pe.reporter import Reporter
 
 
 LOGGER = logging.getLogger(__name__)
@@ -280,6 +290,52 @@ class CustomMethodsTestCase(TestCase):
         last_sub_graded_dt: Union[datetime, None] = potions_exam.get_last_sub_graded_datetime()
         self.assertTrue(last_sub_graded_dt, datetime(2020, 6, 12, 12, 0, 30, tzinfo=utc))
 
+    def test_get_last_sub_graded_datetime_falls_back_to_aggregate(self):
+        """
+        Exam.get_last_sub_graded_datetime aggregates the latest graded_timestamp with one query
+        when the exam has no sync cursor.
+        """
+        potions_exam = Exam.objects.get(id=1)
+        # One query to check for the cursor, one for the aggregate
+        with self.assertNumQueries(2):
+            last_sub_graded_dt: Union[datetime, None] = potions_exam.get_last_sub_graded_datetime()
+        self.assertEqual(last_sub_graded_dt, datetime(2020, 6, 12, 16, 0, 0, tzinfo=utc))
+
+    def test_get_last_sub_graded_datetime_uses_sync_cursor(self):
+        """
+        Exam.get_last_sub_graded_datetime returns the exam's sync cursor value without aggregating submissions.
+        """
+        cursor_dt: datetime = datetime(2020, 6, 13, 8, 0, 0, tzinfo=utc)
+        ExamSyncCursor.objects.create(exam_id=1, last_graded_timestamp=cursor_dt)
+        potions_exam = Exam.objects.get(id=1)
+        with self.assertNumQueries(1):
+            last_sub_graded_dt: Union[datetime, None] = potions_exam.get_last_sub_graded_datetime()
+        self.assertEqual(last_sub_graded_dt, cursor_dt)
+
+    def test_advance_sync_cursor_creates_cursor_from_stored_subs(self):
+        """
+        Exam.advance_sync_cursor creates a cursor that accounts for submissions stored before the cursor existed.
+        """
+        potions_exam = Exam.objects.get(id=1)
+        cursor: ExamSyncCursor = potions_exam.advance_sync_cursor(datetime(2020, 6, 12, 10, 0, 0, tzinfo=utc))
+        self.assertEqual(cursor.last_graded_timestamp, datetime(2020, 6, 12, 16, 0, 0, tzinfo=utc))
+        self.assertIsNone(cursor.last_page_url)
+
+    def test_advance_sync_cursor_never_moves_backwards(self):
+        """
+        Exam.advance_sync_cursor keeps the later of the existing and new graded_timestamp values
+        and replaces the page URL.
+        """
+        potions_exam = Exam.objects.get(id=1)
+        later_dt: datetime = datetime(2020, 6, 14, 0, 0, 0, tzinfo=utc)
+        potions_exam.advance_sync_cursor(later_dt, 'some/url?page=2')
+        potions_exam.advance_sync_cursor(datetime(2020, 6, 13, 0, 0, 0, tzinfo=utc))
+
+        cursor: ExamSyncCursor = ExamSyncCursor.objects.get(exam_id=1)
+        self.assertEqual(cursor.last_graded_timestamp, later_dt)
+        self.assertIsNone(cursor.last_page_url)
+        self.assertEqual(potions_exam.get_last_sub_graded_datetime(), later_dt)
+
     def test_get_last_sub_graded_datetime_without_submissions(self):
         """
         Exam.get_last_sub_graded_datetime returns None when no submissions are present.
@@ -302,3 +358,154 @@ class CustomMethodsTestCase(TestCase):
                 'GradePoints': '300.0'
             }
         )
+
+    def test_submission_record_from_canvas(self):
+        """SubmissionRecord.from_canvas keeps the fields used, parsing timestamps and trimming login_id."""
+        sub_record: SubmissionRecord = SubmissionRecord.from_canvas({
+            'id': 444444,
+            'attempt': 2,
+            'submitted_at': None,
+            'graded_at': '2020-06-19T17:45:33Z',
+            'score': 125.0,
+            'user': {'login_id': ' hpotter ', 'name': 'Harry Potter'}
+        })
+        self.assertEqual(
+            sub_record,
+            SubmissionRecord(
+                None, 444444, 2, 'hpotter', None, datetime(2020, 6, 19, 17, 45, 33, tzinfo=utc), 125.0
+            )
+        )
+
+    def test_submission_record_load_uses_values_list(self):
+        """SubmissionRecord.load loads records with one query and matches the fields of the model instances."""
+        sub_qs: QuerySet = Submission.objects.filter(exam_id=1).order_by('id')
+        with self.assertNumQueries(1):
+            sub_records: list[SubmissionRecord] = SubmissionRecord.load(sub_qs)
+
+        self.assertEqual(
+            sub_records,
+            [
+                SubmissionRecord(*[getattr(sub, field) for field in SubmissionRecord._fields])
+                for sub in sub_qs
+            ]
+        )
+
+
+class ApiTokenTestCase(TestCase):
+
+    def test_get_token_without_stored_token(self):
+        """ApiToken.get_token returns None when no token is stored for the scope."""
+        self.assertIsNone(ApiToken.get_token('canvasreadonly'))
+
+    def test_put_token_stores_and_replaces_token(self):
+        """ApiToken.put_token stores one token per scope, which ApiToken.get_token returns with its expiry time."""
+        ApiToken.put_token('canvasreadonly', 'first-token', 1592000000.0)
+        ApiToken.put_token('canvasreadonly', 'second-token', 1592003600.0)
+
+        self.assertEqual(ApiToken.objects.filter(scope='canvasreadonly').count(), 1)
+        self.assertEqual(ApiToken.get_token('canvasreadonly'), ('second-token', 1592003600.0))
+        stored_token: ApiToken = ApiToken.objects.get(scope='canvasreadonly')
+        self.assertEqual(stored_token.expires_timestamp, datetime(2020, 6, 12, 23, 13, 20, tzinfo=utc))
+        self.assertIsNone(ApiToken.get_token('placementscores'))
+
+
+class SubmissionQueryPlanTestCase(TestCase):
+    fixtures: list[str] = ['test_01.json', 'test_03.json', 'test_04.json']
+
+    def setUp(self):
+        """Sets up the exams and the ApiUtil instance used to run the code whose queries are explained."""
+        self.potions_exam: Exam = Exam.objects.get(id=1)
+        self.potions_val_exam: Exam = Exam.objects.get(id=2)
+        self.api_handler: ApiUtil = ApiUtil(
+            os.getenv('API_DIR_URL', ''),
+            os.getenv('API_DIR_CLIENT_ID', ''),
+            os.getenv('API_DIR_SECRET', ''),
+            os.path.join(ROOT_DIR, 'config', 'apis.json')
+        )
+        with open(os.path.join(API_FIXTURES_DIR, 'canvas_subs.json'), 'r') as test_canvas_subs_file:
+            self.canvas_potions_val_subs: list[dict[str, Any]] = (
+                json.loads(test_canvas_subs_file.read())['Potions_Validation_1']
+            )
+
+    @staticmethod
+    def explain_submission_queries(queries: CaptureQueriesContext) -> list[str]:
+        """
+        Runs EXPLAIN for each captured SELECT that reads the submission table and returns the plans as text.
+        MySQL lists every candidate index in possible_keys, so plans mention usable indexes even for tiny tables;
+        SQLite names the index it uses.
+        """
+        submission_table: str = connection.ops.quote_name(Submission._meta.db_table)
+        explain: str = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+        plans: list[str] = []
+        for query in queries.captured_queries:
+            if query['sql'].startswith('SELECT') and f'FROM {submission_table}' in query['sql']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{explain} {query['sql']}")
+                    plans.append(str(cursor.fetchall()))
+        LOGGER.debug(plans)
+        return plans
+
+    def capture_last_graded_queries(self) -> CaptureQueriesContext:
+        """Captures the queries run by Exam.get_last_sub_graded_datetime for an exam without a sync cursor."""
+        with CaptureQueriesContext(connection) as queries:
+            self.potions_exam.get_last_sub_graded_datetime()
+        return queries
+
+    def capture_orchestration_queries(self) -> CaptureQueriesContext:
+        """Captures the queries run by ScoresOrchestration.main storing new submissions and failing to send them."""
+        with patch('pe.orchestration.api_call_with_retries', autospec=True) as mock_get:
+            with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
+                mock_get.return_value = ParsedResponse(
+                    MagicMock(spec=Response, ok=True, links={}), self.canvas_potions_val_subs
+                )
+                mock_send.return_value = MagicMock(spec=Response, status_code=500, text=json.dumps({}))
+                orca: ScoresOrchestration = ScoresOrchestration(self.api_handler, self.potions_val_exam)
+                with CaptureQueriesContext(connection) as queries:
+                    orca.main(stream_subs=False, adaptive_batching=False)
+        return queries
+
+    def capture_report_queries(self) -> CaptureQueriesContext:
+        """Captures the queries run by Reporter.prepare_context for the Potions report."""
+        reporter: Reporter = Reporter(Report.objects.get(id=1))
+        run_dt: datetime = datetime(2020, 6, 12, 0, 0, 0, tzinfo=utc)
+        for exam in reporter.report.exams.all():
+            reporter.exams_time_metadata[exam.id] = {
+                'start_time': run_dt, 'end_time': run_dt, 'sub_time_filter': run_dt
+            }
+        with CaptureQueriesContext(connection) as queries:
+            reporter.prepare_context()
+        return queries
+
+    def test_last_graded_query_plan_uses_index(self):
+        """The query run by Exam.get_last_sub_graded_datetime can use a composite index."""
+        plans: list[str] = self.explain_submission_queries(self.capture_last_graded_queries())
+        self.assertEqual(len(plans), 1)
+        self.assertIn('sub_exam_graded_ts_idx', plans[0])
+
+    def test_orchestration_query_plans_use_indexes(self):
+        """
+        The queries run by ScoresOrchestration.main to find which new submissions are already stored
+        and to start the exam's sync cursor can use the unique constraint's index and a composite index.
+        """
+        plans: list[str] = self.explain_submission_queries(self.capture_orchestration_queries())
+        # SQLite creates the index for a unique constraint along with the table, under a name of its own
+        unique_index_name: str = (
+            'sqlite_autoindex_pe_submission' if connection.vendor == 'sqlite' else 'unique_canvas_submission'
+        )
+        self.assertTrue(any(unique_index_name in plan for plan in plans))
+        self.assertTrue(any('sub_exam_graded_ts_idx' in plan for plan in plans))
+
+    def test_report_query_plans_use_index(self):
+        """The queries run by Reporter.prepare_context can use a composite index."""
+        plans: list[str] = self.explain_submission_queries(self.capture_report_queries())
+        self.assertTrue(any('sub_exam_trans_graded_ts_idx' in plan for plan in plans))
+
+    def test_every_submission_index_serves_a_run_query(self):
+        """Each index on the submission table appears in the plan of a query a run actually makes."""
+        plans: list[str] = (
+            self.explain_submission_queries(self.capture_last_graded_queries()) +
+            self.explain_submission_queries(self.capture_orchestration_queries()) +
+            self.explain_submission_queries(self.capture_report_queries())
+        )
+        for index in Submission._meta.indexes:
+            self.assertTrue(any(index.name in plan for plan in plans), f'No query plan mentions {index.name}')
@@ -1,22 +1,27 @@
 # standard libraries
 import json, logging, os
 from datetime import datetime, timedelta
+from smtplib import SMTPDataError, SMTPRecipientsRefused, SMTPServerDisconnected
 from typing import Any
 from unittest.mock import MagicMock, patch
 
 # third-party libraries
 from django.core import mail
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection as db_connection
+from django.template.loader import get_template
 from django.test import TestCase
 from django.utils.timezone import utc
 from requests import Response
 from umich_api.api_utils import ApiUtil
 
 # local libraries
+from api_retry.util import ParsedResponse
 from constants import API_FIXTURES_DIR, ROOT_DIR, SNAPSHOTS_DIR
-from pe.models import Report
+from pe.models import Exam, OutboxEmail, Report, Submission
 from pe.orchestration import ScoresOrchestration
-from pe.reporter import Reporter
+from pe.reporter import Reporter, get_email_templates, render_email, send_emails, send_outbox_emails
 
 
 LOGGER = logging.getLogger(__name__)
@@ -50,9 +55,9 @@ class ReporterTestCase(TestCase):
             with patch.object(ApiUtil, 'api_call', autospec=True) as mock_send:
                 mock_get.side_effect = [
                     # Potions Placement - no more new submissions
-                    MagicMock(spec=Response, status_code=200, text=json.dumps([])),
+                    ParsedResponse(MagicMock(spec=Response, status_code=200), []),
                     # Potions Validation - two more new submissions
-                    MagicMock(spec=Response, status_code=200, text=json.dumps(canvas_potions_val_subs))
+                    ParsedResponse(MagicMock(spec=Response, status_code=200), canvas_potions_val_subs)
                 ]
                 mock_send.side_effect = [
                     # Potions Placement - Only rweasley sub from test_04.json, fails to send
@@ -98,7 +103,10 @@ class ReporterTestCase(TestCase):
         reporter.prepare_context()
 
         self.assertEqual((reporter.total_successes, reporter.total_failures, reporter.total_new), (4, 1, 2))
-        self.assertEqual(sorted(list(reporter.context.keys())), ['exams', 'report', 'support_email'])
+        self.assertEqual(
+            sorted(list(reporter.context.keys())), ['exams', 'failures_attached', 'report', 'support_email']
+        )
+        self.assertFalse(reporter.context['failures_attached'])
         self.assertEqual(reporter.context['report'], {
             'id': 1,
             'name': 'Potions',
@@ -145,6 +153,87 @@ class ReporterTestCase(TestCase):
         )
         self.assertEqual(val_success_ids, [123460, 210000, 444444, 444445])
 
+    def test_prepare_context_uses_same_number_of_queries_for_more_exams(self):
+        """
+        prepare_context makes the same number of queries however many exams are in the report,
+        and gives zero counts and empty lists for an exam with no submissions.
+        """
+        reporter: Reporter = Reporter(self.potions_report)
+        reporter.exams_time_metadata = self.exams_time_metadata
+        with self.assertNumQueries(3):
+            reporter.prepare_context()
+
+        herbology_exam: Exam = Exam.objects.create(
+            sa_code='HP',
+            name='Herbology Placement',
+            report=self.potions_report,
+            course_id=888889,
+            assignment_id=111113,
+            default_time_filter=datetime(2020, 6, 1, 0, 0, 0, tzinfo=utc)
+        )
+        more_reporter: Reporter = Reporter(self.potions_report)
+        more_reporter.exams_time_metadata = {
+            **self.exams_time_metadata,
+            herbology_exam.id: {
+                'start_time': self.fake_finished_at,
+                'end_time': self.fake_finished_at,
+                'sub_time_filter': herbology_exam.default_time_filter
+            }
+        }
+        with self.assertNumQueries(3):
+            more_reporter.prepare_context()
+
+        self.assertEqual(
+            (more_reporter.total_successes, more_reporter.total_failures, more_reporter.total_new), (4, 1, 2)
+        )
+        herbology_exam_dict: dict[str, Any] = more_reporter.context['exams'][2]
+        self.assertEqual(herbology_exam_dict['summary'], {'success_count': 0, 'failure_count': 0, 'new_count': 0})
+        self.assertEqual((herbology_exam_dict['successes'], herbology_exam_dict['failures']), ([], []))
+
+    def test_send_email_with_cut_off_failures(self):
+        """
+        send_email lists only the first failures for an exam, notes the total, and attaches all failures as a CSV file
+        when the report is set up to, paging through them in graded order.
+        """
+        graded_dt: datetime = datetime(2020, 6, 13, 16, 0, 0, tzinfo=utc)
+        for submission_id, student_uniqname in [(123470, 'dthomas'), (123471, 'sfinnigan')]:
+            Submission.objects.create(
+                submission_id=submission_id, attempt_num=1, exam_id=1, student_uniqname=student_uniqname,
+                submitted_timestamp=graded_dt, graded_timestamp=graded_dt, score=200.0, transmitted=False
+            )
+
+        reporter: Reporter = Reporter(self.potions_report, max_failures=1, failures_csv=True)
+        reporter.failures_csv_chunk_size = 2
+        reporter.exams_time_metadata = self.exams_time_metadata
+        with patch.dict(os.environ, {'SMTP_FROM': 'admin@hogwarts.edu'}):
+            reporter.prepare_context()
+            reporter.send_email()
+
+        placement_exam_dict: dict[str, Any] = reporter.context['exams'][0]
+        self.assertEqual(placement_exam_dict['summary']['failure_count'], 3)
+        self.assertEqual([sub_dict['submission_id'] for sub_dict in placement_exam_dict['failures']], [123458])
+        self.assertEqual(reporter.total_failures, 3)
+        self.assertTrue(reporter.context['failures_attached'])
+
+        self.assertEqual(len(mail.outbox), 1)
+        email: EmailMultiAlternatives = mail.outbox[0]
+        note: str = 'Showing the first 1 of 3 failures; all failures are listed in the attached CSV file.'
+        self.assertIn(note, email.body)
+        self.assertIn(note, email.alternatives[0][0])
+
+        self.assertEqual(len(email.attachments), 1)
+        filename, content, mimetype = email.attachments[0]
+        self.assertEqual((filename, mimetype), ('Potions failures.csv', 'text/csv'))
+        self.assertEqual(
+            content.splitlines(),
+            [
+                'sa_code,submission_id,student_uniqname,score,graded_timestamp',
+                'PP,123458,rweasley,150.0,2020-06-12 16:00:00+00:00',
+                'PP,123470,dthomas,200.0,2020-06-13 16:00:00+00:00',
+                'PP,123471,sfinnigan,200.0,2020-06-13 16:00:00+00:00'
+            ]
+        )
+
     def test_get_subject(self):
         """
         get_subject properly uses the report instance and count instance variables to return a subject string.
@@ -197,3 +286,197 @@ class ReporterTestCase(TestCase):
 
         # Check that HTML alternative matches HTML snapshot
         self.assertEqual(email_html_msg, email_snap_html)
+
+    def test_render_email_loads_templates_once_for_many_reports(self):
+        """
+        render_email matches the snapshots and loads and compiles the two templates once for many reports,
+        instead of finding and parsing them for each report.
+        """
+        with open(os.path.join(SNAPSHOTS_DIR, 'email_snap.txt'), 'r') as email_snap_plain_file:
+            email_snap_plain: str = email_snap_plain_file.read()
+
+        with open(os.path.join(SNAPSHOTS_DIR, 'email_snap.html'), 'r') as email_snap_html_file:
+            email_snap_html: str = email_snap_html_file.read()
+
+        reporter: Reporter = Reporter(self.potions_report)
+        reporter.exams_time_metadata = self.exams_time_metadata
+        with patch.dict(os.environ, {'SUPPORT_EMAIL': 'admin@hogwarts.edu'}):
+            reporter.prepare_context()
+
+        get_email_templates.cache_clear()
+        with patch('pe.reporter.get_template', autospec=True, side_effect=get_template) as mock_get_template:
+            emails: list[tuple[str, str]] = [render_email(reporter.context) for _ in range(20)]
+
+        self.assertEqual(mock_get_template.call_count, 2)
+        self.assertEqual(emails, [(email_snap_plain, email_snap_html)] * 20)
+
+
+class SendEmailsTestCase(TestCase):
+
+    def setUp(self):
+        """
+        Creates email messages for reports to be sent.
+        """
+        self.messages: list[EmailMessage] = [
+            EmailMessage(subject=f'Report {i}', body='Body', from_email='admin@hogwarts.edu', to=[contact])
+            for i, contact in enumerate(
+                ['halfbloodprince@hogwarts.edu', 'rlupin@hogwarts.edu', 'mmcgonagall@hogwarts.edu']
+            )
+        ]
+
+    def test_send_emails_uses_one_connection(self):
+        """
+        send_emails sends all the messages using a single connection.
+        """
+        with patch('pe.reporter.get_connection', wraps=get_connection) as mock_get_connection:
+            failed_messages: list[EmailMessage] = send_emails(self.messages)
+
+        self.assertEqual(failed_messages, [])
+        self.assertEqual(mock_get_connection.call_count, 1)
+        self.assertEqual([message.subject for message in mail.outbox], ['Report 0', 'Report 1', 'Report 2'])
+
+    def test_send_emails_retries_transient_errors_and_tracks_failures(self):
+        """
+        send_emails retries messages failing with transient errors after increasing delays, reconnecting each time,
+        and returns the messages that failed with permanent errors or on every attempt, while sending the others.
+        """
+        mock_connection: MagicMock = MagicMock(spec=BaseEmailBackend)
+        mock_connection.send_messages.side_effect = [
+            # First message is sent after a dropped connection
+            SMTPServerDisconnected('Connection unexpectedly closed'),
+            1,
+            # Second message is refused permanently
+            SMTPRecipientsRefused({'rlupin@hogwarts.edu': (550, b'No such user')}),
+            # Third message keeps getting a transient error
+            SMTPDataError(451, 'Try again later'),
+            SMTPDataError(451, 'Try again later'),
+            SMTPDataError(451, 'Try again later')
+        ]
+
+        with patch('pe.reporter.get_connection', autospec=True, return_value=mock_connection):
+            with patch('pe.reporter.time.sleep', autospec=True) as mock_sleep:
+                failed_messages: list[EmailMessage] = send_emails(self.messages, max_attempts=3, retry_delay=0.5)
+
+        self.assertEqual(failed_messages, self.messages[1:])
+        self.assertEqual(mock_connection.send_messages.call_count, 6)
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [0.5, 0.5, 1.0])
+        # Closed before each retry and once at the end
+        self.assertEqual(mock_connection.close.call_count, 4)
+
+
+class OutboxTestCase(TestCase):
+    fixtures: list[str] = ['test_01.json']
+
+    def setUp(self):
+        """
+        Queues two report emails in the outbox, one with an HTML alternative and an attachment.
+        """
+        self.potions_report: Report = Report.objects.get(id=1)
+        first_message: EmailMultiAlternatives = EmailMultiAlternatives(
+            subject='Potions Report', body='Body', from_email='admin@hogwarts.edu', to=['halfbloodprince@hogwarts.edu']
+        )
+        first_message.attach_alternative('<p>Body</p>', 'text/html')
+        first_message.attach('Potions failures.csv', 'sa_code,submission_id\nPP,123458\n', 'text/csv')
+        second_message: EmailMultiAlternatives = EmailMultiAlternatives(
+            subject='DADA Report', body='Body', from_email='admin@hogwarts.edu', to=['rlupin@hogwarts.edu']
+        )
+        self.outbox_emails: list[OutboxEmail] = [
+            OutboxEmail.queue(first_message, self.potions_report), OutboxEmail.queue(second_message)
+        ]
+
+    def test_queue_and_to_message(self):
+        """
+        OutboxEmail.queue stores a message that to_message turns back into an equivalent message.
+        """
+        message: EmailMultiAlternatives = OutboxEmail.objects.get(id=self.outbox_emails[0].id).to_message()
+        self.assertEqual(
+            (message.subject, message.body, message.from_email, message.to),
+            ('Potions Report', 'Body', 'admin@hogwarts.edu', ['halfbloodprince@hogwarts.edu'])
+        )
+        self.assertEqual(message.alternatives, [('<p>Body</p>', 'text/html')])
+        self.assertEqual(
+            message.attachments, [('Potions failures.csv', 'sa_code,submission_id\nPP,123458\n', 'text/csv')]
+        )
+        self.assertEqual(OutboxEmail.objects.get(id=self.outbox_emails[1].id).to_message().alternatives, [])
+
+    def test_send_outbox_emails_keeps_failed_emails_for_later(self):
+        """
+        send_outbox_emails marks sent emails, keeps failed ones in the outbox for a later call,
+        and stops trying an email once it has been tried max_sends times.
+        """
+        mock_connection: MagicMock = MagicMock(spec=BaseEmailBackend)
+        mock_connection.send_messages.side_effect = [1, SMTPRecipientsRefused({})]
+        with patch('pe.reporter.get_connection', autospec=True, return_value=mock_connection):
+            num_unsent: int = send_outbox_emails(max_sends=2)
+
+        self.assertEqual(num_unsent, 1)
+        first_email, second_email = OutboxEmail.objects.order_by('id')
+        self.assertEqual((first_email.attempts, second_email.attempts), (1, 1))
+        self.assertIsNotNone(first_email.sent_timestamp)
+        self.assertIsNone(second_email.sent_timestamp)
+
+        # Only the unsent email is tried, this time successfully
+        self.assertEqual(send_outbox_emails(max_sends=2), 0)
+        self.assertEqual([email.subject for email in mail.outbox], ['DADA Report'])
+        second_email.refresh_from_db()
+        self.assertEqual(second_email.attempts, 2)
+        self.assertIsNotNone(second_email.sent_timestamp)
+
+        # An email tried max_sends times is left unsent
+        OutboxEmail.objects.filter(id=second_email.id).update(sent_timestamp=None)
+        self.assertEqual(send_outbox_emails(max_sends=2), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_outbox_emails_prunes_old_sent_and_given_up_emails(self):
+        """
+        send_outbox_emails deletes emails sent or given up on more than retention_days ago, keeping newer ones.
+        """
+        first_email, second_email = self.outbox_emails
+        old_dt: datetime = datetime.now(tz=utc) - timedelta(days=31)
+        OutboxEmail.objects.filter(id=first_email.id).update(sent_timestamp=old_dt)
+        OutboxEmail.objects.filter(id=second_email.id).update(attempts=2, created_timestamp=old_dt)
+
+        with self.assertLogs(level='INFO') as cm:
+            self.assertEqual(send_outbox_emails(max_sends=3, retention_days=30), 0)
+        # The second email can still be sent, so it is kept
+        self.assertEqual(list(OutboxEmail.objects.values_list('id', flat=True)), [second_email.id])
+        self.assertTrue('INFO:pe.reporter:Deleted 1 outbox email(s) older than 30 day(s)' in cm.output)
+
+        OutboxEmail.objects.filter(id=second_email.id).update(attempts=3, sent_timestamp=None)
+        send_outbox_emails(max_sends=3, retention_days=30)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_send_outbox_emails_marks_each_email_outside_claim_transaction(self):
+        """
+        send_outbox_emails sends emails with no transaction open, and when a call stops partway,
+        emails already sent stay marked sent while the rest are only claimed again after claim_timeout.
+        """
+        atomic_depths: list[int] = []
+
+        def send_then_stop(messages: list[EmailMessage]) -> int:
+            atomic_depths.append(len(db_connection.atomic_blocks))
+            if len(atomic_depths) > 1:
+                raise RuntimeError('Process stopped')
+            return 1
+
+        mock_connection: MagicMock = MagicMock(spec=BaseEmailBackend)
+        mock_connection.send_messages.side_effect = send_then_stop
+        with patch('pe.reporter.get_connection', autospec=True, return_value=mock_connection):
+            with self.assertRaises(RuntimeError):
+                send_outbox_emails(max_sends=2)
+
+        self.assertEqual(atomic_depths, [len(db_connection.atomic_blocks)] * 2)
+        first_email, second_email = OutboxEmail.objects.order_by('id')
+        self.assertIsNotNone(first_email.sent_timestamp)
+        self.assertIsNone(first_email.claimed_timestamp)
+        self.assertIsNone(second_email.sent_timestamp)
+        self.assertIsNotNone(second_email.claimed_timestamp)
+
+        # The claim of the stopped call is respected until it times out; only the unsent email is sent then
+        self.assertEqual(send_outbox_emails(max_sends=2), 0)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(send_outbox_emails(max_sends=2, claim_timeout=0), 0)
+        self.assertEqual([email.subject for email in mail.outbox], ['DADA Report'])
+        second_email.refresh_from_db()
+        self.assertEqual(second_email.attempts, 2)
+        self.assertIsNotNone(second_email.sent_timestamp)
@@ -7,7 +7,9 @@ from django.core.management import call_command
 from django.test import TestCase
 
 # local libraries
+from api_retry.session import PooledApiUtil
 from constants import ROOT_DIR
+from pe.models import ApiToken
 
 
 LOGGER = logging.getLogger(__name__)
@@ -38,3 +40,19 @@ class RunCommandTestCase(TestCase):
                     LOGGER.info('SystemExit exception caught to enable subsequent test assertion.')
 
         mock_main.assert_not_called()
+
+    def test_handle_with_pooled_session_shares_one_pooled_api_util(self):
+        """
+        handle builds one PooledApiUtil when API_POOLED_SESSION is set, passes it to pe.main.main,
+        and closes its session afterward.
+        """
+        with patch('pe.management.commands.run.API_POOLED_SESSION', True):
+            with patch('pe.management.commands.run.main', autospec=True) as mock_main:
+                with patch.object(PooledApiUtil, 'close', autospec=True) as mock_close:
+                    call_command('run')
+
+        mock_main.assert_called_once()
+        api_util = mock_main.call_args.args[0]
+        self.assertIsInstance(api_util, PooledApiUtil)
+        self.assertIs(api_util.token_store, ApiToken)
+        mock_close.assert_called_once_with(api_util)
@@ -6,7 +6,7 @@ from django.test import TestCase
 
 # local libraries
 from pe.models import Exam, Submission
-from util import chunk_list
+from util import AdaptiveBatcher, BatchRecord, chunk_list
 
 
 LOGGER = logging.getLogger(__name__)
@@ -54,3 +54,59 @@ class ChunkingTestCase(TestCase):
 
         all_subs: list[Submission] = [submission for sublist in result for submission in sublist]
         self.assertEqual(submissions, all_subs)
+
+
+class AdaptiveBatcherTestCase(TestCase):
+
+    def test_process_grows_batches_after_fast_successes_up_to_max_size(self):
+        """
+        AdaptiveBatcher.process grows the batch size after each fast success, stops at max_size,
+        and passes every item along in order.
+        """
+        batcher: AdaptiveBatcher = AdaptiveBatcher(initial_size=10, min_size=5, max_size=30, target_latency=60.0)
+        batches: list[list[int]] = []
+
+        def process_batch(batch: list[int]) -> tuple[bool, float]:
+            batches.append(batch)
+            return (True, 1.0)
+
+        nums: list[int] = list(range(100))
+        batcher.process(nums, process_batch)
+
+        self.assertEqual([len(batch) for batch in batches], [10, 15, 22, 30, 23])
+        self.assertEqual([num for batch in batches for num in batch], nums)
+        self.assertEqual([record.size for record in batcher.history], [10, 15, 22, 30, 23])
+        self.assertTrue(all(record.success for record in batcher.history))
+
+    def test_process_records_latency_reported_by_process_batch(self):
+        """
+        AdaptiveBatcher.process records the latency process_batch reports rather than how long the call took,
+        keeping the batch size after a success reported as slow.
+        """
+        batcher: AdaptiveBatcher = AdaptiveBatcher(initial_size=10, target_latency=5.0)
+        batcher.process(list(range(20)), lambda batch: (True, 8.0))
+
+        self.assertEqual(batcher.history, [BatchRecord(10, 8.0, True), BatchRecord(10, 8.0, True)])
+        self.assertEqual(batcher.batch_size, 10)
+
+    def test_record_shrinks_after_failure_down_to_min_size(self):
+        """AdaptiveBatcher.record halves the batch size after each failure but not below min_size."""
+        batcher: AdaptiveBatcher = AdaptiveBatcher(initial_size=100, min_size=20, max_size=500)
+        batcher.record(100, 30.0, False)
+        self.assertEqual(batcher.batch_size, 50)
+        batcher.record(50, 30.0, False)
+        self.assertEqual(batcher.batch_size, 25)
+        batcher.record(25, 30.0, False)
+        self.assertEqual(batcher.batch_size, 20)
+        self.assertEqual(batcher.history[0], BatchRecord(100, 30.0, False))
+
+    def test_record_keeps_size_after_slow_success(self):
+        """AdaptiveBatcher.record leaves the batch size unchanged after a success slower than target_latency."""
+        batcher: AdaptiveBatcher = AdaptiveBatcher(initial_size=100, target_latency=5.0)
+        batcher.record(100, 8.0, True)
+        self.assertEqual(batcher.batch_size, 100)
+
+    def test_initial_size_is_clamped_to_bounds(self):
+        """AdaptiveBatcher limits the initial batch size to the min/max bounds."""
+        self.assertEqual(AdaptiveBatcher(initial_size=100, max_size=40).batch_size, 40)
+        self.assertEqual(AdaptiveBatcher(initial_size=1, min_size=10).batch_size, 10)
@@ -1,6 +1,6 @@
 # standard libraries
 import logging
-from typing import Any
+from typing import Any, Callable, NamedTuple
 
 
 LOGGER = logging.getLogger(__name__)
@@ -15,3 +15,101 @@ def chunk_list(input_list: list[Any], chunk_size: int = 100) -> list[list[Any]]:
         f'with the following length(s): {", ".join(chunk_lengths)}'
     )
     return chunks
+
+
+class BatchRecord(NamedTuple):
+    """Size, latency in seconds, and outcome of one batch processed by AdaptiveBatcher."""
+
+    size: int
+    latency: float
+    success: bool
+
+
+class AdaptiveBatcher:
+    """
+    Processes a list in batches whose size adapts to how the previous batch went: the size grows after a batch
+    succeeds within the target latency, shrinks after a batch fails, and always stays within min/max bounds.
+    """
+
+    def __init__(
+        self,
+        initial_size: int = 100,
+        min_size: int = 10,
+        max_size: int = 500,
+        target_latency: float = 5.0,
+        growth_factor: float = 1.5,
+        shrink_factor: float = 0.5
+    ) -> None:
+        """
+        Sets the bounds and adjustment settings and clamps the initial batch size to the bounds.
+
+        :param initial_size: Size of the first batch
+        :type initial_size: int, optional (default is 100)
+        :param min_size: Smallest batch size allowed
+        :type min_size: int, optional (default is 10)
+        :param max_size: Largest batch size allowed
+        :type max_size: int, optional (default is 500)
+        :param target_latency: Number of seconds within which a batch must succeed for the size to grow
+        :type target_latency: float, optional (default is 5.0)
+        :param growth_factor: Factor the size is multiplied by after a fast success
+        :type growth_factor: float, optional (default is 1.5)
+        :param shrink_factor: Factor the size is multiplied by after a failure
+        :type shrink_factor: float, optional (default is 0.5)
+        :return: None
+        :rtype: None
+        """
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.target_latency: float = target_latency
+        self.growth_factor: float = growth_factor
+        self.shrink_factor: float = shrink_factor
+        self.batch_size: int = self.clamp(initial_size)
+        self.history: list[BatchRecord] = []
+
+    def clamp(self, size: float) -> int:
+        """Rounds a size and limits it to the min/max bounds."""
+        return max(self.min_size, min(self.max_size, round(size)))
+
+    def record(self, size: int, latency: float, success: bool) -> None:
+        """
+        Records the result of a batch and adjusts the size used for the next one.
+
+        :param size: Number of items in the batch
+        :type size: int
+        :param latency: Number of seconds the batch took
+        :type latency: float
+        :param success: Whether the batch succeeded
+        :type success: bool
+        :return: None
+        :rtype: None
+        """
+        self.history.append(BatchRecord(size, latency, success))
+        previous_size: int = self.batch_size
+        if not success:
+            self.batch_size = self.clamp(self.batch_size * self.shrink_factor)
+        elif latency <= self.target_latency:
+            self.batch_size = self.clamp(self.batch_size * self.growth_factor)
+        LOGGER.info(
+            f'Batch of {size} took {latency:.3f} second(s) and ' + ('succeeded' if success else 'failed') +
+            f'; next batch size is {self.batch_size} (was {previous_size})'
+        )
+
+    def process(self, input_list: list[Any], process_batch: Callable[[list[Any]], tuple[bool, float]]) -> None:
+        """
+        Passes the entire list to process_batch in consecutive batches, recording the result of each.
+        process_batch reports the latency itself, so it can time only the work the batch size affects
+        (e.g. a request, without waits for rate limits or database updates).
+
+        :param input_list: Items to process
+        :type input_list: list
+        :param process_batch: Function processing a batch and returning its success and latency in seconds
+        :type process_batch: Callable accepting a list and returning a tuple of a bool and a float
+        :return: None
+        :rtype: None
+        """
+        start_index: int = 0
+        while start_index < len(input_list):
+            batch: list[Any] = input_list[start_index:start_index + self.batch_size]
+            success, latency = process_batch(batch)
+            self.record(len(batch), latency, success)
+            start_index += len(batch)